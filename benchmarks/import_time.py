@@ -0,0 +1,55 @@
+"""
+Import time of the package and its modules, each measured in a fresh interpreter.
+
+Run from the project root:
+    python -m benchmarks.import_time [--repeats N]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = ['multi_imbalance', 'multi_imbalance.datasets', 'multi_imbalance.utils.data',
+           'multi_imbalance.utils.plot', 'multi_imbalance.resampling.global_cs', 'multi_imbalance.resampling.soup',
+           'multi_imbalance.resampling.spider', 'multi_imbalance.resampling.mdo', 'multi_imbalance.ensemble.ovo',
+           'multi_imbalance.ensemble.ecoc', 'multi_imbalance.ensemble.mrbbagging',
+           'multi_imbalance.ensemble.soup_bagging']
+HEAVY_DEPENDENCIES = ['sklearn', 'imblearn', 'pandas', 'scipy.io', 'sklearn.feature_selection', 'matplotlib',
+                      'seaborn']
+
+_SCRIPT = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(json.dumps([perf_counter() - start, [m for m in {heavy!r} if m in sys.modules]]))
+'''
+
+
+def measure_import(module, repeats=5):
+    """
+    :return: the best import time [s] of the module over repeats fresh interpreters and the heavy dependencies
+        imported with it
+    """
+    best, loaded = float('inf'), []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', _SCRIPT.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+                                check=True, capture_output=True, text=True).stdout
+        seconds, loaded = json.loads(output)
+        best = min(best, seconds)
+    return best, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{"module":<42}{"time [s]":>10}  heavy dependencies')
+    for module in MODULES:
+        seconds, loaded = measure_import(module, args.repeats)
+        print(f'{module:<42}{seconds:>10.4f}  {", ".join(loaded)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Recall vs speed of the approximate neighbours backends compared with exact search on the bundled datasets.
+
+Run from the project root:
+    python -m benchmarks.neighbors_recall
+"""
+from time import perf_counter
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from multi_imbalance.datasets import load_datasets
+from multi_imbalance.utils.neighbors import RPForestNeighbors
+
+K = 7
+BACKENDS = {
+    'rp_forest(trees=5, leaf=30)': RPForestNeighbors(n_neighbors=K, n_trees=5, leaf_size=30),
+    'rp_forest(trees=10, leaf=50)': RPForestNeighbors(n_neighbors=K, n_trees=10, leaf_size=50),
+    'rp_forest(trees=20, leaf=50)': RPForestNeighbors(n_neighbors=K, n_trees=20, leaf_size=50),
+}
+
+
+def timed_kneighbors(nn, X):
+    start = perf_counter()
+    indices = nn.fit(X).kneighbors(X, return_distance=False)
+    return indices, perf_counter() - start
+
+
+def recall(exact, approx):
+    return np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(exact, approx)])
+
+
+def main():
+    print(f'{"dataset":<24}{"backend":<30}{"rows":>6}{"time [s]":>10}{"recall":>8}')
+    for name, dataset in load_datasets(data_home='./data/').items():
+        X = dataset.data.astype(float)
+        exact, exact_time = timed_kneighbors(NearestNeighbors(n_neighbors=K, algorithm='brute'), X)
+        print(f'{name:<24}{"exact (brute)":<30}{X.shape[0]:>6}{exact_time:>10.4f}{1.0:>8.3f}')
+        for backend_name, backend in BACKENDS.items():
+            approx, approx_time = timed_kneighbors(backend, X)
+            print(f'{name:<24}{backend_name:<30}{X.shape[0]:>6}{approx_time:>10.4f}{recall(exact, approx):>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Prediction time vs accuracy of the pruned OVO aggregations (DDAG, DCS) compared with voting of all binary
+classifiers on synthetic datasets with many classes.
+
+Run from the project root:
+    python -m benchmarks.ovo_aggregation
+    python -m benchmarks.ovo_aggregation --classes 10 30 50 --classifiers tree NB KNN
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+from sklearn.metrics import balanced_accuracy_score
+from sklearn.model_selection import train_test_split
+
+from benchmarks.suite import synthetic_dataset
+from multi_imbalance.ensemble.ovo import OVO
+from multi_imbalance.utils.metrics import gmean_score
+from multi_imbalance.utils.profiling import instrument
+
+AGGREGATIONS = ['max_voting', 'DDAG', 'DCS']
+
+
+def timed_predict(clf, X):
+    with instrument() as profiler:
+        start = perf_counter()
+        predicted = clf.predict(X)
+        elapsed = perf_counter() - start
+    return predicted, elapsed, profiler.counters['classifier_predictions'] / X.shape[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=5000, help='number of rows of synthetic datasets')
+    parser.add_argument('--classes', nargs='+', type=int, default=[10, 30])
+    parser.add_argument('--classifiers', nargs='+', default=['tree', 'NB', 'KNN'],
+                        choices=OVO._allowed_classifiers)
+    args = parser.parse_args(argv)
+
+    print(f'{"dataset":<20}{"classifier":<12}{"aggregation":<12}{"time [s]":>10}{"speedup":>9}{"calls/row":>11}'
+          f'{"bal_acc":>9}{"gmean":>8}{"agree":>7}')
+    for n_classes in args.classes:
+        X, y = synthetic_dataset(args.samples, n_classes)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.5, stratify=y, random_state=0)
+        dataset_name = f'synthetic_{args.samples}x{n_classes}'
+        for classifier in args.classifiers:
+            full_predicted, full_time = None, None
+            for aggregation in AGGREGATIONS:
+                clf = OVO(binary_classifier=classifier, preprocessing=None, aggregation=aggregation)
+                predicted, elapsed, calls = timed_predict(clf.fit(X_train, y_train), X_test)
+                if aggregation == 'max_voting':
+                    full_predicted, full_time = predicted, elapsed
+                print(f'{dataset_name:<20}{classifier:<12}{aggregation:<12}{elapsed:>10.4f}{full_time / elapsed:>9.2f}'
+                      f'{calls:>11.1f}{balanced_accuracy_score(y_test, predicted):>9.3f}'
+                      f'{gmean_score(y_test, predicted):>8.3f}{np.mean(predicted == full_predicted):>7.3f}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Time and peak memory of every sampler and ensemble on the bundled datasets and on synthetic data of growing size.
+
+Results are stored as JSON, so that two runs (e.g. on two commits) can be compared.
+
+Run from the project root:
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --sizes 1000 10000 --classes 3 10 --estimators SOUP OVO --output after.json
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+import sklearn
+from sklearn.tree import DecisionTreeClassifier
+
+from multi_imbalance.datasets import load_datasets, make_imbalanced_classification
+from multi_imbalance.ensemble.ecoc import ECOC
+from multi_imbalance.ensemble.mrbbagging import MRBBagging
+from multi_imbalance.ensemble.ovo import OVO
+from multi_imbalance.ensemble.soup_bagging import SOUPBagging
+from multi_imbalance.resampling.global_cs import GlobalCS
+from multi_imbalance.resampling.mdo import MDO
+from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.resampling.spider import SPIDER3
+from multi_imbalance.resampling.static_smote import StaticSMOTE
+
+SAMPLERS = {
+    'GlobalCS': lambda: GlobalCS(),
+    'SOUP': lambda: SOUP(),
+    'MDO': lambda: MDO(),
+    'SPIDER3': lambda: SPIDER3(k=5),
+    'StaticSMOTE': lambda: StaticSMOTE(),
+}
+
+ENSEMBLES = {
+    'OVO': lambda: OVO(),
+    'ECOC': lambda: ECOC(),
+    'OVO-shared_KNN': lambda: OVO(binary_classifier='shared_KNN', preprocessing=None),
+    'OVO-DDAG': lambda: OVO(aggregation='DDAG'),
+    'OVO-DCS': lambda: OVO(aggregation='DCS'),
+    'ECOC-shared_KNN': lambda: ECOC(binary_classifier='shared_KNN', preprocessing=None),
+    'MRBBagging': lambda: MRBBagging(5, DecisionTreeClassifier(random_state=0), random_state=0),
+    'SOUPBagging': lambda: SOUPBagging(),
+}
+
+# Rows above which an estimator is skipped by default, as its running time grows too fast
+MAX_ROWS = {
+    'GlobalCS': 10 ** 6,
+    'SOUP': 10 ** 5,
+    'MDO': 10 ** 5,
+    'SPIDER3': 10 ** 4,
+    'StaticSMOTE': 10 ** 6,
+    'OVO': 10 ** 5,
+    'ECOC': 10 ** 5,
+    'OVO-shared_KNN': 10 ** 6,
+    'OVO-DDAG': 10 ** 5,
+    'OVO-DCS': 10 ** 5,
+    'ECOC-shared_KNN': 10 ** 6,
+    'MRBBagging': 10 ** 6,
+    'SOUPBagging': 10 ** 5,
+}
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+DEFAULT_CLASSES = [2, 5, 20, 50]
+
+
+SYNTHETIC_EXAMPLE_TYPES = {'safe': 0.6, 'borderline': 0.3, 'rare': 0.05, 'outlier': 0.05}
+
+
+def synthetic_dataset(n_samples, n_classes, n_features=10, imbalance_ratio=10, random_state=0):
+    """
+    Multi-class dataset with class sizes decreasing geometrically from the largest to the smallest class,
+    the largest class is imbalance_ratio times bigger than the smallest one.
+    """
+    return make_imbalanced_classification(n_samples, profile='geometric', n_classes=n_classes,
+                                          imbalance_ratio=imbalance_ratio, n_features=n_features,
+                                          example_types=SYNTHETIC_EXAMPLE_TYPES, random_state=random_state)
+
+
+def datasets(sizes, classes, data_home=None):
+    """
+    Yields (name, X, y) tuples: bundled datasets first (if data_home is given), then synthetic ones.
+    """
+    if data_home is not None:
+        for name, dataset in load_datasets(data_home=data_home).items():
+            yield name, dataset.data.astype(float), dataset.target
+    for n_classes in classes:
+        for n_samples in sizes:
+            X, y = synthetic_dataset(n_samples, n_classes)
+            yield f'synthetic_{n_samples}x{n_classes}', X, y
+
+
+def measure(func, repeat=1, memory=True):
+    """
+    Runs func repeat times and returns its last result along with the best running time in seconds and
+    the peak memory in bytes allocated during one additional run traced with tracemalloc.
+    Memory allocated in child processes (e.g. by SOUPBagging) is not traced.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        result = func()
+        times.append(perf_counter() - start)
+
+    peak_memory = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, {'time': min(times), 'peak_memory': peak_memory}
+
+
+def run_estimator(name, X, y, repeat=1, memory=True):
+    """
+    Returns a list of measurements of all phases of the estimator: fit_resample for samplers, fit and predict
+    for ensembles.
+    """
+    if name in SAMPLERS:
+        _, stats = measure(lambda: SAMPLERS[name]().fit_resample(X, y), repeat, memory)
+        return [dict(phase='fit_resample', **stats)]
+
+    ensemble = ENSEMBLES[name]()
+    _, fit_stats = measure(lambda: ensemble.fit(X, y), repeat, memory)
+    _, predict_stats = measure(lambda: ensemble.predict(X), repeat, memory)
+    return [dict(phase='fit', **fit_stats), dict(phase='predict', **predict_stats)]
+
+
+def run(estimators, sizes, classes, data_home=None, max_rows=None, repeat=1, memory=True):
+    results = []
+    for dataset_name, X, y in datasets(sizes, classes, data_home):
+        for name in estimators:
+            record = dict(estimator=name, dataset=dataset_name, n_samples=X.shape[0], n_features=X.shape[1],
+                          n_classes=int(np.unique(y).shape[0]))
+            limit = MAX_ROWS[name] if max_rows is None else max_rows
+            if X.shape[0] > limit:
+                results.append(dict(record, status='skipped'))
+                continue
+            try:
+                measurements = run_estimator(name, X, y, repeat, memory)
+            except Exception as e:
+                results.append(dict(record, status='error', message=f'{type(e).__name__}: {e}'))
+                continue
+            for measurement in measurements:
+                results.append(dict(record, status='ok', **measurement))
+                print(f'{name:<18}{dataset_name:<28}{measurement["phase"]:<14}{measurement["time"]:>10.4f} s'
+                      f'{_format_memory(measurement["peak_memory"]):>12}', flush=True)
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """
+    Prints time and memory ratios (new / old) of the measurements present in both files and returns the number of
+    regressions, i.e. ratios bigger than 1 + threshold.
+    """
+    def load(path):
+        with open(path) as f:
+            return {(r['estimator'], r['dataset'], r['phase']): r
+                    for r in json.load(f)['results'] if r['status'] == 'ok'}
+
+    old, new = load(old_path), load(new_path)
+    regressions = 0
+    print(f'{"estimator":<18}{"dataset":<28}{"phase":<14}{"time":>8}{"memory":>8}')
+    for key in sorted(old.keys() & new.keys()):
+        ratios = [new[key][m] / old[key][m] if old[key][m] and new[key][m] is not None else float('nan')
+                  for m in ('time', 'peak_memory')]
+        regressed = any(r > 1 + threshold for r in ratios)
+        regressions += regressed
+        print(f'{key[0]:<18}{key[1]:<28}{key[2]:<14}{ratios[0]:>8.2f}{ratios[1]:>8.2f}'
+              f'{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def _format_memory(n_bytes):
+    return '-' if n_bytes is None else f'{n_bytes / 2 ** 20:.1f} MiB'
+
+
+def main(argv=None):
+    all_estimators = list(SAMPLERS) + list(ENSEMBLES)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--estimators', nargs='+', default=all_estimators, choices=all_estimators)
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help='numbers of rows of synthetic datasets')
+    parser.add_argument('--classes', nargs='+', type=int, default=DEFAULT_CLASSES,
+                        help='numbers of classes of synthetic datasets')
+    parser.add_argument('--data-home', default='./data/',
+                        help='catalogue with the bundled datasets, pass an empty string to skip them')
+    parser.add_argument('--max-rows', type=int, default=None,
+                        help='skip datasets with more rows, overrides the per estimator defaults')
+    parser.add_argument('--repeat', type=int, default=1, help='number of timed runs, the best time is reported')
+    parser.add_argument('--no-memory', action='store_true', help='do not measure peak memory')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files and exit')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown or memory growth reported as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, threshold=args.threshold) else 0
+
+    results = run(args.estimators, args.sizes, args.classes, data_home=args.data_home or None,
+                  max_rows=args.max_rows, repeat=args.repeat, memory=not args.no_memory)
+    with open(args.output, 'w') as f:
+        json.dump({'metadata': metadata(), 'results': results}, f, indent=2)
+    print(f'Results saved to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,6 @@
-from . import ensemble
-from . import resampling
-from . import utils
+from multi_imbalance._lazy import lazy_submodules
 
 name = "multi_imbalance"
-__all__ = ['ensemble', 'resampling', 'utils']
+__all__ = ['datasets', 'ensemble', 'resampling', 'utils']
+
+__getattr__, __dir__ = lazy_submodules(__name__, __all__)
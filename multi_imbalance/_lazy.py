@@ -0,0 +1,26 @@
+"""
+Lazy loading of submodules (PEP 562), so that importing a package does not import its heavy dependencies.
+"""
+import importlib
+import sys
+
+
+def lazy_submodules(package, submodules):
+    """
+    :param package:
+        name of the package, __name__ of its __init__ module
+    :param submodules:
+        names of the submodules imported on the first attribute access
+    :return:
+        __getattr__ and __dir__ functions of the package module
+    """
+
+    def __getattr__(name):
+        if name in submodules:
+            return importlib.import_module(f'{package}.{name}')
+        raise AttributeError(f'module {package!r} has no attribute {name!r}')
+
+    def __dir__():
+        return sorted(set(vars(sys.modules[package])) | set(submodules))
+
+    return __getattr__, __dir__
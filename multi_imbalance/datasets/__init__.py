@@ -1,3 +1,6 @@
-from ._data_loader import load_datasets
+from ._data_loader import LazyDatasets, load_datasets
+from ._synthetic import (CLASS_RATIO_PROFILES, class_ratio_profile, iter_imbalanced_classification,
+                         make_imbalanced_classification, make_imbalanced_memmap)
 
-__all__ = ['load_datasets']
+__all__ = ['load_datasets', 'LazyDatasets', 'CLASS_RATIO_PROFILES', 'class_ratio_profile',
+           'iter_imbalanced_classification', 'make_imbalanced_classification', 'make_imbalanced_memmap']
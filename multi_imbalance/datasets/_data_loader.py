@@ -17,18 +17,19 @@ The characteristics of the available datasets are presented in the table below.
 # TODO add missing characteristics
 
 from collections import OrderedDict
+from collections.abc import Mapping
+import os
 import tarfile
-from io import BytesIO
-from os import makedirs
 from os.path import join, isfile
 
 import numpy as np
 
-from sklearn.datasets._base import Bunch
+from sklearn.utils import Bunch
 
 PRE_FILENAME = 'x'
 POST_FILENAME = 'data.npz'
 DATA_HOME_BASIC = "./../../data/"
+ARCHIVE_FILENAME = 'data.tar.gz'
 
 MAP_NAME_ID_KEYS = ['1czysty-cut', '2delikatne-cut', '3mocniej-cut', '4delikatne-bezover-cut',
                     'balance-scale', 'cleveland', 'cleveland_v2', 'cmc', 'dermatology',
@@ -42,13 +43,106 @@ for v, k in enumerate(MAP_NAME_ID_KEYS):
     MAP_ID_NAME[v + 1] = k
 
 
-def load_datasets(data_home=DATA_HOME_BASIC):
+class LazyDatasets(Mapping):
+    """
+    Read only mapping dataset name -> Bunch, a dataset is extracted and loaded on the first access and cached
+    afterwards. Opening the collection does not read any data.
     """
-    Load the benchmark datasets.
+
+    def __init__(self, data_home=DATA_HOME_BASIC, names=None, mmap_mode=None):
+        """
+        :param data_home:
+            catalogue in which the data is stored in .tar.gz format
+        :param names:
+            names (or IDs) of the datasets to include, if None all datasets are included
+        :param mmap_mode:
+            mode in which the arrays are memory mapped, see numpy.load, e.g. 'r' to open them read only without
+            reading them into memory. If None, the arrays are read into memory
+        """
+        self.data_home = data_home
+        self.mmap_mode = mmap_mode
+        self._names = _select_names(names)
+        self._loaded = dict()
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        if name not in self._loaded:
+            X, y = _load_dataset(self.data_home, name, self.mmap_mode)
+            self._loaded[name] = Bunch(data=X, target=y, DESCR=name)
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self._names})'
+
+
+def _select_names(names):
+    if names is None:
+        return list(MAP_NAME_ID.keys())
+    if isinstance(names, (str, int)):
+        names = [names]
+    selected = []
+    for name in names:
+        name = MAP_ID_NAME.get(name, name)
+        if name not in MAP_NAME_ID:
+            raise ValueError(f'Unknown dataset {name}, available datasets: {", ".join(MAP_NAME_ID)}')
+        selected.append(name)
+    return sorted(set(selected), key=MAP_NAME_ID.get)
+
+
+def _save_atomic(path, array):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _load_dataset(data_home, name, mmap_mode):
+    """
+    Returns X and y of the dataset. On the first use the dataset is converted to uncompressed .npy files in the
+    extracted catalogue (from an already extracted .npz file or from its own member of the archive), so that it can be
+    memory mapped. Each file is written atomically and the labels are written first, the data file marks a complete
+    conversion.
+    """
+    extracted_dir = join(data_home, "extracted")
+    npz_name = PRE_FILENAME + str(MAP_NAME_ID[name]) + POST_FILENAME
+    dataset_dir = join(extracted_dir, PRE_FILENAME + str(MAP_NAME_ID[name]))
+    data_path, label_path = join(dataset_dir, 'data.npy'), join(dataset_dir, 'label.npy')
+
+    if not isfile(data_path):
+        os.makedirs(dataset_dir, exist_ok=True)
+        npz_path = join(extracted_dir, npz_name)
+        if isfile(npz_path):
+            data = np.load(npz_path)
+            X, y = data['data'], data['label']
+        else:
+            with tarfile.open(join(data_home, ARCHIVE_FILENAME), 'r:gz') as tar:
+                data = np.load(tar.extractfile(npz_name))
+                X, y = data['data'], data['label']
+        _save_atomic(label_path, y)
+        _save_atomic(data_path, X)
+
+    return np.load(data_path, mmap_mode=mmap_mode), np.load(label_path, mmap_mode=mmap_mode)
+
+
+def load_datasets(data_home=DATA_HOME_BASIC, names=None, mmap_mode=None):
+    """
+    Load the benchmark datasets. The datasets are loaded lazily, on the first access, and only the archive members
+    of the accessed datasets are extracted.
 
     :param data_home: Default catalogue in which the data is stored in .tar.gz format.
+    :param names: names (or IDs) of the datasets to load, if None all datasets are available.
+    :param mmap_mode: mode in which the arrays are memory mapped, see numpy.load, e.g. 'r' to open large datasets
+        read only without reading them into memory. If None (default), the arrays are read into memory.
     :returns:
-        OrderedDict of Bunch object. Each Bunch object refered as dataset have the following attributes:
+        LazyDatasets - read only mapping (in the order of IDs) of Bunch objects. Each Bunch object refered as
+        dataset have the following attributes:
 
             * dataset.data :
                 ndarray, shape (n_samples, n_features)
@@ -57,26 +151,4 @@ def load_datasets(data_home=DATA_HOME_BASIC):
             * dataset.DESCR :
                 string Description of the each dataset.
     """
-    extracted_dir = join(data_home, "extracted")
-    datasets = OrderedDict()
-
-    filter_data_ = MAP_NAME_ID.keys()
-
-    for it in filter_data_:
-        filename = PRE_FILENAME + str(MAP_NAME_ID[it]) + POST_FILENAME
-        filename = join(extracted_dir, filename)
-        available = isfile(filename)
-
-        if not available:
-            makedirs(extracted_dir, exist_ok=True)
-            with open(f'{data_home}data.tar.gz', 'rb') as fin:
-                f = BytesIO(fin.read())
-            tar = tarfile.open(fileobj=f)
-            tar.extractall(path=extracted_dir)
-
-        data = np.load(filename)
-        X, y = data['data'], data['label']
-
-        datasets[it] = Bunch(data=X, target=y, DESCR=it)
-
-    return datasets
+    return LazyDatasets(data_home, names, mmap_mode)
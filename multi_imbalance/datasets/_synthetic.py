@@ -0,0 +1,296 @@
+"""Generator of synthetic multi-class imbalanced datasets of arbitrary size.
+
+Each class is a gaussian cluster around its own center. Examples of the minority classes (all classes except the
+biggest one) can be of one of four types, following the typology of Napierala and Stefanowski:
+
+ * safe - located in the homogeneous region of its class, around the class center,
+ * borderline - located near the boundary between its class and another class,
+ * rare - small groups of a few examples located inside the region of another class,
+ * outlier - single examples located inside the region of another class.
+
+Reference:
+K. Napierala, J. Stefanowski: Types of minority class examples and their influence on learning classifiers from
+imbalanced data. J Intell Inf Syst (2016) 46: 563
+"""
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy import sparse
+from sklearn.utils import check_random_state
+
+from multi_imbalance.utils.array_util import vstack
+
+# Class distributions of the benchmark datasets described in multi_imbalance.datasets._data_loader
+CLASS_RATIO_PROFILES = OrderedDict([
+    ('balance_scale', [46.1, 46.1, 7.8]),
+    ('cmc', [42.7, 34.7, 22.6]),
+    ('cleveland', [53.9, 18.2, 11.8, 11.8, 4.4]),
+    ('dermatology', [31, 19.8, 16.8, 13.4, 13.4, 5.6]),
+    ('ecoli', [42.6, 22.9, 15.5, 10.4, 6, 1.5, 0.6, 0.6]),
+    ('glass', [35.5, 32.7, 13.6, 8, 6.1, 4.2]),
+    ('hayes_roth', [38.6, 38.6, 22.7]),
+    ('new_thyroid', [69.8, 16.3, 14]),
+    ('winequailty_red', [42.6, 39.9, 12.4, 3.3, 1.1, 0.6]),
+    ('yeast', [31.2, 28.9, 16.4, 11, 3.4, 3, 2.5, 2, 1.4, 0.3]),
+])
+
+EXAMPLE_TYPES = ['safe', 'borderline', 'rare', 'outlier']
+
+_RARE_GROUPS_PER_CLASS = 5
+_RARE_STD = 0.1
+
+
+def class_ratio_profile(profile, n_classes=None, imbalance_ratio=10):
+    """
+    Returns class proportions summing up to 1, the biggest class first.
+
+    :param profile:
+        class distribution. Possible values:
+
+        * name of the profile from CLASS_RATIO_PROFILES, e.g. 'yeast'
+        * string with ratios separated by colons, e.g. '1:2:6'
+        * sequence of ratios, e.g. [46.1, 46.1, 7.8]
+        * 'geometric' :
+            n_classes classes with sizes decreasing geometrically, the biggest class is imbalance_ratio times
+            bigger than the smallest one
+        * 'linear' :
+            n_classes classes with sizes decreasing linearly, the biggest class is imbalance_ratio times bigger
+            than the smallest one
+        * 'step' :
+            one majority class imbalance_ratio times bigger than each of n_classes - 1 equal minority classes
+    :param n_classes:
+        number of classes, required by 'geometric', 'linear' and 'step' profiles and ignored by the other ones
+    :param imbalance_ratio:
+        ratio of the biggest to the smallest class, used by 'geometric', 'linear' and 'step' profiles
+    :return:
+        numpy array of class proportions
+    """
+    if isinstance(profile, str) and profile in ('geometric', 'linear', 'step'):
+        if n_classes is None or n_classes < 2:
+            raise ValueError(f"Profile '{profile}' requires n_classes >= 2")
+        if profile == 'geometric':
+            ratios = np.geomspace(imbalance_ratio, 1, n_classes)
+        elif profile == 'linear':
+            ratios = np.linspace(imbalance_ratio, 1, n_classes)
+        else:
+            ratios = np.array([imbalance_ratio] + [1] * (n_classes - 1), dtype=float)
+    elif isinstance(profile, str) and profile in CLASS_RATIO_PROFILES:
+        ratios = np.array(CLASS_RATIO_PROFILES[profile], dtype=float)
+    elif isinstance(profile, str):
+        try:
+            ratios = np.array([float(r) for r in profile.split(':')])
+        except ValueError:
+            raise ValueError("Unknown class ratio profile: %s, expected to be one of %s or ratios separated by "
+                             "colons." % (profile, ['geometric', 'linear', 'step'] + list(CLASS_RATIO_PROFILES)))
+    else:
+        ratios = np.array(profile, dtype=float)
+
+    if ratios.shape[0] < 2 or (ratios <= 0).any():
+        raise ValueError('Profile must contain at least two positive ratios')
+    return np.sort(ratios)[::-1] / ratios.sum()
+
+
+def _class_counts(n_samples, proportions):
+    """
+    Splits n_samples between classes according to proportions with the largest remainder method, every class gets
+    at least one example.
+    """
+    exact = proportions * n_samples
+    counts = np.maximum(np.floor(exact).astype(int), 1)
+    remainder = n_samples - counts.sum()
+    if remainder > 0:
+        counts[np.argsort(counts - exact)[:remainder]] += 1
+    elif remainder < 0:
+        for idx in np.argsort(exact - counts):
+            if remainder == 0:
+                break
+            if counts[idx] > 1:
+                counts[idx] -= 1
+                remainder += 1
+    return counts
+
+
+def _example_type_proportions(example_types):
+    if example_types is None:
+        return np.array([1., 0., 0., 0.])
+    unknown = set(example_types) - set(EXAMPLE_TYPES)
+    if unknown:
+        raise ValueError("Unknown example types: %s, expected to be one of %s." % (sorted(unknown), EXAMPLE_TYPES))
+    proportions = np.array([example_types.get(t, 0) for t in EXAMPLE_TYPES], dtype=float)
+    if (proportions < 0).any() or proportions.sum() <= 0:
+        raise ValueError('Proportions of example types must be non negative and sum up to a positive number')
+    return proportions / proportions.sum()
+
+
+class _Generator:
+    """
+    Holds the class geometry shared by all chunks of a dataset.
+    """
+
+    def __init__(self, n_samples, profile, n_classes, imbalance_ratio, n_features, n_informative, overlap,
+                 example_types, sparsity, random_state):
+        if not 0 <= overlap <= 1:
+            raise ValueError(f'Expected 0 <= overlap <= 1, got {overlap}')
+        if not 0 <= sparsity < 1:
+            raise ValueError(f'Expected 0 <= sparsity < 1, got {sparsity}')
+        self.proportions = class_ratio_profile(profile, n_classes, imbalance_ratio)
+        self.n_classes = self.proportions.shape[0]
+        if n_samples < self.n_classes:
+            raise ValueError(f'Expected n_samples >= number of classes, got {n_samples} < {self.n_classes}')
+        self.n_samples = n_samples
+        self.n_features = n_features
+        self.n_informative = n_features if n_informative is None else n_informative
+        if not 1 <= self.n_informative <= n_features:
+            raise ValueError(f'Expected 1 <= n_informative <= n_features, got {self.n_informative}')
+        self.type_proportions = _example_type_proportions(example_types)
+        self.sparsity = sparsity
+
+        random_state = check_random_state(random_state)
+        self.seed = random_state.randint(np.iinfo(np.int32).max)
+
+        directions = random_state.normal(size=(self.n_classes, self.n_informative))
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        self.centers = 4 * (1 - overlap) * directions
+
+        # every minority class gets a few rare groups, each placed around the center of another class
+        self.rare_centers = np.empty((self.n_classes, _RARE_GROUPS_PER_CLASS, self.n_informative))
+        for label in range(self.n_classes):
+            hosts = random_state.choice(self._other_classes(label), _RARE_GROUPS_PER_CLASS)
+            self.rare_centers[label] = self.centers[hosts] + random_state.normal(
+                scale=0.5, size=(_RARE_GROUPS_PER_CLASS, self.n_informative))
+
+        counts = _class_counts(n_samples, self.proportions)
+        label_dtype = np.min_scalar_type(self.n_classes - 1)
+        self.y = random_state.permutation(np.repeat(np.arange(self.n_classes, dtype=label_dtype), counts))
+
+    def _other_classes(self, label):
+        return np.delete(np.arange(self.n_classes), label)
+
+    def chunk(self, start, stop):
+        """
+        Generates rows from start to stop. Each chunk uses its own seed, so chunks can be generated independently.
+        """
+        random_state = np.random.RandomState([self.seed, start])
+        y = self.y[start:stop]
+        n_rows = y.shape[0]
+
+        types = np.zeros(n_rows, dtype=int)
+        minority = y != 0
+        types[minority] = random_state.choice(len(EXAMPLE_TYPES), minority.sum(), p=self.type_proportions)
+        others = (y + random_state.randint(1, self.n_classes, n_rows)) % self.n_classes
+
+        informative = random_state.normal(size=(n_rows, self.n_informative))
+        safe, borderline, rare, outlier = (types == t for t in range(len(EXAMPLE_TYPES)))
+        informative[safe] += self.centers[y[safe]]
+        boundary = (self.centers[y[borderline]] + self.centers[others[borderline]]) / 2
+        informative[borderline] = boundary + 0.5 * informative[borderline]
+        groups = random_state.randint(_RARE_GROUPS_PER_CLASS, size=rare.sum())
+        informative[rare] = self.rare_centers[y[rare], groups] + _RARE_STD * informative[rare]
+        informative[outlier] += self.centers[others[outlier]]
+
+        X = np.empty((n_rows, self.n_features))
+        X[:, :self.n_informative] = informative
+        X[:, self.n_informative:] = random_state.normal(size=(n_rows, self.n_features - self.n_informative))
+        if self.sparsity > 0:
+            X[random_state.random_sample(X.shape) < self.sparsity] = 0
+        return X, y
+
+
+def iter_imbalanced_classification(n_samples, chunk_size=10000, profile='geometric', n_classes=3,
+                                   imbalance_ratio=10, n_features=10, n_informative=None, overlap=0.5,
+                                   example_types=None, sparsity=0., sparse_output=False, random_state=None):
+    """
+    Generates a multi-class imbalanced dataset in chunks of rows, so that datasets bigger than the memory can be
+    created. Only the labels (one small integer per example) are kept in memory for the whole dataset.
+
+    :param n_samples:
+        number of examples
+    :param chunk_size:
+        maximal number of rows in a chunk
+    :param profile:
+        class distribution, see class_ratio_profile. Class 0 is the biggest one.
+    :param n_classes:
+        number of classes of 'geometric', 'linear' and 'step' profiles, other profiles define it themselves
+    :param imbalance_ratio:
+        ratio of the biggest to the smallest class, used by 'geometric', 'linear' and 'step' profiles
+    :param n_features:
+        number of features
+    :param n_informative:
+        number of features that depend on the class, the remaining ones are gaussian noise. Defaults to n_features.
+    :param overlap:
+        number from 0 to 1 controlling how much the classes overlap. Class centers lie on a sphere with radius
+        4 * (1 - overlap) (in units of the class standard deviation), so 1 means all classes have the same center.
+    :param example_types:
+        dict with proportions of 'safe', 'borderline', 'rare' and 'outlier' examples of minority classes,
+        e.g. {'safe': 0.6, 'borderline': 0.3, 'rare': 0.05, 'outlier': 0.05}. Examples of the biggest class are
+        always safe. None means only safe examples.
+    :param sparsity:
+        fraction of feature values set to zero
+    :param sparse_output:
+        if True, chunks of X are scipy CSR matrices
+    :param random_state:
+        the seed of the pseudo random number generator. The generated data depends also on chunk_size.
+    :return:
+        generator of (X_chunk, y_chunk) tuples
+    """
+    generator = _Generator(n_samples, profile, n_classes, imbalance_ratio, n_features, n_informative, overlap,
+                           example_types, sparsity, random_state)
+    for start in range(0, n_samples, chunk_size):
+        X, y = generator.chunk(start, min(start + chunk_size, n_samples))
+        yield (sparse.csr_matrix(X) if sparse_output else X), y
+
+
+def make_imbalanced_classification(n_samples, chunk_size=10000, **kwargs):
+    """
+    Generates a multi-class imbalanced dataset in memory.
+
+    :param n_samples:
+        number of examples
+    :param chunk_size:
+        number of rows generated at once
+    :param kwargs:
+        parameters of iter_imbalanced_classification
+    :return:
+        X (numpy array or CSR matrix if sparse_output) and y
+    """
+    chunks = list(iter_imbalanced_classification(n_samples, chunk_size=chunk_size, **kwargs))
+    return vstack([X for X, _ in chunks]), np.concatenate([y for _, y in chunks])
+
+
+def make_imbalanced_memmap(n_samples, X_path, y_path, chunk_size=10000, dtype=np.float64, **kwargs):
+    """
+    Generates a multi-class imbalanced dataset directly into .npy files, chunk by chunk, without keeping X in memory.
+
+    :param n_samples:
+        number of examples
+    :param X_path:
+        path of the .npy file for examples
+    :param y_path:
+        path of the .npy file for labels
+    :param chunk_size:
+        number of rows generated and written at once
+    :param dtype:
+        floating point type of the stored examples
+    :param kwargs:
+        parameters of iter_imbalanced_classification, sparse_output is not supported
+    :return:
+        X and y opened read only with numpy.load(..., mmap_mode='r')
+    """
+    if kwargs.get('sparse_output', False):
+        raise ValueError('sparse_output is not supported by make_imbalanced_memmap')
+
+    X_out, y_out = None, None
+    start = 0
+    for X, y in iter_imbalanced_classification(n_samples, chunk_size=chunk_size, **kwargs):
+        if X_out is None:
+            X_out = open_memmap(X_path, mode='w+', dtype=dtype, shape=(n_samples, X.shape[1]))
+            y_out = open_memmap(y_path, mode='w+', dtype=y.dtype, shape=(n_samples,))
+        X_out[start:start + X.shape[0]] = X
+        y_out[start:start + X.shape[0]] = y
+        start += X.shape[0]
+    X_out.flush()
+    y_out.flush()
+    del X_out, y_out
+
+    return np.load(X_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
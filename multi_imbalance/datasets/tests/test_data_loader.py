@@ -1,6 +1,11 @@
 """Test the datasets loader.
 """
 
+import shutil
+
+import numpy as np
+import pytest
+
 from multi_imbalance.datasets import load_datasets
 
 DATASET_SHAPE = {
@@ -30,3 +35,32 @@ def test_load_datasets():
     for k in DATASET_SHAPE.keys():
         X = datasets[k].data
         assert DATASET_SHAPE[k] == X.shape
+
+
+def test_load_datasets_lazily(tmp_path):
+    data_home = str(tmp_path) + '/'
+    shutil.copy('./data/data.tar.gz', data_home)
+    datasets = load_datasets(data_home=data_home, names=['glass', 5], mmap_mode='r')
+    assert list(datasets) == ['balance-scale', 'glass']
+    assert not (tmp_path / 'extracted').exists()
+
+    X = datasets['glass'].data
+    assert X.shape == DATASET_SHAPE['glass']
+    assert isinstance(X, np.memmap)
+    assert datasets['glass'] is datasets['glass']
+    assert sorted(p.name for p in (tmp_path / 'extracted').iterdir()) == ['x10']
+
+    with pytest.raises(KeyError):
+        datasets['cmc']
+
+
+def test_load_datasets_in_memory():
+    datasets = load_datasets(data_home="./data/", names='cmc')
+    assert not isinstance(datasets['cmc'].data, np.memmap)
+    datasets['cmc'].data[0] = 0
+    assert datasets['cmc'].target.shape == (DATASET_SHAPE['cmc'][0],)
+
+
+def test_unknown_dataset():
+    with pytest.raises(ValueError):
+        load_datasets(data_home="./data/", names=['unknown'])
@@ -0,0 +1,95 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from scipy.sparse import csr_matrix
+
+from multi_imbalance.datasets import (class_ratio_profile, iter_imbalanced_classification,
+                                      make_imbalanced_classification, make_imbalanced_memmap)
+
+
+@pytest.mark.parametrize("profile, expected", [
+    ('1:2:6', [6 / 9, 2 / 9, 1 / 9]),
+    ([1, 1, 2], [0.5, 0.25, 0.25]),
+    ('hayes_roth', [38.6 / 99.9, 38.6 / 99.9, 22.7 / 99.9]),
+])
+def test_class_ratio_profile(profile, expected):
+    assert np.allclose(class_ratio_profile(profile), expected)
+
+
+def test_generated_class_ratio_profiles():
+    assert np.allclose(class_ratio_profile('geometric', 3, imbalance_ratio=4), [4 / 7, 2 / 7, 1 / 7])
+    assert np.allclose(class_ratio_profile('linear', 3, imbalance_ratio=5), [5 / 9, 3 / 9, 1 / 9])
+    assert np.allclose(class_ratio_profile('step', 3, imbalance_ratio=8), [0.8, 0.1, 0.1])
+
+
+@pytest.mark.parametrize("profile, n_classes", [('unknown', None), ('geometric', None), ([1], None)])
+def test_invalid_class_ratio_profile(profile, n_classes):
+    with pytest.raises(ValueError):
+        class_ratio_profile(profile, n_classes)
+
+
+def test_class_counts_follow_profile():
+    X, y = make_imbalanced_classification(1000, profile='1:3:6', n_features=4, random_state=0)
+    assert X.shape == (1000, 4)
+    assert Counter(y) == {0: 600, 1: 300, 2: 100}
+
+
+def test_every_class_is_present():
+    _, y = make_imbalanced_classification(200, profile='geometric', n_classes=50, random_state=0)
+    assert np.unique(y).shape[0] == 50
+
+
+def test_deterministic():
+    X1, y1 = make_imbalanced_classification(500, chunk_size=100, random_state=1)
+    X2, y2 = make_imbalanced_classification(500, chunk_size=100, random_state=1)
+    assert_array_equal(X1, X2)
+    assert_array_equal(y1, y2)
+
+
+def test_chunks():
+    chunks = list(iter_imbalanced_classification(1050, chunk_size=100, random_state=0))
+    assert len(chunks) == 11
+    assert [X.shape[0] for X, _ in chunks] == [100] * 10 + [50]
+    assert all(X.shape[0] == y.shape[0] for X, y in chunks)
+
+
+def test_overlap():
+    def separation(overlap):
+        X, y = make_imbalanced_classification(2000, profile='1:1', n_features=2, overlap=overlap, random_state=0)
+        return np.linalg.norm(X[y == 0].mean(axis=0) - X[y == 1].mean(axis=0))
+
+    assert separation(0) > separation(0.5) > separation(1)
+    assert separation(1) < 0.2
+
+
+def test_example_types():
+    X, y = make_imbalanced_classification(4000, profile='3:1', n_features=2, overlap=0, random_state=0,
+                                          example_types={'outlier': 1})
+    majority_center = X[y == 0].mean(axis=0)
+    minority_distances = np.linalg.norm(X[y == 1] - majority_center, axis=1)
+    assert np.median(minority_distances) < 2
+
+
+def test_invalid_example_types():
+    with pytest.raises(ValueError):
+        make_imbalanced_classification(100, example_types={'noisy': 1})
+
+
+def test_dimensionality_and_sparsity():
+    X, _ = make_imbalanced_classification(1000, n_features=20, n_informative=5, sparsity=0.8, sparse_output=True,
+                                          random_state=0)
+    assert isinstance(X, csr_matrix)
+    assert X.shape == (1000, 20)
+    assert 0.15 < X.nnz / (1000 * 20) < 0.25
+
+
+def test_make_imbalanced_memmap(tmp_path):
+    X, y = make_imbalanced_memmap(1050, str(tmp_path / 'X.npy'), str(tmp_path / 'y.npy'), chunk_size=100,
+                                  dtype=np.float32, random_state=0)
+    assert isinstance(X, np.memmap)
+    assert X.dtype == np.float32
+    X_expected, y_expected = make_imbalanced_classification(1050, chunk_size=100, random_state=0)
+    assert np.allclose(X, X_expected, atol=1e-6)
+    assert_array_equal(y, y_expected)
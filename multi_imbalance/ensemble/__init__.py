@@ -0,0 +1,5 @@
+from multi_imbalance._lazy import lazy_submodules
+
+__all__ = ['ecoc', 'mrbbagging', 'ovo', 'persistence', 'soup_bagging']
+
+__getattr__, __dir__ = lazy_submodules(__name__, __all__)
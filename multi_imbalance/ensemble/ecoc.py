@@ -1,19 +1,19 @@
 import os
 from collections import Counter
-from collections import defaultdict
 from copy import deepcopy
 
 import numpy as np
-from imblearn.over_sampling import SMOTE
 from sklearn.ensemble import BaggingClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import GaussianNB
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.tree import DecisionTreeClassifier
-from sklearn.utils import check_random_state
+from sklearn.utils import check_random_state, gen_batches, get_chunk_n_rows
 
-from multi_imbalance.resampling.global_cs import GlobalCS
-from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.utils.array_util import as_float, take_rows, spill
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.neighbors import make_neighbors, fit_neighbors, kneighbors_per_group
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class ECOC(BaggingClassifier):
@@ -26,11 +26,11 @@ class ECOC(BaggingClassifier):
 
     _allowed_encodings = ['dense', 'sparse', 'complete', 'OVA', 'OVO']
     _allowed_oversampling = [None, 'globalCS', 'SMOTE', 'SOUP']
-    _allowed_classifiers = ['tree', 'NB', 'KNN']
+    _allowed_classifiers = ['tree', 'NB', 'KNN', 'shared_KNN']
     _allowed_weights = [None, 'acc', 'avg_tpr_min']
 
     def __init__(self, binary_classifier='KNN', preprocessing='SOUP', encoding='OVO', n_neighbors=3,
-                 weights=None):
+                 weights=None, dtype=None, memory_budget=None, class_profile=None, working_memory=None):
         """
         :param binary_classifier:
             binary classifier used by the algorithm. Possible classifiers:
@@ -41,6 +41,11 @@ class ECOC(BaggingClassifier):
                 Naive Bayes Classifier,
             * 'KNN' :
                 K-Nearest Neighbors
+            * 'shared_KNN' :
+                K-Nearest Neighbors answering all dichotomies from a single neighbour index over the whole training
+                set, the neighbours of a test example are filtered to the classes with non zero codes in each
+                dichotomy. Predictions are the same as with 'KNN', but the training data is stored once and each test
+                example is queried once instead of once per dichotomy. Requires preprocessing=None
             * 'ClassifierMixin' :
                 An instance of a class that implements ClassifierMixin
         :param preprocessing:
@@ -74,6 +79,7 @@ class ECOC(BaggingClassifier):
                 Solving multiclass learning problems via error-correcting output codes.
                 Journal of Artificial Intelligence Research, 2:263–286, 1995.
         :param n_neighbors:
+            number of nearest neighbors in KNN, works only if binary_classifier is 'KNN' or 'shared_KNN'
         :param weights:
             strategy for dichotomies weighting. Possible values:
 
@@ -83,6 +89,20 @@ class ECOC(BaggingClassifier):
                 accuracy-based weights
             * 'avg_tpr_min' :
                 weights based on average true positive rates of dichotomies
+        :param dtype:
+            floating point type X is converted to before learning and prediction, e.g. np.float32 to halve the
+            memory usage. If None, X is passed unchanged
+        :param memory_budget:
+            size in MiB above which the training set of a dichotomy (also after preprocessing) is written to
+            a temporary memory mapped file instead of memory. Together with numpy.memmap X, it allows training on data
+            larger than RAM. If None, the training sets are kept in memory
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y passed to fit, if None it is computed in fit. The encoded
+            labels of the profile are used to select the examples of each dichotomy
+        :param working_memory:
+            size in MiB of the outputs of the binary classifiers and of their distances to the class codes kept at
+            once by predict, predict_proba and decision_function, the test examples are processed in chunks fitting
+            in it. If None, sklearn's working_memory config is used
         """
         super().__init__()
         self.binary_classifier = binary_classifier
@@ -90,6 +110,10 @@ class ECOC(BaggingClassifier):
         self.preprocessing = preprocessing
         self.n_neighbors = n_neighbors
         self.weights = weights
+        self.dtype = dtype
+        self.memory_budget = memory_budget
+        self.class_profile = class_profile
+        self.working_memory = working_memory
 
         self.minority_classes = list()
 
@@ -98,11 +122,13 @@ class ECOC(BaggingClassifier):
         self._labels = None
         self._dich_weights = None
 
+    @instrumented
     def fit(self, X, y, minority_classes=None):
         """
 
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
         :param y:
             one dimensional numpy array with labels for rows in X
         :param minority_classes:
@@ -112,48 +138,244 @@ class ECOC(BaggingClassifier):
         """
         if minority_classes is not None:
             self.minority_classes = minority_classes
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
 
+        y = np.asarray(y)
+        class_profile = get_class_profile(y, self.class_profile)
+        class_indices = class_profile.encoded
         if self.weights is not None:
-            X_train, X_for_weights, y_train, y_for_weights = train_test_split(X, y, test_size=0.2, stratify=y,
-                                                                              random_state=0)
+            train_indices, weights_indices = train_test_split(np.arange(y.shape[0]), test_size=0.2, stratify=y,
+                                                              random_state=0)
+            X_train, y_train = take_rows(X, train_indices, self.memory_budget), y[train_indices]
+            X_for_weights, y_for_weights = take_rows(X, weights_indices, self.memory_budget), y[weights_indices]
+            train_class_indices = class_indices[train_indices]
         else:
-            X_train, y_train = X, y
+            X_train, y_train, train_class_indices = X, y, class_indices
 
-        self._labels = np.unique(y)
-        self._gen_code_matrix()
-        self._binary_classifiers = [self._get_classifier() for _ in range(self._code_matrix.shape[1])]
-        self._learn_binary_classifiers(X_train, y_train)
+        self._labels = class_profile.classes
+        with phase('code_matrix'):
+            self._gen_code_matrix()
+        if self.binary_classifier == 'shared_KNN':
+            self._fit_shared_knn(X_train, y_train, train_class_indices)
+        else:
+            self._binary_classifiers = [self._get_classifier() for _ in range(self._code_matrix.shape[1])]
+            self._learn_binary_classifiers(X_train, y_train, train_class_indices)
+        if self.weights is not None:
+            with phase('weights'):
+                self._calc_weights(X_for_weights, y_for_weights, class_indices[weights_indices])
+        return self
+
+    @instrumented
+    def partial_fit(self, X, y, classes=None, minority_classes=None):
+        """
+        Incrementally trains the binary classifiers on a batch of examples, the binary classifier must implement
+        partial_fit (e.g. 'NB' or sklearn.linear_model.SGDClassifier). The batch is routed only to the dichotomies
+        with a non zero code of a class occurring in the batch. Classes seen for the first time extend the code
+        matrix with new rows and new dichotomies (see _extend_code_matrix), the other dichotomies are kept. The
+        binary classifier of a dichotomy is created when the first examples of its classes arrive, the dichotomies
+        without any training examples so far are left out of decoding. Preprocessing is applied to the examples of each dichotomy in the batch. Weighting of dichotomies is not
+        supported.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :param y:
+            one dimensional numpy array with labels for rows in X
+        :param classes:
+            labels of all classes expected in the batches. If given in the first call, the code matrix is generated
+            for all of them, the binary classifiers are still created only for the dichotomies with examples
+        :param minority_classes:
+            list of classes considered to be minority classes, kept from the previous call if None
+        :return:
+            self: object
+        """
         if self.weights is not None:
-            self._calc_weights(X_for_weights, y_for_weights)
+            raise ValueError("partial_fit does not support weighting of dichotomies, use weights=None")
+        if not hasattr(self._get_classifier(), 'partial_fit'):
+            raise ValueError("Binary classifier must implement partial_fit method to use partial_fit")
+        if minority_classes is not None:
+            self.minority_classes = minority_classes
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        y = np.asarray(y)
+
+        labels = np.unique(y) if classes is None else np.union1d(np.unique(y), classes)
+        with phase('code_matrix'):
+            if self._code_matrix is None:
+                self._labels = labels
+                self._gen_code_matrix()
+                self._binary_classifiers = [None] * self._code_matrix.shape[1]
+            else:
+                self._extend_code_matrix(labels)
+        self._learn_binary_classifiers(X, y, partial=True)
         return self
 
+    @instrumented
     def predict(self, X):
         """
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
         :return:
             numpy array, shape = [number of samples]. Predicted target values for X.
         """
-        output_codes = np.zeros((X.shape[0], self._code_matrix.shape[1]))
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        predicted = np.empty(X.shape[0], dtype=self._labels.dtype)
+        for chunk in self._chunks(X):
+            with phase('predict_binary'):
+                output_codes = self._predict_output_codes(X[chunk])
+            with phase('decode'):
+                predicted[chunk] = self._labels[np.argmin(self._code_distances(output_codes), axis=1)]
+        return predicted
+
+    @instrumented
+    def decision_function(self, X):
+        """
+        Loss-based decoding with the exponential loss, reference:
+        E. L. Allwein, R. E. Schapire, Y. Singer:
+        Reducing multiclass to binary: A unifying approach for margin classifiers.
+        Journal of Machine Learning Research 1 (2000), 113–141.
+
+        The margin of a binary classifier is P(1) - P(-1) of its predict_proba, or its prediction if it does not
+        implement predict_proba. The score of a class is minus the sum of exp(-code * margin) over the dichotomies,
+        multiplied by the weights of the dichotomies if weights is not None.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :return:
+            numpy array, shape = [number of samples, number of classes]. Scores of the classes in sorted order.
+        """
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        scores = np.empty((X.shape[0], self._code_matrix.shape[0]))
+        for chunk in self._chunks(X):
+            with phase('predict_binary'):
+                margins = self._predict_output_codes(X[chunk], soft=True)
+            with phase('decode'):
+                scores[chunk] = self._decode_loss(margins)
+        return scores
+
+    @instrumented
+    def predict_proba(self, X):
+        """
+        Class probabilities obtained by soft decoding: the softmax of the scores returned by decision_function.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :return:
+            numpy array, shape = [number of samples, number of classes]. Probabilities of the classes in sorted
+            order.
+        """
+        scores = self.decision_function(X)
+        probabilities = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def _chunks(self, X):
+        chunk_n_rows = get_chunk_n_rows(row_bytes=8 * self._code_matrix.size, max_n_rows=max(X.shape[0], 1),
+                                        working_memory=self.working_memory)
+        return gen_batches(X.shape[0], chunk_n_rows)
+
+    def _predict_output_codes(self, X, soft=False):
+        """
+        Calls every binary classifier once for all examples in X.
+
+        :return:
+            array (number of samples x number of dichotomies) with the predicted codes, or with the margins in
+            [-1, 1] if soft is True, 0 for the dichotomies without binary classifiers
+        """
+        if self.binary_classifier == 'shared_KNN':
+            return self._predict_shared_knn(X, soft)
+
+        output_codes = np.zeros((X.shape[0], self._code_matrix.shape[1]), dtype=float if soft else np.int8)
         for classifier_idx, classifier in enumerate(self._binary_classifiers):
-            output_codes[:, classifier_idx] = classifier.predict(X)
+            if classifier is None:
+                continue
+            if soft and hasattr(classifier, 'predict_proba'):
+                probabilities = classifier.predict_proba(X)
+                output_codes[:, classifier_idx] = probabilities[:, classifier.classes_ == 1].sum(axis=1) - \
+                    probabilities[:, classifier.classes_ == -1].sum(axis=1)
+            else:
+                output_codes[:, classifier_idx] = classifier.predict(X)
+        count('classifier_predictions', np.count_nonzero(self._fitted_dichotomies()))
+        return output_codes
+
+    def _fitted_dichotomies(self):
+        """
+        :return:
+            boolean array (number of dichotomies), False for the dichotomies whose binary classifiers have not been
+            created by partial_fit yet
+        """
+        if self.binary_classifier == 'shared_KNN':
+            return np.ones(self._code_matrix.shape[1], dtype=bool)
+        return np.array([classifier is not None for classifier in self._binary_classifiers], dtype=bool)
 
-        predicted = np.zeros(X.shape[0])
-        for row_idx, encoded_row in enumerate(output_codes):
-            predicted[row_idx] = self._get_closest_class(encoded_row)
+    def _code_distances(self, output_codes):
+        """
+        :return:
+            array (number of samples x number of classes) with Hamming distances of the output codes to the codes
+            of the classes, or with weighted squared Euclidean distances if weights is not None. Only the dichotomies
+            with binary classifiers are compared
+        """
+        fitted = self._fitted_dichotomies()
+        code_matrix, output_codes = self._code_matrix[:, fitted], output_codes[:, fitted]
+        if self.weights is not None:
+            return (self.dich_weights[fitted] * (code_matrix[np.newaxis] - output_codes[:, np.newaxis]) ** 2) \
+                .sum(axis=2)
+        return np.count_nonzero(code_matrix[np.newaxis] != output_codes[:, np.newaxis], axis=2)
 
-        return predicted
+    def _decode_loss(self, margins):
+        fitted = self._fitted_dichotomies()
+        losses = np.exp(-self._code_matrix[np.newaxis, :, fitted] * margins[:, np.newaxis, fitted])
+        if self.weights is not None:
+            losses *= self.dich_weights[fitted]
+        return -losses.sum(axis=2)
 
-    def _learn_binary_classifiers(self, X, y):
+    def _fit_shared_knn(self, X, y, class_indices=None):
+        if self.preprocessing is not None:
+            raise ValueError("shared_KNN binary classifier does not support preprocessing, use preprocessing=None")
+        self._binary_classifiers = []
+        self._shared_neighbors = fit_neighbors(make_neighbors(n_neighbors=self.n_neighbors), X)
+        self._train_class_indices = np.searchsorted(self._labels, y) if class_indices is None else class_indices
+
+    def _predict_shared_knn(self, X, soft=False):
+        neighbour_classes = kneighbors_per_group(self._shared_neighbors, X, self._train_class_indices,
+                                                 (self._code_matrix != 0).T, self.n_neighbors)
+        output_codes = np.empty((X.shape[0], self._code_matrix.shape[1]), dtype=float if soft else np.int8)
+        for classifier_idx in range(self._code_matrix.shape[1]):
+            found = neighbour_classes[classifier_idx] >= 0
+            votes = np.where(found, self._code_matrix[neighbour_classes[classifier_idx], classifier_idx], 0)
+            if soft:
+                output_codes[:, classifier_idx] = votes.sum(axis=1) / np.maximum(found.sum(axis=1), 1)
+            else:
+                output_codes[:, classifier_idx] = np.where(votes.sum(axis=1) > 0, 1, -1)
+        count('classifier_predictions', self._code_matrix.shape[1])
+        return output_codes
+
+    def _learn_binary_classifiers(self, X, y, class_indices=None, partial=False):
+        if class_indices is None:
+            class_indices = np.searchsorted(self._labels, y)
         for classifier_idx, classifier in enumerate(self._binary_classifiers):
-            excluded_classes_indices = [idx for idx in range(len(y)) if
-                                        self._code_matrix[self._labels.tolist().index(y[idx])][classifier_idx] == 0]
-            X_filtered = np.delete(X, excluded_classes_indices, 0)
-            y_filtered = np.delete(y, excluded_classes_indices)
-            binary_labels = np.array([self._code_matrix[self._labels.tolist().index(clazz)][classifier_idx] for clazz in
-                                      y_filtered])
-            X_filtered, binary_labels = self._oversample(X_filtered, binary_labels)
-            classifier.fit(X_filtered, binary_labels)
+            codes = self._code_matrix[class_indices, classifier_idx]
+            included_indices = np.flatnonzero(codes != 0)
+            if partial and included_indices.shape[0] == 0:
+                continue
+            X_filtered = take_rows(X, included_indices, self.memory_budget)
+            binary_labels = codes[included_indices]
+            with phase('oversample'):
+                X_filtered, binary_labels = self._oversample(X_filtered, binary_labels)
+                X_filtered = spill(X_filtered, self.memory_budget)
+            with phase('fit_binary'):
+                if partial:
+                    if classifier is None:
+                        classifier = self._binary_classifiers[classifier_idx] = self._get_classifier()
+                    classifier.partial_fit(X_filtered, binary_labels, classes=np.array([-1, 1]))
+                else:
+                    classifier.fit(X_filtered, binary_labels)
+            count('classifiers_fitted')
 
     def _gen_code_matrix(self):
         if self.encoding == 'dense':
@@ -169,6 +391,68 @@ class ECOC(BaggingClassifier):
         else:
             raise ValueError("Unknown matrix generation encoding: %s, expected to be one of %s."
                              % (self.encoding, ECOC._allowed_encodings))
+        self._code_matrix = self._code_matrix.astype(np.int8)
+
+    def _extend_code_matrix(self, labels, number_of_code_generations=10000):
+        """
+        Adds rows of classes not seen before to the code matrix, keeping the codes of the other classes and their
+        dichotomies, and adds dichotomies including the new classes:
+
+        * 'OVO' :
+            new classes get 0 in the existing dichotomies, a dichotomy is added for each new pair of classes
+        * 'OVA' :
+            new classes get -1 in the existing dichotomies, a dichotomy is added for each new class
+        * 'dense', 'sparse', 'complete' :
+            the codes of each new class in the existing dichotomies are drawn randomly, the code with the largest
+            minimal Hamming distance to the other classes out of number_of_code_generations is chosen. Random
+            dichotomies are added up to the code length of the encoding for the new number of classes, new classes
+            get non zero codes in them
+        """
+        if self.encoding not in ECOC._allowed_encodings:
+            raise ValueError("Unknown matrix generation encoding: %s, expected to be one of %s."
+                             % (self.encoding, ECOC._allowed_encodings))
+        new_labels = np.setdiff1d(labels, self._labels)
+        if new_labels.shape[0] == 0:
+            return
+
+        all_labels = np.union1d(self._labels, new_labels)
+        number_of_classes = all_labels.shape[0]
+        old_rows, new_rows = np.searchsorted(all_labels, self._labels), np.searchsorted(all_labels, new_labels)
+        matrix = np.zeros((number_of_classes, self._code_matrix.shape[1]), dtype=np.int8)
+        matrix[old_rows] = self._code_matrix
+        random_state = check_random_state(number_of_classes)
+
+        if self.encoding == 'OVO':
+            pairs = [(row, col) for row in range(number_of_classes) for col in range(row + 1, number_of_classes)
+                     if row in new_rows or col in new_rows]
+            new_columns = np.zeros((number_of_classes, len(pairs)), dtype=np.int8)
+            for column, (row, col) in enumerate(pairs):
+                new_columns[row, column], new_columns[col, column] = 1, -1
+        elif self.encoding == 'OVA':
+            matrix[new_rows] = -1
+            new_columns = -np.ones((number_of_classes, new_rows.shape[0]), dtype=np.int8)
+            new_columns[new_rows, np.arange(new_rows.shape[0])] = 1
+        else:
+            values, probabilities = ([-1, 0, 1], [0.25, 0.5, 0.25]) if self.encoding == 'sparse' else ([-1, 1], None)
+            assigned = np.zeros(number_of_classes, dtype=bool)
+            assigned[old_rows] = True
+            for row in new_rows:
+                candidates = random_state.choice(values, size=(number_of_code_generations, matrix.shape[1]),
+                                                 p=probabilities)
+                distances = (candidates[:, np.newaxis, :] != matrix[assigned][np.newaxis]).sum(axis=2)
+                matrix[row] = candidates[np.argmax(distances.min(axis=1, initial=matrix.shape[1] + 1))]
+                assigned[row] = True
+
+            code_length = {'dense': int(np.ceil(10 * np.log2(number_of_classes))),
+                           'sparse': int(np.ceil(15 * np.log2(number_of_classes))),
+                           'complete': 2 ** (number_of_classes - 1) - 1}[self.encoding]
+            n_new_columns = max(code_length - matrix.shape[1], 0)
+            new_columns = random_state.choice(values, size=(number_of_classes, n_new_columns), p=probabilities)
+            new_columns[new_rows] = random_state.choice([-1, 1], size=(new_rows.shape[0], n_new_columns))
+
+        self._labels = all_labels
+        self._code_matrix = np.hstack((matrix, new_columns)).astype(np.int8)
+        self._binary_classifiers += [None] * new_columns.shape[1]
 
     def _encode_dense(self, number_of_classes, random_state=0, number_of_code_generations=10000):
         try:
@@ -287,17 +571,10 @@ class ECOC(BaggingClassifier):
     def _has_matrix_all_zeros_column(self, matrix):
         return (~matrix.any(axis=0)).any()
 
-    def _get_closest_class(self, row):
-        if self.weights is not None:
-            return self._labels[
-                np.argmin(
-                    [sum(np.multiply(self.dich_weights, (encoded_class - row) ** 2)) for encoded_class in
-                     self._code_matrix])]
-        else:
-            return self._labels[
-                np.argmin([self._hamming_distance(row, encoded_class) for encoded_class in self._code_matrix])]
-
     def _oversample(self, X, y):
+        from multi_imbalance.resampling.global_cs import GlobalCS
+        from multi_imbalance.resampling.soup import SOUP
+
         if self.preprocessing is None:
             return X, y
 
@@ -345,38 +622,32 @@ class ECOC(BaggingClassifier):
         if n_neighbors == 0:
             raise ValueError(
                 'In order to use SMOTE preprocessing, the training set should contain at least 2 examples from each class')
+        from imblearn.over_sampling import SMOTE
+
         smote = SMOTE(k_neighbors=n_neighbors, random_state=42)
         return smote.fit_resample(X, y)
 
-    def _calc_weights(self, X_for_weights, y_for_weights):
+    def _calc_weights(self, X_for_weights, y_for_weights, class_indices=None):
         if self.weights not in ECOC._allowed_weights:
             raise ValueError("Unknown weighting strategy: %s, expected to be one of %s."
                              % (self.weights, ECOC._allowed_weights))
 
+        y_for_weights = np.asarray(y_for_weights)
+        output_codes = self._predict_output_codes(X_for_weights)
+        if class_indices is None:
+            class_indices = np.searchsorted(self._labels, y_for_weights)
+        true_codes = self._code_matrix[class_indices]
+        correct = output_codes == true_codes
+
         dich_weights = np.ones(self._code_matrix.shape[1])
         if self.weights == 'acc':
-            for clf_idx, clf in enumerate(self._binary_classifiers):
-                samples_no = 0
-                correct_no = 0
-                for sample, sample_label in zip(X_for_weights, y_for_weights):
-                    if self._code_matrix[np.where(self._labels == sample_label)[0][0]][clf_idx] != 0:
-                        samples_no += 1
-                        if clf.predict([sample])[0] == \
-                                self._code_matrix[np.where(self._labels == sample_label)[0][0]][clf_idx]:
-                            correct_no += 1
-                if samples_no != 0:
-                    acc = correct_no / samples_no
-                    dich_weights[clf_idx] = -1 + 2 * acc
+            samples_no = np.count_nonzero(true_codes, axis=0)
+            correct_no = np.count_nonzero(correct & (true_codes != 0), axis=0)
+            evaluated = samples_no != 0
+            dich_weights[evaluated] = -1 + 2 * correct_no[evaluated] / samples_no[evaluated]
         elif self.weights == 'avg_tpr_min':
             min_counter = Counter([y for y in y_for_weights if y in self.minority_classes])
-
-            for clf_idx, clf in enumerate(self._binary_classifiers):
-                min_correct_pred = defaultdict(lambda: 0)
-                for sample, sample_label in zip(X_for_weights, y_for_weights):
-                    if clf.predict([sample])[0] == \
-                            self._code_matrix[np.where(self._labels == sample_label)[0][0]][clf_idx]:
-                        min_correct_pred[sample_label] += 1
-                avg_tpr_min = np.mean([min_correct_pred[clazz] / min_counter[clazz] for clazz in min_counter.keys()])
-                dich_weights[clf_idx] = avg_tpr_min
+            tpr_min = [np.mean(correct[y_for_weights == clazz], axis=0) for clazz in min_counter.keys()]
+            dich_weights[:] = np.mean(tpr_min, axis=0) if tpr_min else np.nan
 
         self.dich_weights = dich_weights
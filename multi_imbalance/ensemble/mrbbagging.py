@@ -1,13 +1,18 @@
-from collections import Counter
 from copy import deepcopy
+from inspect import signature
 from math import sqrt
 
 import numpy as np
+from scipy import sparse
 from scipy.stats import multinomial
 from sklearn.ensemble import BaggingClassifier
-from sklearn.feature_selection import SelectKBest, chi2, f_classif
-from sklearn.utils import resample
+from sklearn.utils import resample, check_random_state
 from sklearn.utils.random import sample_without_replacement
+from sklearn.utils.validation import _num_samples
+
+from multi_imbalance.utils.array_util import as_float, take_rows
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class MRBBagging(BaggingClassifier):
@@ -22,7 +27,7 @@ class MRBBagging(BaggingClassifier):
     """
 
     def __init__(self, k, learning_algorithm, undersampling=True, feature_selection=False, random_fs=False,
-                 half_features=True, random_state=None):
+                 half_features=True, random_state=None, dtype=None, memory_budget=None, class_profile=None):
         """
         :param k:
             number of classifiers (multiplied by 3 when choosing feature selection)
@@ -40,6 +45,16 @@ class MRBBagging(BaggingClassifier):
             (if False, it is set to the square root of the base number of features)
         :param random_state:
             (optional) the seed of the pseudo random number generator
+        :param dtype:
+            (optional) floating point type of the training subsets and of the data passed to the classifiers,
+            e.g. np.float32 to halve the memory usage. If None, float32 and float64 data is preserved and other types
+            are converted to float64. Labels are never converted.
+        :param memory_budget:
+            (optional) size in MiB above which the training subset of a classifier is written to a temporary memory
+            mapped file instead of memory. Together with numpy.memmap x, it allows training on data larger than RAM.
+            If None, the subsets are kept in memory.
+        :param class_profile:
+            (optional) multi_imbalance.utils.data.ClassProfile of y passed to fit, if None it is computed in fit.
         """
         super().__init__(random_state)
         assert learning_algorithm is not None, "Learning algorithm cannot be None"
@@ -53,43 +68,159 @@ class MRBBagging(BaggingClassifier):
         self.all_random = random_fs
         self.half_features = half_features
         self.random_state = random_state
+        self.dtype = dtype
+        self.memory_budget = memory_budget
+        self.class_profile = class_profile
+        self._class_counts = None
 
+    @instrumented
     def fit(self, x, y, **kwargs):
         """
         Build a MRBBagging ensemble of estimators from the training data.
 
         :param x:
-            Two dimensional numpy array (number of samples x number of features) with float numbers.
+            Two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers.
         :param y:
             One dimensional numpy array with labels for rows in X.
         :return:
             self (object)
         """
-        assert len(x) == len(y), "Not enough labels"
+        assert _num_samples(x) == len(y), "Not enough labels"
 
+        self._class_counts = None
+        if not sparse.issparse(x):
+            x = np.asarray(x)
         classes, grouped_data = self._group_data(x, y)
         prob = [1 / len(classes)] * len(classes)
         self._set_classes_dict(classes)
 
-        n = len(x)
+        n = _num_samples(x)
         if self.undersampling:
-            q = Counter(y)
-            n = min(q.values()) * len(q)
+            counts = get_class_profile(y, self.class_profile).counts
+            n = int(counts.min()) * len(counts)
 
         la_list = []
 
         if self.feature_selection:
             for i in range(3 * self.k):
                 la_list.append(deepcopy(self.learning_algorithm))
-            self._train_with_feature_selection(la_list, n, prob, classes, grouped_data)
+            self._train_with_feature_selection(la_list, x, y, n, prob, classes, grouped_data)
 
         else:
             for i in range(self.k):
                 la_list.append(deepcopy(self.learning_algorithm))
-            self._train(la_list, n, prob, classes, grouped_data)
+            self._train(la_list, x, y, n, prob, classes, grouped_data)
+
+        return self
 
+    @instrumented
+    def partial_fit(self, x, y, classes=None):
+        """
+        Online version of fit for data arriving in batches (Oza-style bagging), the classifier must implement
+        partial_fit and predict_proba, which is used by predict (e.g. sklearn.naive_bayes.GaussianNB or
+        sklearn.linear_model.SGDClassifier with loss='log_loss' or 'modified_huber'). Instead of drawing
+        a bootstrap sample of the whole data, each incoming example is given a weight in every bag drawn from the
+        Poisson distribution, whose rate follows from the numbers of examples of each class seen so far, so that
+        all classes are expected to be equally represented in each bag, as in fit. With undersampling the rate of
+        an example of class c is min_count / count(c), otherwise it is (n / number of classes) / count(c), where the
+        counts include the example itself. The classifiers are updated with the examples of non-zero weight, passed
+        as sample_weight or repeated if partial_fit of the classifier does not accept sample weights. Only the class
+        counts are kept between the calls, so the memory does not grow with the length of the stream.
+
+        Feature selection is supported only with random_fs=True, the features of each classifier are drawn in the
+        first call.
+
+        :param x:
+            Two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers.
+        :param y:
+            One dimensional numpy array with labels for rows in x.
+        :param classes:
+            Labels of all classes in the stream, required in the first call if not all of them occur in the first
+            batch, ignored in the subsequent calls.
+        :return:
+            self (object)
+        """
+        assert _num_samples(x) == len(y), "Not enough labels"
+        if self.feature_selection and not self.all_random:
+            raise ValueError("partial_fit supports only random feature selection, use random_fs=True")
+        if not hasattr(self.learning_algorithm, 'partial_fit'):
+            raise ValueError("Learning algorithm must implement partial_fit method to use partial_fit")
+        if not hasattr(self.learning_algorithm, 'predict_proba'):
+            raise ValueError("Learning algorithm must implement predict_proba method to use partial_fit, e.g. "
+                             "SGDClassifier with loss='log_loss' or 'modified_huber'")
+        x = as_float(x, self.dtype)
+        y = np.asarray(y)
+
+        if self._class_counts is None:
+            self._start_stream(x, y, classes)
+        if not np.isin(y, self._stream_classes).all():
+            raise ValueError(f"Labels {np.setdiff1d(y, self._stream_classes).tolist()} were not given in classes "
+                             f"of the first call")
+
+        with phase('resample'):
+            weights = self._random_state.poisson(self._poisson_rates(y)[:, np.newaxis],
+                                                 size=(len(y), len(self._online_learners)))
+        accepts_weights = 'sample_weight' in signature(self.learning_algorithm.partial_fit).parameters
+        for i, learner in enumerate(self._online_learners):
+            rows = np.flatnonzero(weights[:, i])
+            if len(rows) == 0:
+                continue
+            if not accepts_weights:
+                rows = np.repeat(rows, weights[rows, i])
+            count('rows_copied', len(rows))
+            subset_x = self._select_data(i, x[rows])
+            with phase('fit_classifier'):
+                if accepts_weights:
+                    learner.partial_fit(subset_x, y[rows], classes=self._stream_classes, sample_weight=weights[rows, i])
+                else:
+                    learner.partial_fit(subset_x, y[rows], classes=self._stream_classes)
+            count('classifiers_fitted')
+            self.classifiers[i] = learner
         return self
 
+    def _start_stream(self, x, y, classes):
+        """
+        Prepares the classifiers and the class counts in the first call of partial_fit.
+        """
+        self._stream_classes = np.unique(y) if classes is None else np.union1d(np.unique(y), classes)
+        self._class_counts = np.zeros(len(self._stream_classes), dtype=np.int64)
+        self._random_state = check_random_state(self.random_state)
+        self.classes = dict(enumerate(self._stream_classes))
+        self._set_classes_dict(self._stream_classes)
+        self.classifiers, self.feature_selection_methods = dict(), dict()
+
+        n_learners = 3 * self.k if self.feature_selection else self.k
+        self._online_learners = [deepcopy(self.learning_algorithm) for _ in range(n_learners)]
+        if self.feature_selection:
+            labels_no = x.shape[1]
+            features_no = int(labels_no / 2) if self.half_features else int(sqrt(labels_no))
+            for i in range(n_learners):
+                self.feature_selection_methods[i] = sample_without_replacement(labels_no, features_no,
+                                                                               random_state=self._random_state)
+
+    def _poisson_rates(self, y):
+        """
+        :return:
+            Poisson rate of each example in y, computed from the class counts updated with the examples preceding it
+            and the example itself. The class counts are updated with the whole batch.
+        """
+        class_ids = np.searchsorted(self._stream_classes, y)
+        one_hot = np.zeros((len(y), len(self._stream_classes)), dtype=np.int64)
+        one_hot[np.arange(len(y)), class_ids] = 1
+        counts = self._class_counts + np.cumsum(one_hot, axis=0)
+        self._class_counts = counts[-1].copy() if len(y) else self._class_counts
+
+        seen = counts > 0
+        own_counts = counts[np.arange(len(y)), class_ids]
+        if self.undersampling:
+            target = np.where(seen, counts, np.iinfo(np.int64).max).min(axis=1)
+        else:
+            target = counts.sum(axis=1) / seen.sum(axis=1)
+        return target / own_counts
+
+    @instrumented
     def predict(self, data):
         """
         Predict classes for examples in data.
@@ -97,37 +228,44 @@ class MRBBagging(BaggingClassifier):
         :param data:
             Two dimensional numpy array (number of samples x number of features) with float numbers.
         """
+        if self.dtype is not None:
+            data = as_float(data, self.dtype)
         return self._select_classes(data)
 
     def _group_data(self, x, y):
-        classes = set(y)
+        """
+        :return:
+            set of classes and dict class -> indices of the rows of x of the class. Rows are gathered from x by
+            indices once per bag, so sparse and memory mapped x are not split into single rows
+        """
+        y = np.asarray(y)
+        classes = set(y.tolist())
         self.classes = {key: value for (key, value) in enumerate(classes)}
-        data = [[x[i], y[i]] for i in range(len(x))]
         grouped_data = dict()
         for cl in classes:
             assert cl is not None, "Missing class name"
-            grouped_data[cl] = list(filter(lambda d: d[1] == cl, data))
+            grouped_data[cl] = np.flatnonzero(y == cl)
         return classes, grouped_data
 
-    def _resample(self, n, prob, classes, grouped_data):
+    def _resample(self, x, y, n, prob, classes, grouped_data):
         samples_no = multinomial.rvs(n=n, p=prob, random_state=self.random_state)
-        subset_x, subset_y = [], []
-        for no, j in enumerate(classes):
-            data = grouped_data[j]
-            resample_class = resample(data, replace=True, n_samples=samples_no[no], random_state=self.random_state)
-            for sample in resample_class:
-                subset_x.append(sample[0])
-                subset_y.append(sample[1])
-        return np.array(subset_x), np.array(subset_y)
-
-    def _train(self, la_list, n, prob, classes, grouped_data):
+        indices = [resample(grouped_data[j], replace=True, n_samples=samples_no[no], random_state=self.random_state)
+                   for no, j in enumerate(classes)]
+        indices = np.concatenate(indices).astype(np.intp)
+        return take_rows(x, indices, self.memory_budget), np.asarray(y)[indices]
+
+    def _train(self, la_list, x, y, n, prob, classes, grouped_data):
         for i in range(len(la_list)):
-            subset_x, subset_y = self._resample(n, prob, classes, grouped_data)
+            with phase('resample'):
+                subset_x, subset_y = self._resample(x, y, n, prob, classes, grouped_data)
+            count('rows_copied', subset_x.shape[0])
 
-            subset_x = np.array(subset_x).astype(np.float)
-            subset_y = np.array(subset_y).astype(np.float)
+            subset_x = as_float(subset_x, self.dtype)
+            subset_y = np.array(subset_y)
 
-            self.classifiers[i] = la_list[i].fit(subset_x, subset_y)
+            with phase('fit_classifier'):
+                self.classifiers[i] = la_list[i].fit(subset_x, subset_y)
+            count('classifiers_fitted')
 
     def _find_random_features(self, labels_no, features_no, subset_x):
         random_features_idx = sample_without_replacement(labels_no, features_no)
@@ -135,47 +273,51 @@ class MRBBagging(BaggingClassifier):
         return random_features, random_features_idx
 
     def _get_features_array(self, subset_x, random_features_idx):
-        random_features = np.array(subset_x[:, random_features_idx[0]])
-        for f in range(1, len(random_features_idx)):
-            random_features = np.vstack((random_features, subset_x[:, random_features_idx[f]]))
-        if random_features.ndim == 1:
-            return random_features[:, np.newaxis]
-        return random_features.T
+        return subset_x[:, random_features_idx]
 
     def _get_kbest_classifier(self, test, features_no, subset_x, subset_y):
+        from sklearn.feature_selection import SelectKBest
+
         kBest_estimator = SelectKBest(test, k=features_no)
         subset = kBest_estimator.fit_transform(subset_x, subset_y)
         return subset, kBest_estimator
 
-    def _train_with_feature_selection(self, la_list, n, prob, classes, grouped_data):
+    def _train_with_feature_selection(self, la_list, x, y, n, prob, classes, grouped_data):
         for i in range(0, len(la_list), 3):
-            subset_x, subset_y = self._resample(n, prob, classes, grouped_data)
-            labels_no = len(subset_x[0])
+            with phase('resample'):
+                subset_x, subset_y = self._resample(x, y, n, prob, classes, grouped_data)
+            count('rows_copied', subset_x.shape[0])
+            labels_no = subset_x.shape[1]
             if self.half_features:
                 features_no = int(labels_no / 2)
             else:
                 features_no = int(sqrt(labels_no))
 
-            subset_x = np.array(subset_x).astype(np.float)
-            subset_y = np.array(subset_y).astype(np.float)
+            subset_x = as_float(subset_x, self.dtype)
+            subset_y = np.array(subset_y)
 
-            if self.all_random:
-                subset1, subset1_idx = self._find_random_features(labels_no, features_no, subset_x)
-                subset2, subset2_idx = self._find_random_features(labels_no, features_no, subset_x)
-                subset3, subset3_idx = self._find_random_features(labels_no, features_no, subset_x)
+            with phase('feature_selection'):
+                if self.all_random:
+                    subset1, subset1_idx = self._find_random_features(labels_no, features_no, subset_x)
+                    subset2, subset2_idx = self._find_random_features(labels_no, features_no, subset_x)
+                    subset3, subset3_idx = self._find_random_features(labels_no, features_no, subset_x)
 
-            else:
-                subset1, subset1_idx = self._get_kbest_classifier(chi2, features_no, subset_x, subset_y)
-                subset2, subset2_idx = self._get_kbest_classifier(f_classif, features_no, subset_x, subset_y)
-                subset3, subset3_idx = self._find_random_features(labels_no, features_no, subset_x)
+                else:
+                    from sklearn.feature_selection import chi2, f_classif
+
+                    subset1, subset1_idx = self._get_kbest_classifier(chi2, features_no, subset_x, subset_y)
+                    subset2, subset2_idx = self._get_kbest_classifier(f_classif, features_no, subset_x, subset_y)
+                    subset3, subset3_idx = self._find_random_features(labels_no, features_no, subset_x)
 
             self.feature_selection_methods[i] = subset1_idx
             self.feature_selection_methods[i + 1] = subset2_idx
             self.feature_selection_methods[i + 2] = subset3_idx
 
-            self.classifiers[i] = la_list[i].fit(subset1, subset_y)
-            self.classifiers[i + 1] = la_list[i + 1].fit(subset2, subset_y)
-            self.classifiers[i + 2] = la_list[i + 2].fit(subset3, subset_y)
+            with phase('fit_classifier'):
+                self.classifiers[i] = la_list[i].fit(subset1, subset_y)
+                self.classifiers[i + 1] = la_list[i + 1].fit(subset2, subset_y)
+                self.classifiers[i + 2] = la_list[i + 2].fit(subset3, subset_y)
+            count('classifiers_fitted', 3)
 
     def _set_classes_dict(self, classes):
         self.classifier_classes = dict(enumerate(classes))
@@ -193,11 +335,13 @@ class MRBBagging(BaggingClassifier):
         return data
 
     def _count_votes(self, data):
-        voting_matrix = np.zeros((len(data), len(self.classes)))
-        for classifier_id in range(len(self.classifiers)):
+        voting_matrix = np.zeros((_num_samples(data), len(self.classes)))
+        for classifier_id, classifier in self.classifiers.items():
             new_data = self._select_data(classifier_id, data)
-            classes = self.classifiers[classifier_id].predict(new_data)
-            probabilities = self.classifiers[classifier_id].predict_proba(new_data)
+            with phase('predict_classifier'):
+                classes = classifier.predict(new_data)
+                probabilities = classifier.predict_proba(new_data)
+            count('classifier_predictions')
             for i, cl in enumerate(classes):
                 idx = list(self.classifier_classes.keys())[list(self.classifier_classes.values()).index(int(cl))]
                 voting_matrix[i][idx] += max(probabilities[i])
@@ -1,14 +1,16 @@
 from copy import deepcopy
 
 import numpy as np
-from imblearn.over_sampling import SMOTE
 from sklearn.ensemble import BaggingClassifier
 from sklearn.naive_bayes import GaussianNB
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.tree import DecisionTreeClassifier
+from sklearn.utils import gen_batches, get_chunk_n_rows
 
-from multi_imbalance.resampling.global_cs import GlobalCS
-from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.utils.array_util import as_float, take_rows, spill
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.neighbors import make_neighbors, fit_neighbors, kneighbors_per_group, kneighbors_chunked
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class OVO(BaggingClassifier):
@@ -22,11 +24,13 @@ class OVO(BaggingClassifier):
 
     """
 
-    _allowed_classifiers = ['tree', 'NB', 'KNN']
+    _allowed_classifiers = ['tree', 'NB', 'KNN', 'shared_KNN']
     _allowed_preprocessing = [None, 'globalCS', 'SMOTE', 'SOUP']
     _allowed_preprocessing_between = ['all', 'maj-min']
+    _allowed_aggregations = ['max_voting', 'DDAG', 'DCS']
 
-    def __init__(self, binary_classifier='tree', n_neighbors=3, preprocessing='SOUP', preprocessing_between='all'):
+    def __init__(self, binary_classifier='tree', n_neighbors=3, preprocessing='SOUP', preprocessing_between='all',
+                 dtype=None, memory_budget=None, class_profile=None, working_memory=None, aggregation='max_voting'):
         """
         :param binary_classifier:
             binary classifier. Possible classifiers:
@@ -35,12 +39,17 @@ class OVO(BaggingClassifier):
                 Decision Tree Classifier,
             * 'KNN':
                 K-Nearest Neighbors
+            * 'shared_KNN':
+                K-Nearest Neighbors answering all pairs of classes from a single neighbour index over the whole
+                training set, the neighbours of a test example are filtered to the classes of each pair. Predictions
+                are the same as with 'KNN', but the training data is stored once and each test example is queried
+                once instead of m(m-1)/2 times. Requires preprocessing=None
             * 'NB' :
                 Naive Bayes
             * 'ClassifierMixin' :
                 An instance of a class that implements ClassifierMixin
         :param n_neighbors:
-            number of nearest neighbors in KNN, works only if binary_classifier=='KNN'
+            number of nearest neighbors in KNN, works only if binary_classifier is 'KNN' or 'shared_KNN'
         :param preprocessing:
             method for preprocessing of pairs of classes in the learning phase of ensemble. Possible values:
 
@@ -61,20 +70,62 @@ class OVO(BaggingClassifier):
                 oversampling between each pair of classes
             * 'maj-min' :
                 oversampling only between majority ad minority classes
+        :param dtype:
+            floating point type X is converted to before learning and prediction, e.g. np.float32 to halve the
+            memory usage. If None, X is passed unchanged
+        :param memory_budget:
+            size in MiB above which the training set of a binary classifier (also after preprocessing) is written to
+            a temporary memory mapped file instead of memory. Together with numpy.memmap X, it allows training on data
+            larger than RAM. If None, the training sets are kept in memory
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y passed to fit, if None it is computed in fit. The encoded
+            labels of the profile are used to select the examples of each pair of classes
+        :param working_memory:
+            size in MiB of the outputs of the binary classifiers kept at once by predict, predict_proba and
+            decision_function, the test examples are processed in chunks fitting in it. If None, sklearn's
+            working_memory config is used
+        :param aggregation:
+            method of aggregating the outputs of the binary classifiers in predict. Possible values:
+
+            * 'max_voting' :
+                all m(m-1)/2 binary classifiers vote for every example, the class with most votes is predicted
+            * 'DDAG' :
+                Decision Directed Acyclic Graph, the first and the last of the remaining classes are compared by
+                their binary classifier and the losing class is eliminated until a single class remains, so only m-1
+                binary classifiers are evaluated for an example. Reference:
+                J. C. Platt, N. Cristianini, J. Shawe-Taylor:
+                Large margin DAGs for multiclass classification.
+                Advances in Neural Information Processing Systems 12 (2000), 547–553.
+            * 'DCS' :
+                Dynamic Classifier Selection, only the binary classifiers of pairs of classes present among the 3m
+                nearest training examples of an example vote, an example with a single class in its neighbourhood is
+                assigned to it. The neighbour index over the training set is kept after fit. Reference:
+                M. Galar, A. Fernández, E. Barrenechea, H. Bustince, F. Herrera:
+                Dynamic classifier selection for One-vs-One strategy: Avoiding non-competent classifiers.
+                Pattern Recognition 46(12) (2013), 3412–3424.
+
+            predict_proba and decision_function always use all binary classifiers
         """
         super().__init__()
         self.binary_classifier = binary_classifier
         self.n_neighbors = n_neighbors
         self.preprocessing = preprocessing
         self.oversample_between = preprocessing_between
+        self.dtype = dtype
+        self.memory_budget = memory_budget
+        self.class_profile = class_profile
+        self.working_memory = working_memory
+        self.aggregation = aggregation
         self._binary_classifiers = []
         self._labels = np.array([])
         self._minority_classes = list()
 
+    @instrumented
     def fit(self, X, y, minority_classes=None):
         """
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
         :param y:
             one dimensional numpy array with labels for rows in X
         :param minority_classes:
@@ -84,47 +135,355 @@ class OVO(BaggingClassifier):
         """
         if minority_classes is None:
             minority_classes = list()
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        y = np.asarray(y)
 
-        self._labels = np.unique(y)
+        class_profile = get_class_profile(y, self.class_profile)
+        self._labels = class_profile.classes
         self._minority_classes = minority_classes
         num_of_classes = len(self._labels)
+        if self._get_aggregation() == 'DCS':
+            self._fit_dcs(X, class_profile.encoded)
+        if self.binary_classifier == 'shared_KNN':
+            self._fit_shared_knn(X, y, class_profile.encoded)
+            return self
         self._binary_classifiers = [[self._get_classifier() for _ in range(n)] for n in
                                     range(0, num_of_classes)]
-        self._learn_binary_classifiers(X, y)
+        self._learn_binary_classifiers(X, y, class_profile.encoded)
         return self
 
+    @instrumented
+    def partial_fit(self, X, y, classes=None, minority_classes=None):
+        """
+        Incrementally trains the binary classifiers on a batch of examples, the binary classifier must implement
+        partial_fit (e.g. 'NB' or sklearn.linear_model.SGDClassifier). The batch is routed only to the binary
+        classifiers of the pairs with at least one class occurring in the batch, each of them is trained on the
+        examples of its pair. The binary classifier of a pair is created when the first examples of its classes
+        arrive, the pairs without any training examples so far are left out of prediction. Preprocessing is applied to the examples of each pair in the batch.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :param y:
+            one dimensional numpy array with labels for rows in X
+        :param classes:
+            labels of all classes expected in the batches. If given in the first call, the classes absent from the
+            first batch are known from the start, their pairs get binary classifiers once their examples arrive
+        :param minority_classes:
+            list of classes considered to be minority, kept from the previous call if None
+        :return:
+            self: object
+        """
+        if not hasattr(self._get_classifier(), 'partial_fit'):
+            raise ValueError("Binary classifier must implement partial_fit method to use partial_fit")
+        if self._get_aggregation() == 'DCS':
+            raise ValueError("DCS aggregation needs the whole training set, use fit or another aggregation")
+        if minority_classes is not None:
+            self._minority_classes = minority_classes
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        y = np.asarray(y)
+
+        self._add_classes(np.unique(y) if classes is None else np.union1d(np.unique(y), classes))
+        self._learn_binary_classifiers(X, y, partial=True)
+        return self
+
+    def _add_classes(self, labels):
+        """
+        Adds the pairs of classes not seen before without binary classifiers, which are created by
+        _learn_binary_classifiers, the classifiers of the other pairs are kept. self._labels stays sorted.
+        """
+        if len(self._labels) > 0 and np.isin(labels, self._labels).all():
+            return
+        classifiers = {(self._labels[row].item(), self._labels[col].item()): self._binary_classifiers[row][col]
+                       for row in range(len(self._labels)) for col in range(row)}
+        self._labels = np.unique(labels) if len(self._labels) == 0 else np.union1d(self._labels, labels)
+
+        def classifier(row, col):
+            pair = (self._labels[row].item(), self._labels[col].item())
+            return classifiers.get(pair)
+
+        self._binary_classifiers = [[classifier(row, col) for col in range(row)] for row in range(len(self._labels))]
+
+    @instrumented
     def predict(self, X):
         """
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
         :return:
             numpy array, shape = [number of samples]. Predicted target values for X.
         """
-        num_of_classes = len(self._labels)
-        predicted = list()
-        for instance in X:
-            binary_outputs_matrix = self._construct_binary_outputs_matrix(instance, num_of_classes)
-            predicted.append(self._perform_max_voting(binary_outputs_matrix))
-
-        return np.array(predicted)
-
-    def _construct_binary_outputs_matrix(self, instance, num_of_classes):
-        binary_outputs_matrix = np.zeros((num_of_classes, num_of_classes))
-        for class_idx1 in range(len(self._labels)):
-            for class_idx2 in range(class_idx1):
-                binary_outputs_matrix[class_idx1][class_idx2] = self._binary_classifiers[class_idx1][class_idx2] \
-                    .predict([instance])
-        return binary_outputs_matrix
-
-    def _learn_binary_classifiers(self, X, y):
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        aggregation = self._get_aggregation()
+        predicted = np.empty(X.shape[0], dtype=self._labels.dtype)
+        for chunk in self._chunks(X):
+            with phase('predict_binary'):
+                if aggregation == 'DDAG':
+                    predicted[chunk] = self._labels[self._predict_ddag(X[chunk])]
+                    continue
+                if aggregation == 'DCS':
+                    predicted[chunk] = self._labels[np.argmax(self._dcs_scores(X[chunk]), axis=1)]
+                else:
+                    predicted[chunk] = self._perform_max_voting(self._pairwise_outputs(X[chunk], proba=False))
+        return predicted
+
+    def _get_aggregation(self):
+        if self.aggregation not in OVO._allowed_aggregations:
+            raise ValueError("Unknown aggregation: %s, expected to be one of %s."
+                             % (self.aggregation, OVO._allowed_aggregations))
+        return self.aggregation
+
+    def _pair_evaluator(self, X):
+        """
+        :return:
+            function (rows, row, col) -> indices of the classes predicted for X[rows] by the binary classifier of
+            classes row and col (row > col). The outputs of shared_KNN are computed for all pairs at once
+        """
+        if self.binary_classifier == 'shared_KNN':
+            winners = self._pairwise_outputs(X, proba=False)
+            pair_indices = {pair: pair_idx for pair_idx, pair in enumerate(self._pairs())}
+            return lambda rows, row, col: winners[rows, pair_indices[(row, col)]]
+
+        def evaluate(rows, row, col):
+            if self._binary_classifiers[row][col] is None:
+                return np.full(rows.shape[0], col)
+            count('classifier_predictions', rows.shape[0])
+            return np.searchsorted(self._labels, self._binary_classifiers[row][col].predict(X[rows]))
+        return evaluate
+
+    def _predict_ddag(self, X):
+        """
+        :return:
+            indices of the classes predicted for X by DDAG. The remaining classes of an example are always a range
+            first..last of class indices, the examples are grouped by the pair compared in each of the m-1 steps
+        """
+        evaluate = self._pair_evaluator(X)
+        first = np.zeros(X.shape[0], dtype=np.intp)
+        last = np.full(X.shape[0], len(self._labels) - 1, dtype=np.intp)
+        for _ in range(len(self._labels) - 1):
+            keys = last * len(self._labels) + first
+            order = np.argsort(keys, kind='stable')
+            boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+            for rows in np.split(order, boundaries):
+                row, col = last[rows[0]], first[rows[0]]
+                first_wins = evaluate(rows, row, col) == col
+                last[rows[first_wins]] -= 1
+                first[rows[~first_wins]] += 1
+        return first
+
+    def _fit_dcs(self, X, class_indices):
+        n_neighbors = min(3 * len(self._labels), X.shape[0])
+        self._dcs_neighbors = fit_neighbors(make_neighbors(n_neighbors=n_neighbors), X)
+        self._train_class_indices = class_indices
+
+    def _dcs_scores(self, X):
+        """
+        :return:
+            array (number of samples x number of classes) with votes of the binary classifiers of the pairs of
+            classes found in the neighbourhood of each example, -1 for the classes absent from it
+        """
+        evaluate = self._pair_evaluator(X)
+        neighbours = kneighbors_chunked(self._dcs_neighbors, X, working_memory=self.working_memory)
+        present = np.zeros((X.shape[0], len(self._labels)), dtype=bool)
+        present[np.arange(X.shape[0])[:, np.newaxis], self._train_class_indices[neighbours]] = True
+
+        scores = np.where(present, 0., -1.)
+        for row, col in self._pairs():
+            rows = np.flatnonzero(present[:, row] & present[:, col])
+            if rows.shape[0] > 0:
+                scores[rows, evaluate(rows, row, col)] += 1
+        return scores
+
+    @instrumented
+    def predict_proba(self, X):
+        """
+        Class probabilities obtained by pairwise coupling of the probabilities returned by the binary classifiers,
+        method 2 of:
+        T.-F. Wu, C.-J. Lin, R. C. Weng:
+        Probability estimates for multi-class classification by pairwise coupling.
+        Journal of Machine Learning Research 5 (2004), 975–1005.
+
+        Binary classifiers without predict_proba contribute probabilities 0 and 1 of their predictions.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :return:
+            numpy array, shape = [number of samples, number of classes]. Probabilities of the classes in sorted
+            order.
+        """
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        probabilities = np.empty((X.shape[0], len(self._labels)))
+        for chunk in self._chunks(X):
+            with phase('predict_binary'):
+                pairwise = self._pairwise_outputs(X[chunk], proba=True)
+            with phase('decode'):
+                probabilities[chunk] = self._couple(self._pairwise_matrix(pairwise))
+        return probabilities
+
+    @instrumented
+    def decision_function(self, X):
+        """
+        Votes of the binary classifiers with ties broken by their confidences, as in
+        sklearn.multiclass.OneVsOneClassifier. A pair is won by the class with probability above 0.5, the
+        probability minus 0.5 is its confidence. The sum of confidences of each class is scaled to (-1/3, 1/3) and
+        added to its number of votes.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :return:
+            numpy array, shape = [number of samples, number of classes]. Scores of the classes in sorted order.
+        """
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        scores = np.empty((X.shape[0], len(self._labels)))
+        for chunk in self._chunks(X):
+            with phase('predict_binary'):
+                pairwise = self._pairwise_outputs(X[chunk], proba=True) - 0.5
+            votes = np.zeros((pairwise.shape[0], len(self._labels)))
+            confidences = np.zeros_like(votes)
+            for pair_idx, (row, col) in enumerate(self._pairs()):
+                votes[:, row] += pairwise[:, pair_idx] > 0
+                votes[:, col] += pairwise[:, pair_idx] < 0
+                confidences[:, row] += pairwise[:, pair_idx]
+                confidences[:, col] -= pairwise[:, pair_idx]
+            scores[chunk] = votes + confidences / (3 * (np.abs(confidences) + 1))
+        return scores
+
+    def _pairs(self):
+        """
+        :return:
+            list of pairs (row, col) of class indices with row > col, without the pairs whose binary classifiers
+            have not been created by partial_fit yet
+        """
+        return [(row, col) for row in range(len(self._labels)) for col in range(row)
+                if self.binary_classifier == 'shared_KNN' or self._binary_classifiers[row][col] is not None]
+
+    def _chunks(self, X):
+        chunk_n_rows = get_chunk_n_rows(row_bytes=8 * len(self._labels) ** 2, max_n_rows=max(X.shape[0], 1),
+                                        working_memory=self.working_memory)
+        return gen_batches(X.shape[0], chunk_n_rows)
+
+    def _pairwise_outputs(self, X, proba):
+        """
+        Calls every binary classifier once for all examples in X.
+
+        :return:
+            array (number of samples x number of pairs), pairs ordered as returned by _pairs. If proba is False,
+            index of the class predicted by the binary classifier of the pair, otherwise probability of the first
+            class of the pair
+        """
+        pairs = self._pairs()
+        if self.binary_classifier == 'shared_KNN':
+            outputs = self._predict_shared_knn(X)
+        else:
+            outputs = np.empty((X.shape[0], len(pairs)), dtype=float if proba else np.intp)
+            for pair_idx, (row, col) in enumerate(pairs):
+                classifier = self._binary_classifiers[row][col]
+                if not proba:
+                    outputs[:, pair_idx] = np.searchsorted(self._labels, classifier.predict(X))
+                elif hasattr(classifier, 'predict_proba'):
+                    outputs[:, pair_idx] = classifier.predict_proba(X)[:, classifier.classes_ == self._labels[row]] \
+                        .sum(axis=1)
+                else:
+                    outputs[:, pair_idx] = classifier.predict(X) == self._labels[row]
+        count('classifier_predictions', X.shape[0] * len(pairs))
+        if proba or self.binary_classifier != 'shared_KNN':
+            return outputs
+        rows, cols = np.array(pairs, dtype=np.intp).reshape(-1, 2).T
+        return np.where(outputs > 0.5, rows, cols)
+
+    def _pairwise_matrix(self, outputs):
+        """
+        :return:
+            array (number of samples x number of classes x number of classes), [k, i, j] is the probability of class
+            i given that the k-th example is of class i or j, the diagonal is 0
+        """
+        matrix = np.zeros((outputs.shape[0], len(self._labels), len(self._labels)))
+        for pair_idx, (row, col) in enumerate(self._pairs()):
+            matrix[:, row, col] = outputs[:, pair_idx]
+            matrix[:, col, row] = 1 - outputs[:, pair_idx]
+        return matrix
+
+    @staticmethod
+    def _couple(pairwise):
+        """
+        Solves the problem min_p sum_i sum_j!=i (r_ji p_i - r_ij p_j)^2 subject to sum_i p_i = 1 for every example,
+        where r_ij is the pairwise probability of class i against class j.
+
+        :param pairwise:
+            array (number of samples x number of classes x number of classes) returned by _pairwise_matrix
+        :return:
+            array (number of samples x number of classes) with class probabilities
+        """
+        n_samples, n_classes = pairwise.shape[:2]
+        system = np.zeros((n_samples, n_classes + 1, n_classes + 1))
+        system[:, :n_classes, :n_classes] = -pairwise * pairwise.transpose(0, 2, 1)
+        diagonal = np.arange(n_classes)
+        system[:, diagonal, diagonal] = (pairwise ** 2).sum(axis=1)
+        system[:, :n_classes, n_classes] = 1
+        system[:, n_classes, :n_classes] = 1
+        right_side = np.zeros(n_classes + 1)
+        right_side[n_classes] = 1
+        # pseudo inverse, as the system is singular for some inconsistent 0-1 pairwise probabilities
+        probabilities = np.clip((np.linalg.pinv(system) @ right_side)[:, :n_classes], 0, None)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def _learn_binary_classifiers(self, X, y, class_indices=None, partial=False):
+        if class_indices is None:
+            class_indices = np.searchsorted(self._labels, y)
         for row in range(len(self._labels)):
             for col in range(row):
                 first_class, second_class = self._labels[row], self._labels[col]
-                filtered_indices = [idx for idx in range(len(y)) if y[idx] in (first_class, second_class)]
-                X_filtered, y_filtered = X[filtered_indices], y[filtered_indices]
+                filtered_indices = np.flatnonzero((class_indices == row) | (class_indices == col))
+                if partial and filtered_indices.shape[0] == 0:
+                    continue
+                X_filtered, y_filtered = take_rows(X, filtered_indices, self.memory_budget), y[filtered_indices]
                 if self.should_perform_oversampling(first_class, second_class):
-                    X_filtered, y_filtered = self._oversample(X_filtered, y_filtered)
-                self._binary_classifiers[row][col].fit(X_filtered, y_filtered)
+                    with phase('oversample'):
+                        X_filtered, y_filtered = self._oversample(X_filtered, y_filtered)
+                        X_filtered = spill(X_filtered, self.memory_budget)
+                with phase('fit_binary'):
+                    if partial:
+                        if self._binary_classifiers[row][col] is None:
+                            self._binary_classifiers[row][col] = self._get_classifier()
+                        self._binary_classifiers[row][col].partial_fit(X_filtered, y_filtered,
+                                                                       classes=self._labels[[col, row]])
+                    else:
+                        self._binary_classifiers[row][col].fit(X_filtered, y_filtered)
+                count('classifiers_fitted')
+
+    def _fit_shared_knn(self, X, y, class_indices=None):
+        if self.preprocessing is not None:
+            raise ValueError("shared_KNN binary classifier does not support preprocessing, use preprocessing=None")
+        self._binary_classifiers = []
+        self._shared_neighbors = fit_neighbors(make_neighbors(n_neighbors=self.n_neighbors), X)
+        self._train_class_indices = np.searchsorted(self._labels, y) if class_indices is None else class_indices
+
+    def _predict_shared_knn(self, X):
+        """
+        :return:
+            array (number of samples x number of pairs) with the fraction of the neighbours among the nearest
+            examples of each pair that are of its first class, 0.5 if the pair has no training examples
+        """
+        pairs = self._pairs()
+        groups = np.zeros((len(pairs), len(self._labels)), dtype=bool)
+        for pair_idx, pair in enumerate(pairs):
+            groups[pair_idx, list(pair)] = True
+
+        neighbour_classes = kneighbors_per_group(self._shared_neighbors, X, self._train_class_indices, groups,
+                                                 self.n_neighbors)
+        fractions = np.full((X.shape[0], len(pairs)), 0.5)
+        for pair_idx, (row, col) in enumerate(pairs):
+            row_votes = np.count_nonzero(neighbour_classes[pair_idx] == row, axis=1)
+            col_votes = np.count_nonzero(neighbour_classes[pair_idx] == col, axis=1)
+            np.divide(row_votes, row_votes + col_votes, out=fractions[:, pair_idx], where=row_votes + col_votes > 0)
+        return fractions
 
     def _get_classifier(self):
         if isinstance(self.binary_classifier, str):
@@ -146,14 +505,22 @@ class OVO(BaggingClassifier):
                 raise ValueError("Your classifier must implement fit and predict methods")
             return deepcopy(self.binary_classifier)
 
-    def _perform_max_voting(self, binary_outputs_matrix):
-        scores = np.zeros(len(self._labels))
-        for clf_1 in range(len(binary_outputs_matrix)):
-            for clf_2 in range(clf_1):
-                scores[self._labels.tolist().index(binary_outputs_matrix[clf_1][clf_2])] += 1
-        return self._labels[np.argmax(scores)]
+    def _perform_max_voting(self, winners):
+        """
+        :param winners:
+            array (number of samples x number of pairs) with indices of the classes predicted by the binary
+            classifiers, as returned by _pairwise_outputs
+        :return:
+            labels of the classes with most votes, ties are resolved in favour of the first class in self._labels
+        """
+        scores = np.zeros((winners.shape[0], len(self._labels)))
+        np.add.at(scores, (np.arange(winners.shape[0])[:, np.newaxis], winners), 1)
+        return self._labels[np.argmax(scores, axis=1)]
 
     def _oversample(self, X, y):
+        from multi_imbalance.resampling.global_cs import GlobalCS
+        from multi_imbalance.resampling.soup import SOUP
+
         if self.preprocessing is None:
             return X, y
 
@@ -181,6 +548,8 @@ class OVO(BaggingClassifier):
         if n_neighbors == 0:
             raise ValueError(
                 'In order to use SMOTE preprocessing, the training set should contain at least 2 examples from each class')
+        from imblearn.over_sampling import SMOTE
+
         smote = SMOTE(k_neighbors=n_neighbors, random_state=42)
         return smote.fit_resample(X, y)
 
@@ -0,0 +1,133 @@
+"""
+Persistence of fitted ensembles (OVO, ECOC, MRBBagging, SOUPBagging) in a directory layout::
+
+    model/
+        meta.json           format version, class of the model, library versions and the list of stored arrays
+        model.pkl           pickled model with numeric arrays replaced by references to the files below
+        arrays/*.npy        uncompressed numeric arrays, named after the attribute of the model for top level
+                            arrays (e.g. _code_matrix.npy, dich_weights.npy) and numbered for the arrays of the
+                            base models (e.g. training data of KNN classifiers, nodes of decision trees)
+
+Arrays are memory mapped on load, so several processes serving the same model share one copy in the page cache.
+
+Example::
+
+    save_ensemble(ecoc, 'ecoc_model')
+    ecoc = load_ensemble('ecoc_model')  # arrays are read only memory maps
+"""
+import importlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MODEL_FILENAME = 'model.pkl'
+META_FILENAME = 'meta.json'
+ARRAYS_DIRNAME = 'arrays'
+
+
+class _ArrayPickler(pickle.Pickler):
+    """
+    Pickler storing numeric arrays of at least min_nbytes bytes (and all top level arrays of the model) as .npy files.
+    """
+
+    def __init__(self, file, arrays_dir, names, min_nbytes):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays_dir = arrays_dir
+        self.names = names
+        self.min_nbytes = min_nbytes
+        self.stored = dict()
+
+    def persistent_id(self, obj):
+        if type(obj) not in (np.ndarray, np.memmap) or obj.dtype.hasobject:
+            return None
+        named = id(obj) in self.names
+        if not named and obj.nbytes < self.min_nbytes:
+            return None
+        if id(obj) not in self.stored:
+            name = self.names[id(obj)] if named else f'array_{len(self.stored)}'
+            np.save(os.path.join(self.arrays_dir, f'{name}.npy'), np.asarray(obj), allow_pickle=False)
+            self.stored[id(obj)] = name
+        return 'ndarray', self.stored[id(obj)]
+
+
+class _ArrayUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, arrays_dir, mmap_mode):
+        super().__init__(file)
+        self.arrays_dir = arrays_dir
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind != 'ndarray':
+            raise pickle.UnpicklingError(f'Unknown persistent reference: {kind}')
+        return np.load(os.path.join(self.arrays_dir, f'{name}.npy'), mmap_mode=self.mmap_mode)
+
+
+def _versions():
+    versions = dict()
+    for module in ('numpy', 'sklearn', 'imblearn'):
+        try:
+            versions[module] = importlib.import_module(module).__version__
+        except ImportError:  # pragma no cover
+            versions[module] = None
+    return versions
+
+
+def save_ensemble(model, path, min_nbytes=1024):
+    """
+    Saves a fitted ensemble to the path directory, an existing model in the directory is replaced. The directory is
+    written next to the destination and renamed at the end, so an interrupted save never leaves a partial model.
+
+    :param model:
+        fitted OVO, ECOC, MRBBagging or SOUPBagging (or any other picklable estimator)
+    :param path:
+        output directory
+    :param min_nbytes:
+        arrays of the base models smaller than this are pickled together with the model instead of separate files
+    """
+    path = os.path.abspath(path)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    arrays_dir = os.path.join(tmp_path, ARRAYS_DIRNAME)
+    os.makedirs(arrays_dir)
+
+    names = {id(value): attribute for attribute, value in vars(model).items() if isinstance(value, np.ndarray)}
+    with open(os.path.join(tmp_path, MODEL_FILENAME), 'wb') as f:
+        pickler = _ArrayPickler(f, arrays_dir, names, min_nbytes)
+        pickler.dump(model)
+
+    meta = {'format_version': FORMAT_VERSION, 'class': f'{type(model).__module__}.{type(model).__qualname__}',
+            'versions': _versions(), 'arrays': sorted(pickler.stored.values())}
+    with open(os.path.join(tmp_path, META_FILENAME), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def load_ensemble(path, mmap_mode='r'):
+    """
+    Loads an ensemble saved by save_ensemble. The model is unpickled, so only models from trusted sources should be
+    loaded.
+
+    :param path:
+        directory with the model
+    :param mmap_mode:
+        mode in which the arrays are memory mapped, see numpy.load. The default 'r' shares read only arrays between
+        processes, None reads the arrays into memory
+    :return:
+        the fitted model
+    """
+    with open(os.path.join(path, META_FILENAME)) as f:
+        meta = json.load(f)
+    if meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported model format version: {meta.get("format_version")}')
+
+    with open(os.path.join(path, MODEL_FILENAME), 'rb') as f:
+        return _ArrayUnpickler(f, os.path.join(path, ARRAYS_DIRNAME), mmap_mode).load()
@@ -1,5 +1,4 @@
 import multiprocessing
-from collections import Counter
 from copy import deepcopy
 
 import numpy as np
@@ -8,11 +7,17 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.utils import resample
 
 from multi_imbalance.resampling.soup import SOUP
-from multi_imbalance.utils.array_util import setdiff
+from multi_imbalance.utils.array_util import equal_rows_mask, as_float, take_rows, MemmapReference
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 def fit_clf(args):
-    return SOUPBagging.fit_classifier(args)
+    clf, X, y, sampled_indices, maj_int_min, memory_budget, classes = args
+    if isinstance(X, MemmapReference):
+        X = X.open()
+    resampled = take_rows(X, sampled_indices, memory_budget), y[sampled_indices]
+    return SOUPBagging.fit_classifier([clf, X, y, resampled, maj_int_min, classes])
 
 
 class SOUPBagging(BaggingClassifier):
@@ -25,7 +30,8 @@ class SOUPBagging(BaggingClassifier):
     Inteligencji (2019).
     """
 
-    def __init__(self, classifier=None, maj_int_min=None, n_classifiers=5):
+    def __init__(self, classifier=None, maj_int_min=None, n_classifiers=5, dtype=None, memory_budget=None,
+                 class_profile=None):
         """
         :param classifier:
             Instance of classifier
@@ -33,12 +39,24 @@ class SOUPBagging(BaggingClassifier):
             dict {'maj': majority class labels, 'min': minority class labels}
         :param n_classifiers:
             number of classifiers
+        :param dtype:
+            floating point type X is converted to before resampling and prediction, e.g. np.float32 to halve the
+            memory usage. If None, X is passed unchanged
+        :param memory_budget:
+            size in MiB above which a bootstrap sample is written to a temporary memory mapped file instead of memory.
+            Bootstrap samples are gathered in the worker processes, which reopen numpy.memmap X (e.g. loaded with
+            np.load(mmap_mode='r')) by its file instead of receiving a copy. If None, the samples are kept in memory
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y passed to fit, if None it is computed in fit
         """
         super().__init__()
         self.classifiers, self.clf_weights = list(), list()
         self.maj_int_min = maj_int_min
         self.num_core = multiprocessing.cpu_count()
         self.n_classifiers = n_classifiers
+        self.dtype = dtype
+        self.memory_budget = memory_budget
+        self.class_profile = class_profile
         self.classes = None
         for _ in range(n_classifiers):
             self.clf_weights.append(1)
@@ -49,26 +67,49 @@ class SOUPBagging(BaggingClassifier):
 
     @staticmethod
     def fit_classifier(args):
-        clf, X, y, resampled, maj_int_min = args
+        """
+        :param args:
+            list [classifier, X, y, (sampled X, sampled y), maj_int_min] optionally followed by the sorted class
+            labels, which are computed from y if missing
+        :return:
+            fitted classifier and weights of classes
+        """
+        clf, X, y, resampled, maj_int_min = args[:5]
+        classes = args[5] if len(args) > 5 else np.unique(y)
         x_sampled, y_sampled = resampled
 
-        out_of_bag = setdiff(np.hstack((X, y[:, np.newaxis])), np.hstack((x_sampled, y_sampled[:, np.newaxis])))
-        x_out, y_out = out_of_bag[:, :-1], out_of_bag[:, -1].astype(int)
+        x_out, y_out = SOUPBagging._out_of_bag(X, y, x_sampled, y_sampled)
 
         x_resampled, y_resampled = SOUP(maj_int_min=maj_int_min).fit_resample(x_sampled, y_sampled)
         clf.fit(x_resampled, y_resampled)
 
         result = clf.predict_proba(x_out)
         class_sum_prob = np.sum(result, axis=0) + 0.001
-        class_quantities = Counter(y_out)
-        expected_sum_prob = np.array([class_quantities[i] for i in range(len(Counter(y)))])
+        expected_sum_prob = np.bincount(np.searchsorted(classes, y_out), minlength=classes.shape[0])
         try:
             global_weights = expected_sum_prob / class_sum_prob
         except Exception:
-            global_weights = np.ones(shape=len(Counter(y)))
-            print(f'Exc {Counter(y)} {Counter(y_out)} {result.shape} {expected_sum_prob.shape} {class_sum_prob.shape}')
+            global_weights = np.ones(shape=classes.shape[0])
+            print(f'Exc {classes} {result.shape} {expected_sum_prob.shape} {class_sum_prob.shape}')
         return clf, global_weights
 
+    @staticmethod
+    def _out_of_bag(X, y, x_sampled, y_sampled):
+        """
+        Removes from X a single equal example for every sampled example, without appending labels to X,
+        so that sparse X stays sparse.
+
+        :return:
+            out-of-bag examples and their labels as int
+        """
+        remaining = np.ones(X.shape[0], dtype=bool)
+        for i in range(x_sampled.shape[0]):
+            equal = np.flatnonzero(remaining & (y == y_sampled[i]) & equal_rows_mask(X, x_sampled[i]))
+            if equal.shape[0] > 0:
+                remaining[equal[0]] = False
+        return X[np.flatnonzero(remaining)], y[remaining].astype(int)
+
+    @instrumented
     def fit(self, X, y, **kwargs):
         """
         :param X:
@@ -80,19 +121,31 @@ class SOUPBagging(BaggingClassifier):
         :return:
             self object
         """
-        self.classes = np.unique(y)
-
-        pool = multiprocessing.Pool(self.num_core)
-        results = pool.map(fit_clf, [(clf, X, y, resample(X, y, stratify=y, random_state=i), self.maj_int_min)
-                                     for i, clf in enumerate(self.classifiers)])
-        pool.close()
-        pool.join()
+        y = np.asarray(y)
+        self.classes = get_class_profile(y, self.class_profile).classes
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+
+        with phase('bootstrap'):
+            shared_X = MemmapReference(X) if MemmapReference.supported(X) else X
+            indices = np.arange(X.shape[0])
+            args = [(clf, shared_X, y, resample(indices, stratify=y, random_state=i), self.maj_int_min,
+                     self.memory_budget, self.classes) for i, clf in enumerate(self.classifiers)]
+
+        # SOUP and the classifiers run in worker processes, so only the total time of this phase is recorded
+        with phase('fit_classifiers'):
+            pool = multiprocessing.Pool(self.num_core)
+            results = pool.map(fit_clf, args)
+            pool.close()
+            pool.join()
+        count('classifiers_fitted', len(results))
         for i, (clf, weights) in enumerate(results):
             self.classifiers[i] = clf
             self.clf_weights[i] = weights
 
         self.clf_weights = np.array(self.clf_weights)
 
+    @instrumented
     def predict(self, X, strategy: str = 'average'):
         """
         Predict class for X. The predicted class of an input sample is computed as the class with the highest
@@ -142,6 +195,7 @@ class SOUPBagging(BaggingClassifier):
         y_result = np.argmax(p, axis=1)
         return y_result
 
+    @instrumented
     def predict_proba(self, X):
         """
         Predict class probabilities for X.
@@ -151,12 +205,16 @@ class SOUPBagging(BaggingClassifier):
         :return:
             array of shape = [n_classifiers, n_samples, n_classes]. The class probabilities of the input samples.
         """
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
         n_samples = X.shape[0]
         n_classes = self.classes.shape[0]
 
         results = np.zeros(shape=(self.n_classifiers, n_samples, n_classes))
 
-        for i, clf in enumerate(self.classifiers):
-            results[i] = clf.predict_proba(X)
+        with phase('predict_classifier'):
+            for i, clf in enumerate(self.classifiers):
+                results[i] = clf.predict_proba(X)
+        count('classifier_predictions', len(self.classifiers))
 
         return results
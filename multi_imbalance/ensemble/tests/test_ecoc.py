@@ -1,5 +1,7 @@
 import pytest
 import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
@@ -187,3 +189,113 @@ def test_ecoc_with_sklearn_pipeline(encoding_strategy, oversampling):
     pipeline.fit(X, y)
     y_hat = pipeline.predict(np.array([[1.1, 2.2, 3.3], [4.4, 5.5, 6.6], [7.7, 8.8, 9.9]]))
     assert len(y_hat) == 3
+
+
+@pytest.mark.parametrize("oversampling", [None, 'globalCS', 'SOUP'])
+@pytest.mark.parametrize("weights", [None, 'acc'])
+def test_sparse_input(oversampling, weights):
+    ecoc_dense = ecoc.ECOC(preprocessing=oversampling, weights=weights).fit(X, y)
+    ecoc_sparse = ecoc.ECOC(preprocessing=oversampling, weights=weights).fit(csr_matrix(X), y)
+    assert (ecoc_dense.predict(X) == ecoc_sparse.predict(csr_matrix(X))).all()
+
+
+@pytest.mark.parametrize("oversampling", [None, 'globalCS', 'SOUP'])
+def test_float32_dtype(oversampling):
+    ecoc_64 = ecoc.ECOC(preprocessing=oversampling).fit(X, y)
+    ecoc_32 = ecoc.ECOC(preprocessing=oversampling, dtype=np.float32).fit(X, y)
+    y_32 = ecoc_32.predict(X)
+    assert y_32.dtype == y.dtype
+    assert (ecoc_64.predict(X) == y_32).all()
+
+
+@pytest.mark.parametrize("encoding", ['OVO', 'OVA', 'dense', 'sparse', 'complete'])
+@pytest.mark.parametrize("weights", [None, 'acc'])
+def test_shared_knn_same_as_knn(encoding, weights):
+    ecoc_knn = ecoc.ECOC(binary_classifier='KNN', preprocessing=None, encoding=encoding, weights=weights).fit(X, y)
+    ecoc_shared = ecoc.ECOC(binary_classifier='shared_KNN', preprocessing=None, encoding=encoding,
+                            weights=weights).fit(X, y)
+    assert ecoc_shared._binary_classifiers == []
+    assert (ecoc_knn.predict(X) == ecoc_shared.predict(X)).all()
+    if weights is not None:
+        assert np.allclose(ecoc_knn.dich_weights, ecoc_shared.dich_weights)
+
+
+def test_shared_knn_with_preprocessing():
+    with pytest.raises(ValueError):
+        ecoc.ECOC(binary_classifier='shared_KNN', preprocessing='SOUP').fit(X, y)
+
+
+@pytest.mark.parametrize("encoding", ['OVO', 'OVA', 'dense', 'complete'])
+def test_partial_fit_same_as_fit(encoding):
+    clf = ecoc.ECOC(binary_classifier='NB', preprocessing=None, encoding=encoding)
+    for start in range(0, X.shape[0], 10):
+        clf.partial_fit(X[start:start + 10], y[start:start + 10], classes=[0, 1, 2, 3])
+    expected = ecoc.ECOC(binary_classifier='NB', preprocessing=None, encoding=encoding).fit(X, y)
+
+    for classifier, expected_classifier in zip(clf._binary_classifiers, expected._binary_classifiers):
+        assert np.allclose(classifier.theta_, expected_classifier.theta_)
+    assert (clf.predict(X) == expected.predict(X)).all()
+
+
+@pytest.mark.parametrize("encoding", ['OVO', 'OVA', 'dense', 'sparse', 'complete'])
+def test_partial_fit_extends_code_matrix(encoding):
+    clf = ecoc.ECOC(binary_classifier='NB', preprocessing=None, encoding=encoding)
+    clf.partial_fit(X[y < 3], y[y < 3])
+    code_matrix = clf._code_matrix.copy()
+    clf.partial_fit(X, y)
+
+    assert (clf._labels == [0, 1, 2, 3]).all()
+    assert (clf._code_matrix[:3, :code_matrix.shape[1]] == code_matrix).all()
+    assert len(clf._binary_classifiers) == clf._code_matrix.shape[1]
+    assert len({tuple(row) for row in clf._code_matrix}) == 4
+    assert (clf._code_matrix[:, code_matrix.shape[1]:] != 0).any(axis=0).all()
+    assert set(clf.predict(X)) <= {0, 1, 2, 3}
+
+
+@pytest.mark.parametrize("encoding", ['OVO', 'OVA', 'dense', 'sparse', 'complete'])
+def test_partial_fit_predicts_with_classes_absent_from_first_batch(encoding):
+    clf = ecoc.ECOC(binary_classifier=SGDClassifier(loss='log_loss', random_state=0), preprocessing=None,
+                    encoding=encoding)
+    clf.partial_fit(X[y < 2], y[y < 2], classes=[0, 1, 2, 3])
+
+    unused = ~(clf._code_matrix[:2] != 0).any(axis=0)
+    assert all((classifier is None) == is_unused for classifier, is_unused in zip(clf._binary_classifiers, unused))
+    assert set(clf.predict(X)) <= {0, 1, 2, 3}
+    probabilities = clf.predict_proba(X)
+    assert probabilities.shape == (X.shape[0], 4)
+    assert np.allclose(probabilities.sum(axis=1), 1)
+
+    clf.partial_fit(X, y)
+    assert all(classifier is not None for classifier in clf._binary_classifiers)
+
+
+def test_partial_fit_unsupported_options():
+    with pytest.raises(ValueError):
+        ecoc.ECOC(binary_classifier='KNN', preprocessing=None).partial_fit(X, y)
+    with pytest.raises(ValueError):
+        ecoc.ECOC(binary_classifier='NB', preprocessing=None, weights='acc').partial_fit(X, y)
+
+
+@pytest.mark.parametrize("encoding", ['OVO', 'OVA', 'dense', 'sparse', 'complete'])
+@pytest.mark.parametrize("weights", [None, 'acc'])
+def test_predict_proba_and_decision_function(encoding, weights):
+    clf = ecoc.ECOC(binary_classifier='NB', preprocessing=None, encoding=encoding, weights=weights).fit(X, y)
+    probabilities = clf.predict_proba(X)
+    scores = clf.decision_function(X)
+
+    assert probabilities.shape == scores.shape == (X.shape[0], 4)
+    assert np.allclose(probabilities.sum(axis=1), 1)
+    assert (np.argmax(probabilities, axis=1) == np.argmax(scores, axis=1)).all()
+
+
+def test_shared_knn_decision_function_same_as_knn():
+    clf_knn = ecoc.ECOC(binary_classifier='KNN', preprocessing=None, encoding='dense').fit(X, y)
+    clf_shared = ecoc.ECOC(binary_classifier='shared_KNN', preprocessing=None, encoding='dense').fit(X, y)
+    assert np.allclose(clf_knn.decision_function(X), clf_shared.decision_function(X))
+
+
+def test_chunked_prediction():
+    clf = ecoc.ECOC(binary_classifier='NB', preprocessing=None).fit(X, y)
+    chunked = ecoc.ECOC(binary_classifier='NB', preprocessing=None, working_memory=1e-3).fit(X, y)
+    assert (clf.predict(X) == chunked.predict(X)).all()
+    assert np.allclose(clf.decision_function(X), chunked.decision_function(X))
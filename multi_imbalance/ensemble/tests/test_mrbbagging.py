@@ -1,6 +1,9 @@
 import unittest
 from unittest.mock import MagicMock
 
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import PassiveAggressiveClassifier, SGDClassifier
+from sklearn.naive_bayes import GaussianNB
 from sklearn.tree import DecisionTreeClassifier
 
 from multi_imbalance.ensemble.mrbbagging import MRBBagging
@@ -67,13 +70,84 @@ class TestMRBBagging(unittest.TestCase):
         y_pred = mrbbagging.predict(X_test)
         assert all(y_pred == y_test)
 
+    def test_api_with_sparse_input(self):
+        for feature_selection in [False, True]:
+            mrbbagging = MRBBagging(3, DecisionTreeClassifier(random_state=0), feature_selection=feature_selection,
+                                    random_state=0)
+            mrbbagging.fit(csr_matrix(X_train), y_train)
+            y_pred = mrbbagging.predict(csr_matrix(X_test))
+            assert all(y_pred == y_test)
+
+    def test_api_with_float32_dtype(self):
+        for feature_selection in [False, True]:
+            mrbbagging = MRBBagging(3, DecisionTreeClassifier(random_state=0), feature_selection=feature_selection,
+                                    random_state=0, dtype=np.float32)
+            mrbbagging.fit(X_train, y_train)
+            y_pred = mrbbagging.predict(X_test)
+            assert all(y_pred == y_test)
+
+    def test_partial_fit(self):
+        mrbbagging = MRBBagging(5, GaussianNB(), undersampling=False, random_state=0)
+        for start in range(0, len(y_train), 4):
+            mrbbagging.partial_fit(X_train[start:start + 4], y_train[start:start + 4], classes=[0, 1])
+        y_pred = mrbbagging.predict(X_test)
+        assert all(y_pred == y_test)
+        assert list(mrbbagging._class_counts) == [12, 4]
+
+    def test_partial_fit_with_undersampling_favours_minority_class(self):
+        y_pred = {}
+        for undersampling in [True, False]:
+            mrbbagging = MRBBagging(5, GaussianNB(), undersampling=undersampling, random_state=0)
+            y_pred[undersampling] = mrbbagging.partial_fit(X_train, y_train).predict(X_train)
+        assert sum(y_pred[True]) >= sum(y_pred[False])
+
+    def test_partial_fit_with_sparse_input_and_random_feature_selection(self):
+        mrbbagging = MRBBagging(2, SGDClassifier(loss='log_loss', random_state=0), feature_selection=True,
+                                random_fs=True, random_state=0)
+        mrbbagging.partial_fit(csr_matrix(X_train), y_train)
+        assert len(mrbbagging.classifiers) > 0
+        assert len(mrbbagging.predict(csr_matrix(X_test))) == len(X_test)
+        assert all(len(features) == 1 for features in mrbbagging.feature_selection_methods.values())
+
+    def test_poisson_rates_balance_classes(self):
+        mrbbagging = MRBBagging(1, GaussianNB(), undersampling=False)
+        mrbbagging._start_stream(X_train, y_train, None)
+        rates = mrbbagging._poisson_rates(np.array([0, 0, 0, 1, 0]))
+        np.testing.assert_allclose(rates, [1, 1, 1, 2, 5 / 2 / 4])
+
+        mrbbagging = MRBBagging(1, GaussianNB(), undersampling=True)
+        mrbbagging._start_stream(X_train, y_train, None)
+        rates = mrbbagging._poisson_rates(np.array([0, 0, 0, 1, 0]))
+        np.testing.assert_allclose(rates, [1, 1, 1, 1, 1 / 4])
+
+    def test_partial_fit_with_unsupported_parameters(self):
+        with self.assertRaises(ValueError):
+            MRBBagging(1, DecisionTreeClassifier()).partial_fit(X_train, y_train)
+        with self.assertRaises(ValueError):
+            MRBBagging(1, PassiveAggressiveClassifier()).partial_fit(X_train, y_train)
+        with self.assertRaises(ValueError):
+            MRBBagging(1, GaussianNB(), feature_selection=True).partial_fit(X_train, y_train)
+        mrbbagging = MRBBagging(1, GaussianNB()).partial_fit(X_train, y_train)
+        with self.assertRaises(ValueError):
+            mrbbagging.partial_fit(X_test, np.array([0, 1, 2, 0]))
+
     def test__group_data(self):
         mrbbagging = MRBBagging(1, DecisionTreeClassifier())
         x = [[1, 1, 1], [2, 2, 2], [3, 3, 3]]
         y = ["A", "B", "C"]
         classes, grouped_data = mrbbagging._group_data(x, y)
         self.assertEqual(classes, {'A', 'B', 'C'})
-        self.assertEqual(grouped_data, {'C': [[[3, 3, 3], 'C']], 'A': [[[1, 1, 1], 'A']], 'B': [[[2, 2, 2], 'B']]})
+        self.assertEqual({cl: indices.tolist() for cl, indices in grouped_data.items()}, {'A': [0], 'B': [1], 'C': [2]})
+
+    def test__resample_gathers_rows_by_indices(self):
+        mrbbagging = MRBBagging(1, DecisionTreeClassifier(), random_state=0)
+        classes, grouped_data = mrbbagging._group_data(X_train, y_train)
+        for x in [X_train, csr_matrix(X_train)]:
+            subset_x, subset_y = mrbbagging._resample(x, y_train, 8, [0.5, 0.5], classes, grouped_data)
+            assert subset_x.shape == (8, 2) and type(subset_x) is type(x)
+            rows = subset_x.toarray() if hasattr(subset_x, 'toarray') else subset_x
+            for row, label in zip(rows, subset_y):
+                assert any((row == X_train[y_train == label]).all(axis=1))
 
     def test__group_data_with_none(self):
         mrbbagging = MRBBagging(1, DecisionTreeClassifier())
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from multi_imbalance.datasets import make_imbalanced_memmap
+from multi_imbalance.ensemble.ecoc import ECOC
+from multi_imbalance.ensemble.mrbbagging import MRBBagging
+from multi_imbalance.ensemble.ovo import OVO
+from multi_imbalance.ensemble.soup_bagging import SOUPBagging
+
+ENSEMBLES = {
+    'OVO': lambda budget: OVO(binary_classifier='KNN', preprocessing='globalCS', memory_budget=budget),
+    'ECOC': lambda budget: ECOC(binary_classifier='KNN', preprocessing='globalCS', weights='acc',
+                                memory_budget=budget),
+    'MRBBagging': lambda budget: MRBBagging(3, DecisionTreeClassifier(random_state=0), random_state=0,
+                                            memory_budget=budget),
+    'SOUPBagging': lambda budget: SOUPBagging(KNeighborsClassifier(), n_classifiers=2, memory_budget=budget),
+}
+
+
+@pytest.fixture(scope='module')
+def memmap_data(tmp_path_factory):
+    path = tmp_path_factory.mktemp('data')
+    return make_imbalanced_memmap(300, str(path / 'X.npy'), str(path / 'y.npy'), profile='1:2:4', n_features=3,
+                                  random_state=0)
+
+
+@pytest.mark.parametrize("name", ENSEMBLES.keys())
+def test_memmap_input_with_spilling(name, memmap_data):
+    X, y = memmap_data
+    in_memory = ENSEMBLES[name](None)
+    in_memory.fit(np.array(X), np.array(y))
+    out_of_core = ENSEMBLES[name](0)
+    out_of_core.fit(X, y)
+    assert_array_equal(out_of_core.predict(X), in_memory.predict(np.array(X)))
+
+
+def test_base_learners_use_spilled_training_sets(memmap_data):
+    X, y = memmap_data
+    ovo = OVO(binary_classifier='KNN', preprocessing=None, memory_budget=0).fit(X, y)
+    assert all(isinstance(clf._fit_X.base, np.memmap) for row in ovo._binary_classifiers for clf in row)
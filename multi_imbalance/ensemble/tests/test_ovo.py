@@ -1,8 +1,12 @@
 import pytest
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
 import multi_imbalance.ensemble.ovo as ovo
+from multi_imbalance.utils.data import ClassProfile
+from multi_imbalance.utils.profiling import instrument
 import numpy as np
 
 X = np.array([
@@ -63,10 +67,28 @@ def test_max_voting():
                                [4, 5, 6, 0, 0],
                                [7, 7, 7, 5, 0]])
 
+    winners = np.array([[labels.tolist().index(binary_outputs[row][col]) for row in range(5) for col in range(row)]])
+
     clf = ovo.OVO()
     clf._labels = labels
-    voting_winner = clf._perform_max_voting(binary_outputs)
-    assert voting_winner == 7
+    voting_winner = clf._perform_max_voting(winners)
+    assert voting_winner.tolist() == [7]
+
+
+def test_max_voting_in_predict():
+    class ConstantClassifier:
+        def __init__(self):
+            self.label = None
+
+        def fit(self, X, y):
+            self.label = np.max(y)
+            return self
+
+        def predict(self, X):
+            return np.full(X.shape[0], self.label)
+
+    clf = ovo.OVO(binary_classifier=ConstantClassifier(), preprocessing=None).fit(X, y)
+    assert (clf.predict(X) == 3).all()
 
 
 def test_with_own_classifier():
@@ -148,3 +170,179 @@ def test_ecoc_with_sklearn_pipeline(preprocessing_btwn, classifier, preprocessin
     pipeline.fit(X, y)
     y_hat = pipeline.predict(np.array([[1.1, 2.2, 3.3], [4.4, 5.5, 6.6], [7.7, 8.8, 9.99]]))
     assert len(y_hat) == 3
+
+
+@pytest.mark.parametrize("preprocessing", [None, 'globalCS', 'SOUP'])
+def test_sparse_input(preprocessing):
+    clf_dense = ovo.OVO(binary_classifier='KNN', preprocessing=preprocessing).fit(X[:-1], y[:-1])
+    clf_sparse = ovo.OVO(binary_classifier='KNN', preprocessing=preprocessing).fit(csr_matrix(X[:-1]), y[:-1])
+    assert (clf_dense.predict(X) == clf_sparse.predict(csr_matrix(X))).all()
+
+
+@pytest.mark.parametrize("preprocessing", [None, 'globalCS', 'SOUP'])
+def test_float32_dtype(preprocessing):
+    clf_64 = ovo.OVO(binary_classifier='KNN', preprocessing=preprocessing).fit(X, y)
+    clf_32 = ovo.OVO(binary_classifier='KNN', preprocessing=preprocessing, dtype=np.float32).fit(X, y)
+    assert (clf_64.predict(X) == clf_32.predict(X)).all()
+
+
+@pytest.mark.parametrize("n_neighbors", [1, 3, 4])
+def test_shared_knn_same_as_knn(n_neighbors):
+    clf_knn = ovo.OVO(binary_classifier='KNN', preprocessing=None, n_neighbors=n_neighbors).fit(X, y)
+    clf_shared = ovo.OVO(binary_classifier='shared_KNN', preprocessing=None, n_neighbors=n_neighbors).fit(X, y)
+    assert clf_shared._binary_classifiers == []
+    assert (clf_knn.predict(X) == clf_shared.predict(X)).all()
+    clf_sparse = ovo.OVO(binary_classifier='shared_KNN', preprocessing=None, n_neighbors=n_neighbors)
+    assert (clf_knn.predict(X) == clf_sparse.fit(csr_matrix(X), y).predict(csr_matrix(X))).all()
+
+
+def test_shared_knn_with_preprocessing():
+    with pytest.raises(ValueError):
+        ovo.OVO(binary_classifier='shared_KNN', preprocessing='SOUP').fit(X, y)
+
+
+def test_shared_class_profile():
+    clf_expected = ovo.OVO(binary_classifier='KNN', preprocessing='globalCS').fit(X, y)
+    clf_shared = ovo.OVO(binary_classifier='KNN', preprocessing='globalCS', class_profile=ClassProfile(y)).fit(X, y)
+    assert (clf_expected.predict(X) == clf_shared.predict(X)).all()
+
+
+def test_class_profile_of_other_labels_of_the_same_length():
+    profile = ClassProfile(y[:12])
+    with pytest.raises(ValueError):
+        ovo.OVO(binary_classifier='KNN', preprocessing=None, class_profile=profile).fit(X[12:24], y[12:24])
+
+
+def test_partial_fit_same_as_fit():
+    clf = ovo.OVO(binary_classifier='NB', preprocessing=None)
+    for start in range(0, X.shape[0], 8):
+        clf.partial_fit(X[start:start + 8], y[start:start + 8], classes=[1, 2, 3])
+    expected = ovo.OVO(binary_classifier='NB', preprocessing=None).fit(X, y)
+
+    for row in range(3):
+        for col in range(row):
+            assert np.allclose(clf._binary_classifiers[row][col].theta_, expected._binary_classifiers[row][col].theta_)
+    assert (clf.predict(X) == expected.predict(X)).all()
+
+
+def test_partial_fit_adds_classifiers_of_new_classes():
+    clf = ovo.OVO(binary_classifier='NB', preprocessing=None)
+    clf.partial_fit(X[y != 2], y[y != 2])
+    first_pair = clf._binary_classifiers[1][0]
+    clf.partial_fit(X[y == 2], y[y == 2])
+
+    assert (clf._labels == [1, 2, 3]).all()
+    assert clf._binary_classifiers[2][0] is first_pair
+    assert clf._binary_classifiers[1][0].classes_.tolist() == [1, 2]
+    assert set(clf.predict(X)) <= {1, 2, 3}
+
+
+@pytest.mark.parametrize("aggregation", ['max_voting', 'DDAG'])
+def test_partial_fit_predicts_with_classes_absent_from_first_batch(aggregation):
+    clf = ovo.OVO(binary_classifier=SGDClassifier(loss='log_loss', random_state=0), preprocessing=None,
+                  aggregation=aggregation)
+    clf.partial_fit(X[y == 1], y[y == 1], classes=[1, 2, 3, 4])
+
+    assert clf._binary_classifiers[3][2] is None
+    assert set(clf.predict(X)) <= {1, 2, 3, 4}
+    probabilities = clf.predict_proba(X)
+    assert probabilities.shape == (X.shape[0], 4)
+    assert np.allclose(probabilities.sum(axis=1), 1)
+    assert np.isfinite(clf.decision_function(X)).all()
+
+    clf.partial_fit(X, y)
+    assert clf._binary_classifiers[2][1] is not None
+    assert clf._binary_classifiers[3][2] is not None
+
+
+def test_partial_fit_requires_incremental_classifier():
+    with pytest.raises(ValueError):
+        ovo.OVO(binary_classifier='tree', preprocessing=None).partial_fit(X, y)
+
+
+def test_pairwise_coupling_recovers_consistent_probabilities():
+    probabilities = np.random.RandomState(0).dirichlet(np.ones(4), size=5)
+    pairwise = probabilities[:, :, np.newaxis] / (probabilities[:, :, np.newaxis] + probabilities[:, np.newaxis, :])
+    pairwise[:, range(4), range(4)] = 0
+    assert np.allclose(ovo.OVO._couple(pairwise), probabilities)
+
+
+@pytest.mark.parametrize("classifier", ['tree', 'NB', 'KNN', 'shared_KNN'])
+def test_predict_proba_and_decision_function(classifier):
+    clf = ovo.OVO(binary_classifier=classifier, preprocessing=None).fit(X, y)
+    probabilities = clf.predict_proba(X)
+    scores = clf.decision_function(X)
+
+    assert probabilities.shape == scores.shape == (X.shape[0], 3)
+    assert np.allclose(probabilities.sum(axis=1), 1) and (probabilities >= 0).all()
+    if classifier != 'tree':
+        assert (clf._labels[np.argmax(scores, axis=1)] == clf.predict(X)).all()
+
+
+def test_shared_knn_probabilities_same_as_knn():
+    clf_knn = ovo.OVO(binary_classifier='KNN', preprocessing=None).fit(X, y)
+    clf_shared = ovo.OVO(binary_classifier='shared_KNN', preprocessing=None).fit(X, y)
+    assert np.allclose(clf_knn.predict_proba(X), clf_shared.predict_proba(X))
+
+
+def test_chunked_prediction():
+    clf = ovo.OVO(binary_classifier='NB', preprocessing=None).fit(X, y)
+    chunked = ovo.OVO(binary_classifier='NB', preprocessing=None, working_memory=1e-3).fit(X, y)
+    assert (clf.predict(X) == chunked.predict(X)).all()
+    assert np.allclose(clf.predict_proba(X), chunked.predict_proba(X))
+
+
+def ddag_prediction(clf, instance):
+    remaining = list(range(len(clf._labels)))
+    while len(remaining) > 1:
+        first, last = remaining[0], remaining[-1]
+        if clf._binary_classifiers[last][first].predict(instance.reshape(1, -1))[0] == clf._labels[first]:
+            remaining.pop()
+        else:
+            remaining.pop(0)
+    return clf._labels[remaining[0]]
+
+
+@pytest.mark.parametrize("classifier", ['tree', 'NB', 'KNN'])
+def test_ddag_aggregation(classifier):
+    clf = ovo.OVO(binary_classifier=classifier, preprocessing=None, aggregation='DDAG').fit(X[:-5], y[:-5])
+    with instrument() as profiler:
+        predicted = clf.predict(X)
+
+    assert (predicted == [ddag_prediction(clf, instance) for instance in X]).all()
+    assert profiler.counters['classifier_predictions'] == X.shape[0] * 2
+
+
+def test_ddag_aggregation_with_shared_knn():
+    clf_knn = ovo.OVO(binary_classifier='KNN', preprocessing=None, aggregation='DDAG').fit(X, y)
+    clf_shared = ovo.OVO(binary_classifier='shared_KNN', preprocessing=None, aggregation='DDAG').fit(X, y)
+    assert (clf_knn.predict(X) == clf_shared.predict(X)).all()
+
+
+@pytest.mark.parametrize("classifier", ['tree', 'shared_KNN'])
+def test_dcs_aggregation(classifier):
+    clf = ovo.OVO(binary_classifier=classifier, preprocessing=None, aggregation='DCS').fit(X, y)
+    full = ovo.OVO(binary_classifier=classifier, preprocessing=None).fit(X, y)
+    assert set(clf.predict(X)) <= {1, 2, 3}
+    assert (clf.predict(X[:10]) == full.predict(X[:10])).all()
+
+
+def test_dcs_aggregation_selects_classes_of_neighbourhood():
+    class ConstantClassifier:
+        def fit(self, X, y):
+            return self
+
+        def predict(self, X):
+            return np.full(X.shape[0], 2)
+
+    X_separated = np.vstack([X[:10], X[:10] + 1000, X[:10] - 1000])
+    y_separated = np.repeat([1, 2, 3], 10)
+    clf = ovo.OVO(binary_classifier=ConstantClassifier(), preprocessing=None, aggregation='DCS')
+    assert (clf.fit(X_separated, y_separated).predict(X_separated) == y_separated).all()
+
+
+def test_invalid_aggregation():
+    with pytest.raises(ValueError):
+        ovo.OVO(preprocessing=None, aggregation='unknown').fit(X, y)
+    with pytest.raises(ValueError):
+        ovo.OVO(binary_classifier='NB', preprocessing=None, aggregation='DCS').partial_fit(X, y)
@@ -0,0 +1,64 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from numpy.testing import assert_array_equal
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from multi_imbalance.datasets import make_imbalanced_classification
+from multi_imbalance.ensemble.ecoc import ECOC
+from multi_imbalance.ensemble.mrbbagging import MRBBagging
+from multi_imbalance.ensemble.ovo import OVO
+from multi_imbalance.ensemble.persistence import load_ensemble, save_ensemble, META_FILENAME
+from multi_imbalance.ensemble.soup_bagging import SOUPBagging
+
+X, y = make_imbalanced_classification(300, profile='1:2:4', n_features=4, random_state=0)
+
+
+@pytest.fixture(params=['OVO', 'ECOC', 'MRBBagging', 'SOUPBagging'])
+def fitted(request):
+    if request.param == 'OVO':
+        return OVO(binary_classifier='KNN', preprocessing='globalCS').fit(X, y)
+    if request.param == 'ECOC':
+        return ECOC(binary_classifier='KNN', encoding='dense', weights='acc').fit(X, y)
+    if request.param == 'MRBBagging':
+        model = MRBBagging(3, DecisionTreeClassifier(random_state=0), random_state=0)
+        model.fit(X, y)
+        return model
+    model = SOUPBagging(KNeighborsClassifier(), n_classifiers=3)
+    model.fit(X, y)
+    return model
+
+
+def test_save_and_load(fitted, tmp_path):
+    path = str(tmp_path / 'model')
+    save_ensemble(fitted, path)
+    loaded = load_ensemble(path)
+    assert type(loaded) is type(fitted)
+    assert_array_equal(loaded.predict(X), fitted.predict(X))
+
+
+def test_arrays_are_memory_mapped(tmp_path):
+    model = ECOC(binary_classifier='KNN', encoding='dense', weights='acc').fit(X, y)
+    path = str(tmp_path / 'model')
+    save_ensemble(model, path)
+
+    with open(os.path.join(path, META_FILENAME)) as f:
+        meta = json.load(f)
+    assert meta['class'] == 'multi_imbalance.ensemble.ecoc.ECOC'
+    assert {'_code_matrix', 'dich_weights', '_labels'} <= set(meta['arrays'])
+
+    loaded = load_ensemble(path)
+    assert isinstance(loaded._code_matrix, np.memmap)
+    assert isinstance(loaded._binary_classifiers[0]._fit_X, np.memmap)
+    assert not isinstance(load_ensemble(path, mmap_mode=None)._code_matrix, np.memmap)
+
+
+def test_save_replaces_existing_model(tmp_path):
+    path = str(tmp_path / 'model')
+    save_ensemble(OVO(binary_classifier='tree', preprocessing=None).fit(X, y), path)
+    save_ensemble(ECOC(binary_classifier='tree', preprocessing=None).fit(X, y), path)
+    assert isinstance(load_ensemble(path), ECOC)
+    assert os.listdir(str(tmp_path)) == ['model']
@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
 from numpy.testing import assert_array_almost_equal
+from scipy.sparse import csr_matrix
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.utils import resample
 from sklearn.utils.validation import check_is_fitted
@@ -81,3 +82,26 @@ def test_fit_classifier_classifier():
     assert all(y_pred == y_test)
     assert_array_almost_equal(weights, np.array([1.33288904, 0.66644452]))
 
+
+
+def test_sparse_input():
+    maj_int_min = {'maj': [0], 'int': [], 'min': [1]}
+    clf = SOUPBagging(KNeighborsClassifier(), n_classifiers=2, maj_int_min=maj_int_min)
+    clf.fit(csr_matrix(X_train), y_train)
+    y_pred = clf.predict(csr_matrix(X_test))
+    assert all(y_pred == y_test)
+
+
+def test_out_of_bag():
+    x_sampled, y_sampled = X_train[[0, 0, 3]], y_train[[0, 0, 3]]
+    x_out, y_out = SOUPBagging._out_of_bag(csr_matrix(X_train), y_train, csr_matrix(x_sampled), y_sampled)
+    assert x_out.shape[0] == X_train.shape[0] - 2
+    assert_array_almost_equal(x_out.toarray(), np.delete(X_train, [0, 3], axis=0))
+    assert (y_out == np.delete(y_train, [0, 3])).all()
+
+
+def test_float32_dtype():
+    maj_int_min = {'maj': [0], 'int': [], 'min': [1]}
+    clf = SOUPBagging(KNeighborsClassifier(), n_classifiers=2, maj_int_min=maj_int_min, dtype=np.float32)
+    clf.fit(X_train, y_train)
+    assert all(clf.predict(X_test) == y_test)
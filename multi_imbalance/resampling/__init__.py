@@ -0,0 +1,5 @@
+from multi_imbalance._lazy import lazy_submodules
+
+__all__ = ['cached', 'global_cs', 'mdo', 'soup', 'spider', 'static_smote']
+
+__getattr__, __dir__ = lazy_submodules(__name__, __all__)
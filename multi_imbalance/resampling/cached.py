@@ -0,0 +1,169 @@
+import os
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+from imblearn.base import BaseSampler
+from scipy import sparse
+from sklearn.base import clone
+from sklearn.utils.validation import check_memory
+
+from multi_imbalance.utils.data import _save_atomic
+from multi_imbalance.utils.profiling import count, instrumented
+
+_memory_store = OrderedDict()
+# size of the in-memory cache in MiB used when max_size is None, the cache is shared by the whole process
+DEFAULT_MEMORY_CACHE_SIZE = 512
+
+
+def _nbytes(arr):
+    if sparse.issparse(arr):
+        arr = arr.tocsr()
+        return arr.data.nbytes + arr.indices.nbytes + arr.indptr.nbytes
+    return getattr(arr, 'nbytes', 0)
+
+
+def _touch(path):
+    # the precise clock is used, as the file system timestamps may be too coarse to order the accesses
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def _read_only(arr):
+    if isinstance(arr, np.ndarray):
+        arr = arr.view()
+        arr.flags.writeable = False
+    return arr
+
+
+class CachedSampler(BaseSampler):
+    """
+    Wrapper of a resampling algorithm which memoises the output of fit_resample. The cache key is a hash of X, y, the
+    class of the sampler and its parameters, so the same training set resampled again with an equal sampler, e.g.
+    while only the downstream classifier changes in model selection, is read from the cache instead of being
+    resampled. The wrapped sampler is cloned before fitting, so its parameters and the key do not change.
+
+    The wrapper is a sampler itself, it can be used as a step of imblearn Pipeline and cloned by model selection tools.
+    Samplers that use randomness without a fixed random state return the same resampled set on every cache hit.
+    """
+
+    def __init__(self, sampler, memory=None, max_size=None):
+        """
+        :param sampler:
+            resampling algorithm implementing fit_resample, e.g. SOUP, MDO or SPIDER3
+        :param memory:
+            location of the cache, the same values as memory of imblearn Pipeline are accepted:
+
+            * None :
+                the results are kept in memory in a cache shared by all CachedSampler instances of the process.
+                The returned numpy arrays are read only, as they are shared between calls
+            * str :
+                path of the cache directory
+            * joblib.Memory :
+                the results are stored in the location of the Memory object
+        :param max_size:
+            size of the cache in MiB, the least recently used results are evicted above it. If None, the in-memory
+            cache is bounded by DEFAULT_MEMORY_CACHE_SIZE and the size of a cache on disk is not bounded
+        """
+        super().__init__()
+        self._sampling_type = 'bypass'
+        self.sampler = sampler
+        self.memory = memory
+        self.max_size = max_size
+
+    @instrumented
+    def fit_resample(self, X, y):
+        """
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features) with float
+            numbers
+        :param y:
+            one dimensional numpy array with labels for rows in X
+        :return:
+            Resampled X and y, read from the cache if they were computed before
+        """
+        key = joblib.hash((type(self.sampler).__module__, type(self.sampler).__qualname__,
+                           self.sampler.get_params(), X, y))
+        location = check_memory(self.memory).location
+        cached = self._load_memory(key) if location is None else self._load_disk(location, key)
+        if cached is not None:
+            count('resample_cache_hits')
+            return cached
+
+        count('resample_cache_misses')
+        self.sampler_ = clone(self.sampler)
+        X_resampled, y_resampled = self.sampler_.fit_resample(X, y)
+        if location is None:
+            return self._store_memory(key, X_resampled, y_resampled)
+        self._store_disk(location, key, X_resampled, y_resampled)
+        return X_resampled, y_resampled
+
+    def _fit_resample(self, X, y):
+        return self.fit_resample(X, y)
+
+    def _limit(self, location=None):
+        if self.max_size is None:
+            return DEFAULT_MEMORY_CACHE_SIZE * 2 ** 20 if location is None else None
+        return self.max_size * 2 ** 20
+
+    def _load_memory(self, key):
+        if key not in _memory_store:
+            return None
+        _memory_store.move_to_end(key)
+        return _memory_store[key][:2]
+
+    def _store_memory(self, key, X, y):
+        X, y = _read_only(X), _read_only(y)
+        _memory_store[key] = X, y, _nbytes(X) + _nbytes(y)
+        limit = self._limit()
+        if limit is not None:
+            total = sum(entry[2] for entry in _memory_store.values())
+            while total > limit and _memory_store:
+                total -= _memory_store.popitem(last=False)[1][2]
+        return X, y
+
+    @staticmethod
+    def _cache_dir(location):
+        return os.path.join(location, 'multi_imbalance', 'resampled')
+
+    def _load_disk(self, location, key):
+        path = os.path.join(self._cache_dir(location), f'{key}.pkl')
+        try:
+            X, y = joblib.load(path, mmap_mode='r')
+        except (OSError, EOFError, ValueError):
+            return None
+        _touch(path)
+        return X, y
+
+    def _store_disk(self, location, key, X, y):
+        """
+        Writes the result atomically and evicts the least recently used (modified or read) results above max_size.
+        """
+        cache_dir = self._cache_dir(location)
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f'{key}.pkl')
+        _save_atomic(path, lambda f: joblib.dump((X, y), f))
+        _touch(path)
+
+        limit = self._limit(location)
+        if limit is None:
+            return
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(cache_dir, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= limit:
+                break
+            os.remove(os.path.join(cache_dir, name))
+            total -= size
+
+
+def clear_memory_cache():
+    """
+    Removes all results from the in-memory cache of CachedSampler.
+    """
+    _memory_store.clear()
@@ -3,6 +3,10 @@ from collections import Counter
 import numpy as np
 import sklearn
 from imblearn.base import BaseSampler
+from sklearn.utils import check_random_state
+
+from multi_imbalance.utils.array_util import as_float, vstack
+from multi_imbalance.utils.data import get_class_profile
 
 
 class GlobalCS(BaseSampler):
@@ -11,16 +15,37 @@ class GlobalCS(BaseSampler):
     for each class to achieve majority class size
     """
 
-    def __init__(self, shuffle: bool = True):
+    def __init__(self, shuffle: bool = True, dtype=None, class_profile=None, reservoir_size=None, random_state=None):
+        """
+        :param shuffle:
+            bool - output will be shuffled
+        :param dtype:
+            floating point type of the resampled X, e.g. np.float32 to halve the memory usage. If None, the type
+            of X is preserved
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y, if None it is computed in fit_resample
+        :param reservoir_size:
+            maximal number of examples of a class kept by partial_fit_resample to duplicate them, the kept examples
+            are a uniform sample of all examples of the class seen so far (reservoir sampling). If None, all examples
+            are kept
+        :param random_state:
+            seed or numpy RandomState used by partial_fit_resample for reservoir sampling and shuffling
+        """
         super().__init__()
         self._sampling_type = 'over-sampling'
         self.shuffle = shuffle
+        self.dtype = dtype
+        self.class_profile = class_profile
+        self.reservoir_size = reservoir_size
+        self.random_state = random_state
         self.quantities, self.max_quantity, self.X, self.y = [None] * 4
+        self._reservoirs, self._emitted, self._cursors, self._random_state = [None] * 4
 
     def _fit_resample(self, X, y):
         """
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers
         :param y:
             one dimensional numpy array with labels for rows in X
         :return:
@@ -29,34 +54,106 @@ class GlobalCS(BaseSampler):
         assert len(X.shape) == 2, 'X should have 2 dimension'
         assert X.shape[0] == y.shape[0], 'Number of labels must be equal to number of samples'
 
-        self.quantities = Counter(y)
-        self.max_quantity = int(np.max(list(self.quantities.values())))
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+
+        class_profile = get_class_profile(y, self.class_profile)
+        self.quantities = class_profile.quantities()
+        self.max_quantity = int(class_profile.counts.max())
         self.X = X
         self.y = y
 
-        result_X, result_y = list(), list()
-
-        for class_name, class_quantity in self.quantities.items():
-            temp_X, temp_y = self._equal_oversample(self.X, self.y, class_name)
-
-            result_X.extend(temp_X)
-            result_y.extend(temp_y)
+        indices_by_class = np.split(np.argsort(class_profile.encoded, kind='stable'),
+                                    np.cumsum(class_profile.counts)[:-1])
+        indices = np.concatenate([self._equal_oversample(indices_by_class[class_idx])
+                                  for class_idx in class_profile.order])
 
         if self.shuffle:
-            result_X, result_y = sklearn.utils.shuffle(result_X, result_y)
+            indices = sklearn.utils.shuffle(indices)
 
-        return np.array(result_X), np.array(result_y)
+        return self.X[indices], self.y[indices]
 
-    def _equal_oversample(self, X, y, class_name):
-        indices_in_class = [i for i, class_label in enumerate(y) if class_label == class_name]
+    def _equal_oversample(self, indices_in_class):
+        """
+        :return:
+            indices of rows of a class, followed by the indices of duplicated rows. Rows are duplicated
+            cyclically, so that each of them is copied the same number of times (+/- 1)
+        """
         desired_quantity = self.max_quantity - len(indices_in_class)
+        return np.concatenate((indices_in_class, np.resize(indices_in_class, desired_quantity)))
+
+    def partial_fit_resample(self, X, y):
+        """
+        Incremental version of fit_resample for data arriving in batches. The numbers of examples of each class seen
+        so far are kept in quantities, together with a reservoir of examples of each class. The batch is returned
+        followed by the duplicates needed to balance everything returned so far: after each call every class has
+        been returned max_quantity times in total, i.e. as many times as the most returned class including its
+        duplicates. Duplicates are taken cyclically from the reservoir of the class, so with reservoir_size=None
+        a single batch is resampled the same as by fit_resample (up to the order of rows).
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers
+        :param y:
+            one dimensional numpy array with labels for rows in X
+        :return:
+            Batch X and y followed by duplicates of examples of the classes that fell behind the majority class
+        """
+        assert len(X.shape) == 2, 'X should have 2 dimension'
+        assert X.shape[0] == y.shape[0], 'Number of labels must be equal to number of samples'
+
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        y = np.asarray(y)
+        if self._reservoirs is None:
+            self.quantities, self._emitted, self._reservoirs, self._cursors = Counter(), Counter(), dict(), Counter()
+            self._random_state = check_random_state(self.random_state)
 
-        oversampled_X, oversampled_y = list(X[indices_in_class]), list(y[indices_in_class])
+        for label in np.unique(y).tolist():
+            self._update_reservoir(label, X[y == label])
+            self.quantities[label] += int(np.count_nonzero(y == label))
+            self._emitted[label] += int(np.count_nonzero(y == label))
+        # duplicates returned before count too, the majority class of the stream may change between batches
+        self.max_quantity = max(self._emitted.values())
+
+        X_parts, y_parts = [X], [y]
+        for label in sorted(self.quantities):
+            missing = self.max_quantity - self._emitted[label]
+            if missing > 0:
+                reservoir = self._reservoirs[label]
+                X_parts.append(reservoir[(self._cursors[label] + np.arange(missing)) % reservoir.shape[0]])
+                y_parts.append(np.full(missing, label, dtype=y.dtype))
+                self._cursors[label] += missing
+                self._emitted[label] += missing
+
+        X_resampled, y_resampled = vstack(X_parts), np.concatenate(y_parts)
+        if self.shuffle:
+            X_resampled, y_resampled = sklearn.utils.shuffle(X_resampled, y_resampled,
+                                                             random_state=self._random_state)
+        return X_resampled, y_resampled
+
+    def _update_reservoir(self, label, X_class):
+        """
+        Adds the examples of a class from a batch to its reservoir with vectorised reservoir sampling (algorithm R):
+        the examples fill the free places, then the n-th example of the class replaces a random kept example with
+        probability reservoir_size / n.
+        """
+        reservoir = self._reservoirs.get(label)
+        if reservoir is None:
+            reservoir, seen = X_class[:0], 0
+        else:
+            seen = self.quantities[label]
+        if self.reservoir_size is None:
+            self._reservoirs[label] = vstack((reservoir, X_class))
+            return
 
-        for i in range(desired_quantity):
-            sample_index_to_duplicate: int = i % self.quantities[class_name]
-            sample_id: int = indices_in_class[sample_index_to_duplicate]
-            oversampled_X.append(X[sample_id])
-            oversampled_y.append(y[sample_id])
+        positions = seen + np.arange(X_class.shape[0])
+        n_filled = int(np.count_nonzero(positions < self.reservoir_size))
+        kept = np.concatenate((np.arange(reservoir.shape[0]), reservoir.shape[0] + np.arange(n_filled)))
 
-        return oversampled_X, oversampled_y
+        draws = self._random_state.randint(0, positions[n_filled:] + 1) if n_filled < positions.shape[0] \
+            else np.array([], dtype=int)
+        replacing = np.flatnonzero(draws < self.reservoir_size)
+        slots, last = np.unique(draws[replacing][::-1], return_index=True)
+        kept[slots] = reservoir.shape[0] + n_filled + replacing[::-1][last]
+        self._reservoirs[label] = vstack((reservoir, X_class))[kept]
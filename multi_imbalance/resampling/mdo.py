@@ -1,12 +1,13 @@
-from collections import Counter
-
 import numpy as np
 from imblearn.base import BaseSampler
+from scipy import sparse
 from sklearn.decomposition import PCA
-from sklearn.neighbors import NearestNeighbors
 from sklearn.utils import check_random_state
 
-from multi_imbalance.utils.data import construct_maj_int_min
+from multi_imbalance.utils.array_util import vstack, as_float
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.neighbors import make_neighbors, kneighbors_chunked, fit_neighbors
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class MDO(BaseSampler):
@@ -17,7 +18,8 @@ class MDO(BaseSampler):
 
     """
 
-    def __init__(self, k=5, k1_frac=.4, seed=0, prop=1, maj_int_min=None):
+    def __init__(self, k=5, k1_frac=.4, seed=0, prop=1, maj_int_min=None, neighbors=None, n_jobs=None,
+                 dtype=None, class_profile=None):
         """
         :param k:
             Number of neighbours considered during the neighbourhood analysis
@@ -30,35 +32,55 @@ class MDO(BaseSampler):
             the largest class
         :param maj_int_min:
             dict {'maj': majority class labels, 'min': minority class labels}
+        :param neighbors:
+            nearest neighbours search backend, see multi_imbalance.utils.neighbors.make_neighbors
+        :param n_jobs:
+            number of threads used for neighbour queries. Queries are chunked according to sklearn's working_memory
+            config, see multi_imbalance.utils.neighbors.kneighbors_chunked
+        :param dtype:
+            floating point type used for computations and of the resampled X, e.g. np.float32 to halve the memory
+            usage. If None, float32 and float64 X is preserved and other types are converted to float64
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y, if None it is computed in fit_resample
         """
         super().__init__()
         self._sampling_type = 'over-sampling'
-        self.knn = NearestNeighbors(n_neighbors=k)
+        self.neighbors = neighbors
+        self.n_jobs = n_jobs
+        self.dtype = dtype
+        self.knn = make_neighbors(neighbors, k)
         self.k2 = k
         self.k1 = int(k * k1_frac)
         self.random_state = check_random_state(seed)
         self.X, self.y = None, None
         self.prop = prop
         self.class_balances = maj_int_min
+        self.class_profile = class_profile
 
+    @instrumented
     def _fit_resample(self, X, y):
         """
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers. Sparse input stays sparse, only the chosen examples of an oversampled class are
+            densified to compute its principal components
         :param y:
             one dimensional numpy array with labels for rows in X
         :return:
             resampled X, resampled y
         """
+        class_profile = get_class_profile(y, self.class_profile)
         if self.class_balances is None:
-            self.class_balances = construct_maj_int_min(y)
+            self.class_balances = class_profile.maj_int_min
 
-        self.knn.fit(X)
+        X = as_float(X, self.dtype)
+        fit_neighbors(self.knn, X)
         self.X, self.y = X, y
 
         oversampled_X, oversampled_y = self.X.copy(), self.y.copy()
-        quantities = Counter(self.y)
-        goal_quantity = int(max(list(quantities.values())))
+        count('rows_copied', oversampled_X.shape[0])
+        quantities = class_profile.quantities()
+        goal_quantity = int(class_profile.counts.max())
         labels = list(set(self.y))
         minority_classes = self.class_balances['min']
 
@@ -66,40 +88,46 @@ class MDO(BaseSampler):
             if minority_classes is not None and class_label not in minority_classes:
                 continue
 
-            chosen_minor_class_samples_to_oversample, weights = self._choose_samples(class_label)
-            if len(chosen_minor_class_samples_to_oversample) == 0:
+            with phase('choose_samples'):
+                chosen_minor_class_samples_to_oversample, weights = self._choose_samples(class_label)
+            if chosen_minor_class_samples_to_oversample.shape[0] == 0:
                 continue
+            if sparse.issparse(chosen_minor_class_samples_to_oversample):
+                chosen_minor_class_samples_to_oversample = chosen_minor_class_samples_to_oversample.toarray()
 
             oversampling_rate = int((goal_quantity - quantities[class_label]) * self.prop)
             if oversampling_rate > 0:
-                if len(chosen_minor_class_samples_to_oversample) == 1:
-                    oversampled_set = np.repeat(chosen_minor_class_samples_to_oversample, oversampling_rate, axis=0)
-                else:
-                    chosen_samples_features_mean = np.mean(chosen_minor_class_samples_to_oversample, axis=0)
-                    zero_mean_samples = chosen_minor_class_samples_to_oversample - chosen_samples_features_mean
+                with phase('oversample'):
+                    oversampled_set = self._oversample_class(chosen_minor_class_samples_to_oversample, weights,
+                                                             oversampling_rate)
+                oversampled_X = vstack((oversampled_X, oversampled_set.astype(X.dtype, copy=False)))
+                oversampled_y = np.hstack((oversampled_y, np.array([class_label] * oversampling_rate)))
+                count('rows_copied', oversampled_X.shape[0])
+
+        return oversampled_X, oversampled_y
 
-                    n_components = min(zero_mean_samples.shape)
-                    pca = PCA(n_components=n_components).fit(zero_mean_samples)
+    def _oversample_class(self, chosen_minor_class_samples_to_oversample, weights, oversampling_rate):
+        if len(chosen_minor_class_samples_to_oversample) == 1:
+            return np.repeat(chosen_minor_class_samples_to_oversample, oversampling_rate, axis=0)
 
-                    uncorrelated_samples = pca.transform(zero_mean_samples)
-                    variables_variance = np.diag(np.cov(uncorrelated_samples, rowvar=False))
+        chosen_samples_features_mean = np.mean(chosen_minor_class_samples_to_oversample, axis=0)
+        zero_mean_samples = chosen_minor_class_samples_to_oversample - chosen_samples_features_mean
 
-                    oversampled_set = self._MDO_oversampling(uncorrelated_samples, variables_variance,
-                                                             oversampling_rate,
-                                                             weights)
-                    oversampled_set = pca.inverse_transform(oversampled_set) + chosen_samples_features_mean
+        n_components = min(zero_mean_samples.shape)
+        pca = PCA(n_components=n_components).fit(zero_mean_samples)
 
-                oversampled_X = np.vstack((oversampled_X, oversampled_set))
-                oversampled_y = np.hstack((oversampled_y, np.array([class_label] * oversampling_rate)))
+        uncorrelated_samples = pca.transform(zero_mean_samples)
+        variables_variance = np.diag(np.cov(uncorrelated_samples, rowvar=False))
 
-        return oversampled_X, oversampled_y
+        oversampled_set = self._MDO_oversampling(uncorrelated_samples, variables_variance, oversampling_rate, weights)
+        return pca.inverse_transform(oversampled_set) + chosen_samples_features_mean
 
     def _choose_samples(self, class_label):
         minor_class_indices = [i for i, value in enumerate(self.y) if value == class_label]
         minor_set = self.X[minor_class_indices]
 
         quantity_same_class_neighbours = self.calculate_same_class_neighbour_quantities(minor_set, class_label)
-        chosen_minor_class_samples_to_oversample = minor_set[quantity_same_class_neighbours >= self.k1]
+        chosen_minor_class_samples_to_oversample = minor_set[np.flatnonzero(quantity_same_class_neighbours >= self.k1)]
 
         weights = quantity_same_class_neighbours[quantity_same_class_neighbours >= self.k1] / self.k2
         weights_sum = np.sum(weights)
@@ -140,9 +168,9 @@ class MDO(BaseSampler):
         return np.array(oversampled_set)
 
     def calculate_same_class_neighbour_quantities(self, S_minor, S_minor_label):
-        minority_class_neighbours_indices = self.knn.kneighbors(S_minor, return_distance=False)
+        minority_class_neighbours_indices = kneighbors_chunked(self.knn, S_minor, n_jobs=self.n_jobs)
         quantity_with_same_label_in_neighbourhood = list()
-        for i in range(len(S_minor)):
+        for i in range(S_minor.shape[0]):
             sample_neighbours_indices = minority_class_neighbours_indices[i][1:]
             quantity_sample_neighbours_indices_with_same_label = sum(self.y[sample_neighbours_indices] == S_minor_label)
             quantity_with_same_label_in_neighbourhood.append(quantity_sample_neighbours_indices_with_same_label)
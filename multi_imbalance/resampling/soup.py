@@ -5,9 +5,10 @@ from operator import itemgetter
 import numpy as np
 import sklearn
 from imblearn.base import BaseSampler
-from sklearn.neighbors import NearestNeighbors
-
-from multi_imbalance.utils.data import construct_maj_int_min
+from multi_imbalance.utils.array_util import vstack, delete_rows, as_float
+from multi_imbalance.utils.data import get_class_profile, class_similarity
+from multi_imbalance.utils.neighbors import make_neighbors, kneighbors_chunked, fit_neighbors
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class SOUP(BaseSampler):
@@ -18,7 +19,8 @@ class SOUP(BaseSampler):
     which are in the safest area in space
     """
 
-    def __init__(self, k: int = 7, shuffle=False, maj_int_min=None) -> None:
+    def __init__(self, k: int = 7, shuffle=False, maj_int_min=None, neighbors=None, n_jobs=None, dtype=None,
+                 class_profile=None) -> None:
         """
         :param k:
             number of neighbors
@@ -26,69 +28,254 @@ class SOUP(BaseSampler):
             bool - output will be shuffled
         :param maj_int_min:
             dict {'maj': majority class labels, 'min': minority class labels}
+        :param neighbors:
+            nearest neighbours search backend, see multi_imbalance.utils.neighbors.make_neighbors
+        :param n_jobs:
+            number of threads used for neighbour queries. Queries are chunked according to sklearn's working_memory
+            config, see multi_imbalance.utils.neighbors.kneighbors_chunked
+        :param dtype:
+            floating point type of the resampled X, e.g. np.float32 to halve the memory usage. If None, the type
+            of X is preserved
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y, if None it is computed in fit_resample
         """
         super().__init__()
         self._sampling_type = 'clean-sampling'
         self.k = k
         self.shuffle = shuffle
         self.maj_int_min = maj_int_min
+        self.neighbors = neighbors
+        self.n_jobs = n_jobs
+        self.dtype = dtype
+        self.class_profile = class_profile
         self.quantities, self.goal_quantity = None, None
         self.dsc_maj_cls, self.asc_min_cls = None, None
         self._X, self._y = None, None
+        self._X_history, self._y_history, self._neighbours, self._distances = [None] * 4
 
+    @instrumented
     def _fit_resample(self, X, y):
         """
         The method computes the metrics required for resampling based on the given set
 
         :param X:
-            two dimensional numpy array (number of samples x number of features) with float numbers
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers
         :param y:
             one dimensional numpy array with labels for rows in X
         :return:
             Resampled X (median class quantity * number of unique classes), y (number of rows in X) as numpy array
         """
 
+        class_profile = get_class_profile(y, self.class_profile)
         if self.maj_int_min is None:
-            self.maj_int_min = construct_maj_int_min(y)
+            self.maj_int_min = class_profile.maj_int_min
 
-        self._X = deepcopy(X)
+        self._X = deepcopy(X) if self.dtype is None else as_float(X, self.dtype).copy()
         self._y = deepcopy(y)
+        count('rows_copied', self._X.shape[0])
 
         assert len(self._X.shape) == 2, 'X should have 2 dimension'
         assert self._X.shape[0] == self._y.shape[0], 'Number of labels must be equal to number of samples'
 
-        self.quantities = Counter(self._y)
+        self.quantities = class_profile.quantities()
         self.goal_quantity = self._calculate_goal_quantity(self.maj_int_min)
         self.dsc_maj_cls = sorted(((v, i) for v, i in self.quantities.items() if i >= self.goal_quantity),
                                   key=itemgetter(1), reverse=True)
         self.asc_min_cls = sorted(((v, i) for v, i in self.quantities.items() if i < self.goal_quantity),
                                   key=itemgetter(1), reverse=False)
 
-        for class_name, class_quantity in self.dsc_maj_cls:
-            self._X, self._y = self._undersample(self._X, self._y, class_name)
+        with phase('undersample'):
+            for class_name, class_quantity in self.dsc_maj_cls:
+                self._X, self._y = self._undersample(self._X, self._y, class_name)
+
+        with phase('oversample'):
+            for class_name, class_quantity in self.asc_min_cls:
+                self._X, self._y = self._oversample(self._X, self._y, class_name)
+
+        if self.shuffle:
+            self._X, self._y = sklearn.utils.shuffle(self._X, self._y)
+
+        return self._X, np.array(self._y)
+
+    @instrumented
+    def partial_fit_resample(self, X, y):
+        """
+        Incremental version of fit_resample for data arriving in batches. The batch is appended to the history of all
+        examples seen so far and the history is resampled, the result is the same as of fit_resample on the
+        concatenated batches. Instead of querying the neighbours of every example again, the k nearest neighbours of
+        all examples of the history are kept and updated: the old examples are only compared with the examples of the
+        batch and only the examples of the batch are queried against the whole history. Removing examples in the
+        undersampling and adding copies in the oversampling is taken into account by counting the neighbours with
+        their multiplicities, only the examples whose kept neighbours were removed are queried again.
 
-        for class_name, class_quantity in self.asc_min_cls:
-            self._X, self._y = self._oversample(self._X, self._y, class_name)
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers
+        :param y:
+            one dimensional numpy array with labels for rows in X
+        :return:
+            Resampled history X, y as numpy arrays
+        """
+        assert len(X.shape) == 2, 'X should have 2 dimension'
+        assert X.shape[0] == y.shape[0], 'Number of labels must be equal to number of samples'
+
+        if self.dtype is not None:
+            X = as_float(X, self.dtype)
+        with phase('update_neighbours'):
+            self._update_neighbour_graph(X, np.asarray(y))
+        X, y = self._X_history, self._y_history
+
+        class_profile = get_class_profile(y)
+        maj_int_min = class_profile.maj_int_min if self.maj_int_min is None else self.maj_int_min
+        self.quantities = class_profile.quantities()
+        self.goal_quantity = self._calculate_goal_quantity(maj_int_min)
+        self.dsc_maj_cls = sorted(((v, i) for v, i in self.quantities.items() if i >= self.goal_quantity),
+                                  key=itemgetter(1), reverse=True)
+        self.asc_min_cls = sorted(((v, i) for v, i in self.quantities.items() if i < self.goal_quantity),
+                                  key=itemgetter(1), reverse=False)
 
+        weights = np.ones(y.shape[0], dtype=int)
+        neighbours, distances = self._neighbours.copy(), self._distances.copy()
+        copies = []
+        with phase('undersample'):
+            for class_name, class_quantity in self.dsc_maj_cls:
+                indices_in_class = np.flatnonzero((y == class_name) & (weights > 0))
+                safe_levels = self._history_safe_levels(indices_in_class, class_name, weights, neighbours,
+                                                        distances)
+                samples_to_remove_quantity = max(0, int(self.quantities[class_name] - self.goal_quantity))
+                if samples_to_remove_quantity > 0:
+                    remove_indices = indices_in_class[np.argsort(safe_levels, kind='stable')]
+                    weights[remove_indices[:samples_to_remove_quantity]] = 0
+                    self.quantities[class_name] -= samples_to_remove_quantity
+
+        with phase('oversample'):
+            for class_name, class_quantity in self.asc_min_cls:
+                indices_in_class = np.flatnonzero((y == class_name) & (weights > 0))
+                safe_levels = self._history_safe_levels(indices_in_class, class_name, weights, neighbours,
+                                                        distances)
+                safest = indices_in_class[np.argsort(-safe_levels, kind='stable')]
+                class_quantity = self.quantities[class_name]
+                difference = self.goal_quantity - class_quantity
+                while difference > 0:
+                    quantity_items_to_copy = min(difference, class_quantity)
+                    copies.append(safest[:quantity_items_to_copy])
+                    weights[safest[:quantity_items_to_copy]] += 1
+                    difference -= quantity_items_to_copy
+                    self.quantities[class_name] += quantity_items_to_copy
+
+        rows = np.concatenate([np.flatnonzero(weights > 0)] + copies)
+        count('rows_copied', rows.shape[0])
+        self._X, self._y = X[rows], y[rows]
         if self.shuffle:
             self._X, self._y = sklearn.utils.shuffle(self._X, self._y)
 
-        return np.array(self._X), np.array(self._y)
+        return self._X, self._y
+
+    def _update_neighbour_graph(self, X, y):
+        """
+        Appends a batch to the history and updates the k nearest neighbours (indices into the history, -1 if the
+        history is too small) and their distances of all examples of the history.
+        """
+        n_old = 0 if self._X_history is None else self._X_history.shape[0]
+        X_history = X if n_old == 0 else vstack((self._X_history, X))
+        y_history = y if n_old == 0 else np.concatenate((self._y_history, y))
+
+        neighbours = np.full((X_history.shape[0], self.k), -1, dtype=np.intp)
+        distances = np.full((X_history.shape[0], self.k), np.inf)
+        if n_old > 0:
+            batch_clf = fit_neighbors(make_neighbors(self.neighbors, min(self.k, X.shape[0])), X)
+            batch_distances, batch_neighbours = kneighbors_chunked(batch_clf, self._X_history, return_distance=True,
+                                                                   n_jobs=self.n_jobs)
+            neighbours[:n_old], distances[:n_old] = self._merge_neighbours(
+                np.hstack((self._neighbours, batch_neighbours + n_old)),
+                np.hstack((self._distances, batch_distances)))
+
+        neigh_clf = fit_neighbors(make_neighbors(self.neighbors, min(self.k + 1, X_history.shape[0])), X_history)
+        new_neighbours, new_distances = self._query_without_self(neigh_clf, X_history, n_old + np.arange(X.shape[0]))
+        neighbours[n_old:, :new_neighbours.shape[1]] = new_neighbours
+        distances[n_old:, :new_distances.shape[1]] = new_distances
+
+        self._X_history, self._y_history = X_history, y_history
+        self._neighbours, self._distances = neighbours, distances
+
+    def _merge_neighbours(self, neighbours, distances):
+        order = np.argsort(distances, axis=1, kind='stable')[:, :self.k]
+        return np.take_along_axis(neighbours, order, axis=1), np.take_along_axis(distances, order, axis=1)
+
+    def _query_without_self(self, neigh_clf, X, rows):
+        """
+        :return: neighbours of X[rows] found by neigh_clf (fitted on X) without the rows themselves and their distances
+        """
+        distances, neighbours = kneighbors_chunked(neigh_clf, X[rows], return_distance=True, n_jobs=self.n_jobs)
+        is_self = neighbours == rows[:, np.newaxis]
+        is_self[~is_self.any(axis=1), -1] = True
+        shape = (rows.shape[0], neighbours.shape[1] - 1)
+        return neighbours[~is_self].reshape(shape), distances[~is_self].reshape(shape)
+
+    def _history_safe_levels(self, indices_in_class, class_name, weights, neighbours, distances):
+        """
+        Computes safe levels of examples of the history (see _construct_class_safe_levels) from their kept
+        neighbours, which are counted with weights (multiplicities) of the examples. Examples with not enough kept
+        neighbours left are queried again among the examples with positive weights, neighbours and distances are
+        updated for them.
+        """
+        own_weights = weights[indices_in_class] - 1
+        needed = min(self.k, weights.sum() - 1)
+        stale = own_weights + np.where(neighbours[indices_in_class] >= 0,
+                                       weights[neighbours[indices_in_class]], 0).sum(axis=1) < needed
+        if stale.any():
+            present = np.flatnonzero(weights > 0)
+            neigh_clf = fit_neighbors(make_neighbors(self.neighbors, min(self.k + 1, present.shape[0])),
+                                      self._X_history[present])
+            stale_rows = np.searchsorted(present, indices_in_class[stale])
+            stale_neighbours, stale_distances = self._query_without_self(neigh_clf, self._X_history[present],
+                                                                         stale_rows)
+            neighbours[indices_in_class[stale]], distances[indices_in_class[stale]] = -1, np.inf
+            neighbours[indices_in_class[stale], :stale_neighbours.shape[1]] = present[stale_neighbours]
+            distances[indices_in_class[stale], :stale_distances.shape[1]] = stale_distances
+
+        classes = np.array(sorted(self.quantities))
+        class_neighbours = neighbours[indices_in_class]
+        occurrences = np.hstack((own_weights[:, np.newaxis],
+                                 np.where(class_neighbours >= 0, weights[class_neighbours], 0)))
+        labels = np.hstack((np.full((indices_in_class.shape[0], 1), class_name, dtype=self._y_history.dtype),
+                            self._y_history[class_neighbours]))
+        taken = np.clip(self.k - (np.cumsum(occurrences, axis=1) - occurrences), 0, occurrences)
+        neighbours_quantities = np.zeros((indices_in_class.shape[0], classes.shape[0]))
+        np.add.at(neighbours_quantities, (np.arange(indices_in_class.shape[0])[:, np.newaxis],
+                                          np.searchsorted(classes, labels)), taken)
+
+        quantities = np.array([self.quantities[label] for label in classes.tolist()])
+        similarity = class_similarity(quantities)[np.searchsorted(classes, class_name)]
+        safe_levels = neighbours_quantities @ similarity / self.k
+        if np.any(safe_levels > 1):
+            raise ValueError(f'Safe level is bigger than 1: {safe_levels.max()}')
+        return safe_levels
 
     def _construct_class_safe_levels(self, X, y, class_name) -> defaultdict:
-        self.quantities = Counter(y)
-        indices_in_class = [i for i, value in enumerate(y) if value == class_name]
+        """
+        Computes safe levels of all samples of class_name at once: the neighbours of each sample are counted per
+        class and the counts are weighted with the similarity between classes (see _calculate_sample_safe_level).
+        self.quantities must hold the current class sizes of y.
+        """
+        indices_in_class = np.flatnonzero(y == class_name)
+
+        neigh_clf = fit_neighbors(make_neighbors(self.neighbors, self.k + 1), X)
+        neighbour_indices = kneighbors_chunked(neigh_clf, X[indices_in_class], n_jobs=self.n_jobs)[:, 1:]
 
-        neigh_clf = NearestNeighbors(n_neighbors=self.k + 1).fit(X)
-        neighbour_indices = neigh_clf.kneighbors(X[indices_in_class], return_distance=False)[:, 1:]
-        neighbour_classes = y[neighbour_indices]
+        classes = np.array(sorted(self.quantities))
+        quantities = np.array([self.quantities[label] for label in classes.tolist()])
+        neighbour_codes = np.searchsorted(classes, y[neighbour_indices])
+        neighbours_quantities = np.zeros((indices_in_class.shape[0], classes.shape[0]))
+        np.add.at(neighbours_quantities, (np.arange(indices_in_class.shape[0])[:, np.newaxis], neighbour_codes), 1)
+        similarity = class_similarity(quantities)[np.searchsorted(classes, class_name)]
+        safe_levels = neighbours_quantities @ similarity / self.k
 
-        class_safe_levels = defaultdict(float)
-        for i, sample_id in enumerate(indices_in_class):
-            neighbours_quantities = Counter(neighbour_classes[i])
-            class_safe_levels[sample_id] = self._calculate_sample_safe_level(class_name, neighbours_quantities)
+        if np.any(safe_levels > 1):
+            raise ValueError(f'Safe level is bigger than 1: {safe_levels.max()}')
 
-        return class_safe_levels
+        return defaultdict(float, zip(indices_in_class.tolist(), safe_levels.tolist()))
 
     def _calculate_sample_safe_level(self, class_name, neighbours_quantities: Counter):
         safe_level = 0
@@ -113,8 +300,10 @@ class SOUP(BaseSampler):
         samples_to_remove_quantity = max(0, int(class_quantity - self.goal_quantity))
         if samples_to_remove_quantity > 0:
             remove_indices = list(map(itemgetter(0), safe_levels_list[:samples_to_remove_quantity]))
-            X = np.delete(X, remove_indices, axis=0)
+            X = delete_rows(X, remove_indices)
             y = np.delete(y, remove_indices, axis=0)
+            self.quantities[class_name] -= samples_to_remove_quantity
+            count('rows_copied', X.shape[0])
 
         return X, y
 
@@ -127,9 +316,11 @@ class SOUP(BaseSampler):
         while difference > 0:
             quantity_items_to_copy = min(difference, class_quantity)
             indices_to_copy = list(map(itemgetter(0), safe_levels_list[:quantity_items_to_copy]))
-            X = np.vstack((X, X[indices_to_copy]))
+            X = vstack((X, X[indices_to_copy]))
             y = np.hstack((y, y[indices_to_copy]))
+            count('rows_copied', X.shape[0])
             difference -= quantity_items_to_copy
+            self.quantities[class_name] += quantity_items_to_copy
 
         return X, y
 
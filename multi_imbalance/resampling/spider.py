@@ -1,11 +1,12 @@
-from collections import Counter
-
 import numpy as np
 from imblearn.base import BaseSampler
-from sklearn.neighbors import NearestNeighbors
+from scipy import sparse
+from sklearn.utils.sparsefuncs import mean_variance_axis
 
-from multi_imbalance.utils.array_util import (union, setdiff, contains)
-from multi_imbalance.utils.data import construct_maj_int_min
+from multi_imbalance.utils.array_util import as_float
+from multi_imbalance.utils.data import get_class_profile
+from multi_imbalance.utils.neighbors import make_neighbors, kneighbors_chunked, fit_neighbors
+from multi_imbalance.utils.profiling import instrumented, phase, count
 
 
 class SPIDER3(BaseSampler):
@@ -18,7 +19,7 @@ class SPIDER3(BaseSampler):
     on Computer Recognition Systems CORES 2017
     """
 
-    def __init__(self, k, maj_int_min=None, cost=None):
+    def __init__(self, k, maj_int_min=None, cost=None, neighbors=None, dtype=None, class_profile=None):
         """
         :param k:
             Number of nearest neighbors considered while resampling.
@@ -27,58 +28,95 @@ class SPIDER3(BaseSampler):
         :param cost:
             The cost matrix. An element c[i, j] of this matrix represents the cost associated with
             misclassifying an example from class i as class one from class j.
+        :param neighbors:
+            nearest neighbours search backend, see multi_imbalance.utils.neighbors.make_neighbors
+        :param dtype:
+            floating point type used for computations and of the resampled X, e.g. np.float32 to halve the memory
+            usage. If None, float32 and float64 X is preserved and other types are converted to float64
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y, if None it is computed in fit_resample
         """
 
         super().__init__()
         self._sampling_type = 'clean-sampling'
         self.k = k
-        self.neigh_clf = NearestNeighbors(n_neighbors=self.k)
+        self.neighbors = neighbors
+        self.dtype = dtype
+        self.neigh_clf = make_neighbors(neighbors, self.k)
         self.maj_int_min = maj_int_min
         self.cost = cost
-        self.AS, self.RS = np.array([]), np.array([])
+        self.class_profile = class_profile
+        self.AS, self.RS = np.array([], dtype=int), np.array([], dtype=int)
 
+    @instrumented
     def _fit_resample(self, X, y):
         """
-        Performs resampling
+        Performs resampling. DS and RS sets are kept as arrays of row indices into a working copy of X, so that
+        examples and labels are never packed into a single matrix and sparse X stays sparse. AS is kept as a vector
+        of multiplicities of the rows, so that copies of amplified examples are never materialised before the end.
 
         :param X:
-            Numpy array of examples that is the subject of resampling.
+            Numpy array or scipy sparse matrix of examples that is the subject of resampling.
         :param y:
             Numpy array of labels corresponding to examples from X.
         :return:
             Resampled X along with accordingly modified labels, resampled y
         """
-        self._initialize_algorithm(X, y)
+        class_profile = get_class_profile(y, self.class_profile)
+        self._initialize_algorithm(X, y, class_profile)
 
-        self.DS = np.append(X, y.reshape(y.shape[0], 1), axis=1)
+        self.DS = np.arange(X.shape[0])
+        self.AS, self.RS = np.zeros(X.shape[0], dtype=int), np.array([], dtype=int)
         self._restart_perspective()
-        self._calculate_weak_majority_examples()
+        with phase('weak_majority'):
+            self._calculate_weak_majority_examples()
         self._restore_perspective()
-        self.DS = setdiff(self.DS, self.RS)
-        int_classes, min_classes = self._sort_by_cardinality(y)
+        self.DS = self.DS[~np.isin(self.DS, self.RS)]
+        int_classes, min_classes = self._sort_by_cardinality(y, class_profile)
 
         for int_min_class in int_classes + min_classes:
             self.relabel(int_min_class)
             self.clean(int_min_class)
             self.amplify(int_min_class)
 
-        self.DS = union(self.DS, self.AS)
+        self.DS = np.concatenate((self.DS, np.repeat(np.arange(self.AS.shape[0]), self.AS)))
+        count('rows_copied', self.DS.shape[0])
 
-        return self.DS[:, :-1], self.DS[:, -1]
+        return self._X_original[self.DS], self._y[self.DS]
 
-    def _initialize_algorithm(self, X, y):
+    def _initialize_algorithm(self, X, y, class_profile=None):
+        class_profile = get_class_profile(y, class_profile)
         if self.maj_int_min is None:
-            self.maj_int_min = construct_maj_int_min(y)
+            self.maj_int_min = class_profile.maj_int_min
         self.majority_classes = self.maj_int_min['maj']
         self.intermediate_classes = self.maj_int_min['int']
         self.minority_classes = self.maj_int_min['min']
+        self._cache_class_order()
+
+        if sparse.issparse(X):
+            self._X_original = as_float(X.tocsr(), self.dtype)
+        else:
+            self._X_original = as_float(X, self.dtype)
+        self._X = self._X_original.copy()
+        self._y = np.array(y)
+        count('rows_copied', X.shape[0])
 
-        self.stds, self.means = [1] * X.shape[1], [0] * X.shape[1]
+        self.stds, self.means = np.ones(X.shape[1]), np.zeros(X.shape[1])
         if self.cost is None:
-            self.cost = self._estimate_cost_matrix(y)
+            self.cost = self._estimate_cost_matrix(y, class_profile)
+        self.cost = np.asarray(self.cost, dtype=float)
+
+    def _cache_class_order(self):
+        """
+        Caches the order of classes used to index the cost matrix (minority, intermediate and majority classes) and
+        a sorted copy of it to encode labels with np.searchsorted.
+        """
+        self._classes = np.array(self.minority_classes + self.intermediate_classes + self.majority_classes)
+        self._sorted_class_positions = np.argsort(self._classes, kind='stable')
+        self._sorted_classes = self._classes[self._sorted_class_positions]
 
     @staticmethod
-    def _estimate_cost_matrix(y):
+    def _estimate_cost_matrix(y, class_profile=None):
         """
         Method that estimates cost matrix automatically. For example given imbalance ratios of 1:2:6, the estimated
         matrix will be:
@@ -87,23 +125,19 @@ class SPIDER3(BaseSampler):
         6 3 0]
         :param y:
             labels
+        :param class_profile:
+            ClassProfile of y, computed if None
         :return:
-            cost matrix
-        """
-        class_cardinality = Counter(y)
-        classes = list(class_cardinality.keys())
-        cost = np.ones([len(classes), len(classes)])
-        for i, (c1, card1) in enumerate(class_cardinality.items()):
-            for j, (c2, card2) in enumerate(class_cardinality.items()):
-                if j > i:
-                    cost[i, j] = 1
-                else:
-                    cost[i, j] = card1 / card2
+            cost matrix, classes are in the order of their first occurrence in y
+        """
+        class_profile = get_class_profile(y, class_profile)
+        cardinality = class_profile.counts[class_profile.order]
+        cost = np.where(np.tri(cardinality.shape[0], dtype=bool), cardinality[:, np.newaxis] / cardinality, 1.)
         np.fill_diagonal(cost, 0)
         return cost
 
-    def _sort_by_cardinality(self, y):
-        class_cardinality = Counter(y)
+    def _sort_by_cardinality(self, y, class_profile=None):
+        class_cardinality = get_class_profile(y, class_profile).quantities()
         # to ensure looping over classes with decreasing cardinality.
         int_classes = sorted(self.intermediate_classes, key=lambda clazz: -class_cardinality[clazz])
         min_classes = sorted(self.minority_classes, key=lambda clazz: -class_cardinality[clazz])
@@ -111,57 +145,57 @@ class SPIDER3(BaseSampler):
 
     def amplify(self, int_min_class):
         self._restart_perspective()
-        int_min_ds = self.DS[self.DS[:, -1] == int_min_class]
-        for x in int_min_ds:
-            self._amplify_nn(x)
+        int_min_ds = self.DS[self._y[self.DS] == int_min_class]
+        union, weights = self._ds_as_rs_union()
+        nn = fit_neighbors(make_neighbors(self.neighbors, min(self.k + 1, union.shape[0])), self._X[union])
+        with phase('amplify'):
+            for x in int_min_ds:
+                self._amplify_nn(x, union, weights, nn)
         self._restore_perspective()
 
     def clean(self, int_min_class):
         self._restart_perspective()
-        int_min_ds = self.DS[self.DS[:, -1] == int_min_class]
+        int_min_ds = self.DS[self._y[self.DS] == int_min_class]
         int_min_as = self._calc_int_min_as(int_min_class)
-        for x in union(int_min_ds, int_min_as):
-            self._clean_nn(x)
+        with phase('clean'):
+            for x in np.concatenate((int_min_ds, int_min_as)):
+                self._clean_nn(x)
         self._restore_perspective()
 
     def relabel(self, int_min_class):
         self._restart_perspective()
-        int_min_ds = self.DS[self.DS[:, -1] == int_min_class]
-        for x in int_min_ds:
-            self._relabel_nn(x)
+        int_min_ds = self.DS[self._y[self.DS] == int_min_class]
+        with phase('relabel'):
+            for x in int_min_ds:
+                self._relabel_nn(x)
         self._restore_perspective()
 
     def _restart_perspective(self):
         """
-        Performs normalization over resampled dataset.
+        Normalizes the working copy self._X with the weighted mean and std of the union of DS, AS and RS. The working
+        copy is always recomputed from the original X, so no rounding errors accumulate between the phases. Sparse
+        data is only scaled, as centering would make it dense and does not change the distances between examples.
         """
-        for col in range(self._ds_as_rs_union().shape[1] - 1):
-            self.stds[col] = self._ds_as_rs_union()[:, col].std()
-            self.means[col] = self._ds_as_rs_union()[:, col].mean()
-
-        for col in range(self._ds_as_rs_union().shape[1] - 1):
-            if self.stds[col] == 0:
-                self.stds[col] = 1e-6
-
-        for dataset in [self.DS, self.RS, self.AS]:
-            if dataset.shape[0] > 0:
-                self._normalize(dataset)
+        union, weights = self._ds_as_rs_union()
+        row_weights = np.zeros(self._X_original.shape[0], dtype=self._X_original.dtype)
+        row_weights[union] = weights
+        if sparse.issparse(self._X_original):
+            self.means, variances = mean_variance_axis(self._X_original, axis=0, weights=row_weights)
+            self.stds = np.sqrt(variances)
+            self.stds[self.stds == 0] = 1e-6
+            self._X.data = self._X_original.data * (1 / (4 * self.stds)).astype(self._X.dtype)[self._X.indices]
+        else:
+            self.means = row_weights @ self._X_original / row_weights.sum()
+            np.subtract(self._X_original, self.means, out=self._X)
+            self.stds = np.sqrt(np.einsum('i,ij,ij->j', row_weights, self._X, self._X) / row_weights.sum())
+            self.stds[self.stds == 0] = 1e-6
+            self._X /= 4 * self.stds
 
     def _restore_perspective(self):
         """
-        Denormalizes for further processing.
+        Nothing to restore, the original X is never modified and the working copy is normalized again by the next
+        phase.
         """
-        for dataset in [self.DS, self.RS, self.AS]:
-            if dataset.shape[0] > 0:
-                self._denormalize(dataset)
-
-    def _normalize(self, dataset):
-        for col in range(dataset.shape[1] - 1):
-            dataset[:, col] = (dataset[:, col] - self.means[col]) / (4 * self.stds[col])
-
-    def _denormalize(self, dataset):
-        for col in range(dataset.shape[1] - 1):
-            dataset[:, col] = dataset[:, col] * self.stds[col] * 4 + self.means[col]
 
     def _calc_int_min_as(self, int_min_class):
         """
@@ -169,14 +203,10 @@ class SPIDER3(BaseSampler):
         :param int_min_class:
             The class name (intermediate or minority).
         :return:
-            Examples from AS that are belong to int_min_class.
+            Indices of examples from AS that are belong to int_min_class, repeated according to their multiplicity.
         """
-
-        if self.AS.size != 0:
-            int_min_as = self.AS[self.AS[:, -1] == int_min_class]
-        else:
-            int_min_as = np.array([])
-        return int_min_as
+        in_class = np.flatnonzero((self.AS > 0) & (self._y == int_min_class))
+        return np.repeat(in_class, self.AS[in_class])
 
     def _calculate_weak_majority_examples(self):
         """
@@ -184,10 +214,11 @@ class SPIDER3(BaseSampler):
         """
 
         for majority_class in self.majority_classes:
-            majority_examples = self.DS[self.DS[:, -1] == majority_class]
-            for x in majority_examples:
-                if majority_class not in self._min_cost_classes(x, self.DS):
-                    self.RS = union(self.RS, np.array([x]))
+            majority_examples = self.DS[self._y[self.DS] == majority_class]
+            if majority_examples.shape[0] == 0:
+                continue
+            min_cost = self._min_cost_classes_batch(majority_examples, self.DS)
+            self.RS = np.append(self.RS, majority_examples[~min_cost[:, self._class_positions(majority_class)]])
 
     def _min_cost_classes(self, x, DS):
         """
@@ -195,107 +226,318 @@ class SPIDER3(BaseSampler):
         to the minimum cost after being (mis)classified as classes appearing in the neighborhood of x.
 
         :param x:
-            Single observation
+            Index of a single observation
         :param DS:
-            DS
+            Indices of examples forming DS
         :return:
             List of classes associated with minimal cost of misclassification.
         """
+        union, weights = np.unique(DS, return_counts=True)
+        neighbors, neighbor_weights, _ = self._weighted_knn([x], union, weights)[0]
+        return self._classes[self._min_cost_mask([self._y[neighbors]], [neighbor_weights])[0]]
 
-        C = self.minority_classes + self.intermediate_classes + self.majority_classes
-        vals = []
-        kneighbors = self._knn(x, DS)
+    def _min_cost_classes_batch(self, xs, DS):
+        """
+        Identifies minimum-cost classes of many examples with a single nearest neighbours index over DS.
 
-        for cj in C:
-            s = 0
-            for ci in C:
-                s += ((kneighbors[:, -1] == ci).astype(int).sum() / self.k) * self.cost[C.index(ci), C.index(cj)]
-            vals.append(s)
-        C = np.array(C)
-        vals = np.array(vals)
-        vals = np.round(vals, 6)
-        return C[vals == vals[np.argmin(vals)]]
+        :param xs:
+            Indices of observations
+        :param DS:
+            Indices of examples forming DS
+        :return:
+            Boolean array (number of observations x number of classes), True for the minimum-cost classes of each
+            observation, classes are in the order of the cost matrix (self._classes).
+        """
+        union, weights = np.unique(DS, return_counts=True)
+        neighborhoods = self._weighted_knn(xs, union, weights)
+        return self._min_cost_mask([self._y[neighbors] for neighbors, _, _ in neighborhoods],
+                                   [neighbor_weights for _, neighbor_weights, _ in neighborhoods])
+
+    def _min_cost_mask(self, neighbour_labels, neighbour_weights=None):
+        """
+        Computes the costs of all classes as the neighbour label histogram (divided by k) times the cost matrix.
+
+        :param neighbour_labels:
+            List of arrays with labels of the neighbours of each observation.
+        :param neighbour_weights:
+            List of arrays with multiplicities of the neighbours, if None every neighbour is counted once.
+        :return:
+            Boolean array (number of observations x number of classes), True for the minimum-cost classes.
+        """
+        n_classes = self._classes.shape[0]
+        lengths = np.array([labels.shape[0] for labels in neighbour_labels])
+        labels = np.concatenate(neighbour_labels) if lengths.sum() > 0 else np.array([], dtype=self._classes.dtype)
+        weights = None if neighbour_weights is None or lengths.sum() == 0 else np.concatenate(neighbour_weights)
+        rows = np.repeat(np.arange(lengths.shape[0]), lengths)
+        positions = self._class_positions(labels)
+        known = positions >= 0
+        histogram = np.bincount(rows[known] * n_classes + positions[known],
+                                weights=None if weights is None else weights[known],
+                                minlength=lengths.shape[0] * n_classes).reshape(lengths.shape[0], n_classes)
+        return self._min_cost_mask_of_histograms(histogram)
+
+    def _min_cost_mask_of_histograms(self, histogram):
+        """
+        :param histogram:
+            Array (number of observations x number of classes) with the numbers of neighbours of every class.
+        :return:
+            Boolean array of the same shape, True for the minimum-cost classes.
+        """
+        vals = np.round(histogram / self.k @ self.cost, 6)
+        return vals == vals.min(axis=1, keepdims=True)
+
+    def _class_positions(self, labels):
+        """
+        :return: Positions of labels in self._classes, -1 for labels of unknown classes.
+        """
+        labels = np.asarray(labels)
+        found = np.minimum(np.searchsorted(self._sorted_classes, labels), self._sorted_classes.shape[0] - 1)
+        return np.where(self._sorted_classes[found] == labels, self._sorted_class_positions[found], -1)
 
     def _relabel_nn(self, x):
         """
-        Performs relabeling in the nearest neighborhood of x.
+        Performs relabeling in the nearest neighborhood of x. The minimum-cost classes of x are computed from the
+        labels of its nearest neighbours and recomputed only after a neighbour is relabeled.
 
         :param x:
-            An observation.
+            Index of an observation.
         """
-        nearest_neighbors = self._knn(x, self._ds_as_rs_union())
+        nearest_neighbors, min_cost_classes = self._neighborhood(x)
         for neighbor in nearest_neighbors:
-            if contains(self.RS, neighbor) and self._class_of(neighbor) in self.majority_classes and self._class_of(
-                    neighbor) in self._min_cost_classes(x, self._ds_as_rs_union()):
-                self.RS = setdiff(self.RS, np.array([neighbor]))
-                neighbor[-1] = x[-1]
-                self.AS = union(self.AS, np.array([neighbor]))
+            if neighbor in self.RS and self._class_of(neighbor) in self.majority_classes and self._class_of(
+                    neighbor) in min_cost_classes:
+                self.RS = self.RS[self.RS != neighbor]
+                self._y[neighbor] = self._y[x]
+                self.AS[neighbor] += 1
+                _, min_cost_classes = self._neighborhood(x)
 
     def _clean_nn(self, x):
         """
-        Performs cleaning in the nearest neighborhood of x.
+        Performs cleaning in the nearest neighborhood of x. The minimum-cost classes of x are computed from the
+        labels of its nearest neighbours and recomputed only after a neighbour is removed.
 
         :param x:
-            Single observation.
+            Index of a single observation.
         """
-        nearest_neighbors = self._knn(x, self._ds_as_rs_union())
+        nearest_neighbors, min_cost_classes = self._neighborhood(x)
         for neighbor in nearest_neighbors:
             if self._class_of(neighbor) in self.majority_classes and \
-                    self._class_of(neighbor) in self._min_cost_classes(x, self._ds_as_rs_union()):
-                self.DS = setdiff(self.DS, np.array([neighbor]))
-                self.RS = setdiff(self.RS, np.array([neighbor]))
+                    self._class_of(neighbor) in min_cost_classes:
+                self.DS = self.DS[self.DS != neighbor]
+                self.RS = self.RS[self.RS != neighbor]
+                _, min_cost_classes = self._neighborhood(x)
+
+    def _neighborhood(self, x):
+        """
+        :param x:
+            Index of an observation.
+        :return:
+            Distinct nearest neighbors of x in the union of DS, AS and RS and the minimum-cost classes of x.
+        """
+        union, weights = self._ds_as_rs_union()
+        neighbors, neighbor_weights, _ = self._weighted_knn([x], union, weights)[0]
+        return neighbors, self._classes[self._min_cost_mask([self._y[neighbors]], [neighbor_weights])[0]]
 
     def _knn(self, x, DS):
         """
-        Returns k nearest neighbors of x in DS that belong to c class if specified.
+        Returns k nearest neighbors of x in DS.
 
         :param x:
-            Single observation
+            Index of a single observation
         :param DS:
-            DS
-        :param c:
-            Class of neighbors that should be returned.
+            Indices of examples forming DS, one occurrence of x is excluded from the search
         :return:
-            These neighbors from k nearest that belong to class c if specified. Otherwise all of them.
+            Indices of k nearest neighbors.
+            Examples tied with the k-th neighbour are included if the backend supports radius_neighbors.
         """
 
-        DS = setdiff(DS, np.array([x]))
-        if DS.shape[0] < self.k:
-            self.neigh_clf = NearestNeighbors(n_neighbors=DS.shape[0])
-        else:
-            self.neigh_clf = NearestNeighbors(n_neighbors=self.k)
-
-        self.neigh_clf.fit(DS[:, :-1])
-
-        within_radius = self.neigh_clf.radius_neighbors([x[:-1]], radius=
-        self.neigh_clf.kneighbors([x[:-1]], return_distance=True)[0][0][-1] + 0.0001 *
-        self.neigh_clf.kneighbors([x[:-1]], return_distance=True)[0][0][-1], return_distance=True)
+        union, weights = np.unique(DS, return_counts=True)
+        neighbors, neighbor_weights, _ = self._weighted_knn([x], union, weights)[0]
+        return np.repeat(neighbors, neighbor_weights)
 
-        unique_distances = np.unique(sorted(within_radius[0][0]))
-        all_distances = within_radius[0][0]
-        all_indices = within_radius[1][0]
-        indices = []
-        for dist in unique_distances:
-            if len(indices) < self.k:
-                indices += (all_indices[all_distances == dist]).tolist()
+    def _knn_batch(self, xs, DS):
+        """
+        Returns k nearest neighbors of each of xs in DS, the same as _knn but with a single index built over DS.
 
-        return DS[indices]
+        :param xs:
+            Indices of observations
+        :param DS:
+            Indices of examples forming DS, one occurrence of each x is excluded from its neighbours
+        :return:
+            List of arrays with indices of the nearest neighbors of each observation.
+        """
+        union, weights = np.unique(DS, return_counts=True)
+        return [np.repeat(neighbors, neighbor_weights)
+                for neighbors, neighbor_weights, _ in self._weighted_knn(xs, union, weights)]
 
-    def _amplify_nn(self, x):
+    def _weighted_knn(self, xs, union, weights, nn=None):
+        """
+        Finds k nearest neighbors of each of xs in a multiset of examples, given as distinct indices with their
+        multiplicities. A single index is built over the distinct examples. One occurrence of each x is excluded
+        from its neighbours. Examples tied with the k-th neighbour are included if the backend supports
+        radius_neighbors.
+
+        :param xs:
+            Indices of observations
+        :param union:
+            Sorted distinct indices of examples
+        :param weights:
+            Multiplicities of the examples
+        :param nn:
+            Nearest neighbours estimator fitted on self._X[union] with at least k + 1 neighbours, fitted if None
+        :return:
+            List of (neighbors, multiplicities, distances) tuples of each observation, neighbors are distinct and
+            ordered by distance.
+        """
+        if nn is None:
+            nn = fit_neighbors(make_neighbors(self.neighbors, min(self.k + 1, union.shape[0])), self._X[union])
+        xs = np.asarray(xs)
+        distances, indices = kneighbors_chunked(nn, self._X[xs], n_neighbors=min(self.k + 1, union.shape[0]),
+                                                return_distance=True)
+        positions = np.minimum(np.searchsorted(union, xs), union.shape[0] - 1)
+        own_positions = np.where(union[positions] == xs, positions, -1)
+
+        result = []
+        for i, x in enumerate(xs):
+            own = own_positions[i]
+            total = weights.sum() - (own >= 0)
+            k = min(self.k, total)
+            if not hasattr(nn, 'radius_neighbors'):
+                neighbor_weights = weights[indices[i]] - (indices[i] == own)
+                neighbor_weights = np.minimum(neighbor_weights, np.maximum(k - np.cumsum(neighbor_weights) +
+                                                                           neighbor_weights, 0))
+                taken = neighbor_weights > 0
+                result.append((union[indices[i][taken]], neighbor_weights[taken], distances[i][taken]))
+                continue
+
+            neighbor_weights = weights[indices[i]] - (indices[i] == own)
+            kth_distance = distances[i][np.searchsorted(np.cumsum(neighbor_weights), k)]
+            within_distances, within_indices = nn.radius_neighbors(self._X[[x]], radius=kth_distance + 0.0001 *
+                                                                   kth_distance, return_distance=True)
+            within_distances, within_indices = within_distances[0], within_indices[0]
+            within_weights = weights[within_indices] - (within_indices == own)
+            order = np.argsort(within_distances, kind='stable')
+            within_distances, within_indices, within_weights = \
+                within_distances[order], within_indices[order], within_weights[order]
+
+            unique_distances, group_starts = np.unique(within_distances, return_index=True)
+            taken_before = np.concatenate(([0], np.cumsum(within_weights)))[group_starts]
+            n_taken = np.searchsorted(within_distances, unique_distances[taken_before < self.k][-1], side='right') \
+                if (taken_before < self.k).any() else 0
+            taken = within_weights[:n_taken] > 0
+            result.append((union[within_indices[:n_taken][taken]], within_weights[:n_taken][taken],
+                           within_distances[:n_taken][taken]))
+        return result
+
+    def _amplify_nn(self, x, union=None, weights=None, nn=None):
         """
-        Artificially amplifies example x by adding a copy of it to the AS.
+        Artificially amplifies example x by adding copies of it to the AS, as many as needed for the class of x to
+        become one of its minimum-cost classes. The number of copies is computed at once from the neighbourhood of x.
 
         :param x:
-            Single observation.
+            Index of a single observation.
+        :param union:
+            Distinct indices of examples of the union of DS, AS and RS, computed if None.
+        :param weights:
+            Multiplicities of the examples of union, updated with the added copies.
+        :param nn:
+            Nearest neighbours estimator fitted on the examples of union, see _weighted_knn.
         """
+        if union is None:
+            union, weights = self._ds_as_rs_union()
+        if nn is None:
+            nn = fit_neighbors(make_neighbors(self.neighbors, min(self.k + 1, union.shape[0])), self._X[union])
+        neighbors, neighbor_weights, distances = self._weighted_knn([x], union, weights, nn)[0]
+        copies = self._count_copies(x, neighbors, neighbor_weights, distances, hasattr(nn, 'radius_neighbors'))
+        self.AS[x] += copies
+        weights[np.searchsorted(union, x)] += copies
+
+    def _count_copies(self, x, neighbors, neighbor_weights, distances, ties_included):
+        """
+        Computes the number of copies of x after which the class of x is one of its minimum-cost classes. Copies of x
+        are its nearest neighbours (at distance 0), so with c copies the neighbourhood of x consists of the copies
+        and of the nearest neighbours without copies needed to collect k neighbours. The neighbour label histogram
+        is therefore a function of c, which is evaluated for all c smaller than k at once. For larger c only examples
+        at distance 0 remain, the costs of classes are linear in c and the smallest c is found by binary search.
 
-        while self._class_of(x) not in self._min_cost_classes(x, self._ds_as_rs_union()):
-            y = x.copy()
-            self.AS = union(self.AS, np.asarray([y]))
-
-    @staticmethod
-    def _class_of(example):
-        return example[-1]
+        :param x:
+            Index of a single observation.
+        :param neighbors:
+            Distinct nearest neighbours of x without copies, ordered by distance.
+        :param neighbor_weights:
+            Multiplicities of the neighbours.
+        :param distances:
+            Distances of the neighbours.
+        :param ties_included:
+            Flag, True if examples tied with the k-th neighbour are included (see _weighted_knn).
+        :return:
+            Number of copies.
+        """
+        n_classes = self._classes.shape[0]
+        own_class = self._class_positions(self._y[x])
+        positions = self._class_positions(self._y[neighbors])
+        neighbour_histograms = np.zeros((neighbors.shape[0] + 1, n_classes))
+        known = np.flatnonzero(positions >= 0)
+        neighbour_histograms[known + 1, positions[known]] = neighbor_weights[known]
+        prefix_histograms = np.cumsum(neighbour_histograms, axis=0)
+        prefix_weights = np.concatenate(([0], np.cumsum(neighbor_weights)))
+
+        def others_histograms(copies):
+            if ties_included:
+                group_starts = np.flatnonzero(np.concatenate(([True], distances[1:] != distances[:-1])))
+                group_ends = np.append(group_starts[1:], distances.shape[0])
+                included = (distances[group_starts] == 0) | \
+                    (prefix_weights[group_starts] + copies[:, np.newaxis] < self.k)
+                n_groups = included.sum(axis=1)
+                n_taken = np.where(n_groups > 0, np.append(0, group_ends)[n_groups], 0)
+                return prefix_histograms[n_taken]
+            capacity = np.clip(self.k - copies, 0, prefix_weights[-1])
+            n_full = np.searchsorted(prefix_weights, capacity, side='right') - 1
+            result = prefix_histograms[n_full]
+            partial = np.flatnonzero(n_full < neighbors.shape[0])
+            partial_positions = positions[n_full[partial]]
+            partial = partial[partial_positions >= 0]
+            result[partial, positions[n_full[partial]]] += capacity[partial] - prefix_weights[n_full[partial]]
+            return result
+
+        def satisfied(copies):
+            histograms = others_histograms(copies)
+            histograms[:, own_class] += copies
+            return self._min_cost_mask_of_histograms(histograms)[:, own_class]
+
+        transient = np.arange(self.k)
+        found = satisfied(transient)
+        if found.any():
+            return int(np.argmax(found))
+
+        base_costs = others_histograms(np.array([self.k]))[0] / self.k @ self.cost
+        cost_per_copy = self.cost[own_class] / self.k
+        gain = cost_per_copy - cost_per_copy[own_class]
+        deficit = base_costs[own_class] - base_costs
+        if np.any((deficit > 0) & (gain <= 0)):
+            raise ValueError(f'Example {x} cannot be amplified with the given cost matrix')
+        estimate = np.max(np.ceil(deficit[gain > 0] / gain[gain > 0]), initial=self.k)
+
+        low, high = self.k, int(estimate) + 1
+        while not satisfied(np.array([high]))[0]:
+            low, high = high + 1, 2 * high
+        while low < high:
+            middle = (low + high) // 2
+            if satisfied(np.array([middle]))[0]:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def _class_of(self, example):
+        return self._y[example]
 
     def _ds_as_rs_union(self):
-        return union(self.DS, union(self.AS, self.RS))
+        """
+        :return:
+            Sorted distinct indices of examples of the union of DS, AS and RS and their multiplicities.
+        """
+        weights = self.AS + np.bincount(self.DS, minlength=self.AS.shape[0]) + \
+            np.bincount(self.RS, minlength=self.AS.shape[0])
+        union = np.flatnonzero(weights)
+        return union, weights[union]
@@ -1,9 +1,10 @@
-from collections import Counter
-
 import numpy as np
 from imblearn.over_sampling import SMOTE
 from imblearn.base import BaseSampler
 
+from multi_imbalance.utils.array_util import as_float
+from multi_imbalance.utils.data import get_class_profile
+
 
 class StaticSMOTE(BaseSampler):
     """
@@ -14,9 +15,18 @@ class StaticSMOTE(BaseSampler):
     procedure based on sensitivity for multi-class problems. Pattern Recognit. 44, 1821–1833
     (2011)
     """
-    def __init__(self):
+    def __init__(self, dtype=None, class_profile=None):
+        """
+        :param dtype:
+            floating point type used for computations and of the resampled X, e.g. np.float32 to halve the memory
+            usage. If None, float32 and float64 X is preserved and other types are converted to float64
+        :param class_profile:
+            multi_imbalance.utils.data.ClassProfile of y, if None it is computed in fit_resample
+        """
         super().__init__()
         self._sampling_type = 'over-sampling'
+        self.dtype = dtype
+        self.class_profile = class_profile
 
     def _fit_resample(self, X, y):
         """
@@ -29,7 +39,8 @@ class StaticSMOTE(BaseSampler):
         :return:
             Resampled X and y as numpy arrays
         """
-        cnt = Counter(y)
+        X = as_float(X, self.dtype)
+        cnt = get_class_profile(y, self.class_profile).quantities()
         min_class = min(cnt, key=cnt.get)
         X_original, y_original = X.copy(), y.copy()
         X_resampled, y_resampled = X.copy(), y.copy()
@@ -41,7 +52,7 @@ class StaticSMOTE(BaseSampler):
             X_added_examples = X_smote[y_smote == min_class][cnt[min_class]:, :]
             X_resampled = np.vstack([X_resampled, X_added_examples])
             y_resampled = np.hstack([y_resampled, y_smote[y_smote == min_class][cnt[min_class]:]])
-            cnt = Counter(y_resampled)
+            cnt[min_class] += X_added_examples.shape[0]
             min_class = min(cnt, key=cnt.get)
 
         return X_resampled, y_resampled
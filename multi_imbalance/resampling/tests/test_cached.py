@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+from imblearn.pipeline import Pipeline
+from scipy.sparse import csr_matrix
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.tree import DecisionTreeClassifier
+
+import multi_imbalance.resampling.cached as cached
+from multi_imbalance.resampling.cached import CachedSampler, clear_memory_cache
+from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.utils.profiling import instrument
+
+np.random.seed(0)
+X = np.vstack([np.random.normal(0, 1, (40, 2)), np.random.normal(1, 1, (15, 2)), np.random.normal(2, 1, (8, 2))])
+y = np.array([0] * 40 + [1] * 15 + [2] * 8)
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_cache():
+    clear_memory_cache()
+    yield
+    clear_memory_cache()
+
+
+def resample_counters(resample):
+    with instrument() as profiler:
+        result = resample()
+    return result, profiler.counters['resample_cache_hits'], profiler.counters['resample_cache_misses']
+
+
+@pytest.mark.parametrize("memory", [None, 'tmp_dir'])
+def test_cached_result_equals_resampled(memory, tmp_path):
+    memory = str(tmp_path) if memory == 'tmp_dir' else memory
+    expected_X, expected_y = SOUP(k=3).fit_resample(X, y)
+
+    (first_X, first_y), hits, misses = resample_counters(lambda: CachedSampler(SOUP(k=3), memory).fit_resample(X, y))
+    assert (hits, misses) == (0, 1)
+    (second_X, second_y), hits, misses = resample_counters(lambda: CachedSampler(SOUP(k=3), memory).fit_resample(X, y))
+    assert (hits, misses) == (1, 0)
+
+    for resampled_X, resampled_y in ((first_X, first_y), (second_X, second_y)):
+        assert (resampled_X == expected_X).all()
+        assert (resampled_y == expected_y).all()
+
+
+def test_key_depends_on_parameters_and_data():
+    CachedSampler(SOUP(k=3)).fit_resample(X, y)
+
+    _, hits, misses = resample_counters(lambda: CachedSampler(SOUP(k=5)).fit_resample(X, y))
+    assert (hits, misses) == (0, 1)
+    _, hits, misses = resample_counters(lambda: CachedSampler(SOUP(k=3)).fit_resample(X[1:], y[1:]))
+    assert (hits, misses) == (0, 1)
+    _, hits, misses = resample_counters(lambda: CachedSampler(SOUP(k=3)).fit_resample(csr_matrix(X), y))
+    assert (hits, misses) == (0, 1)
+
+
+def result_size():
+    resampled_X, resampled_y = SOUP(k=3).fit_resample(X, y)
+    return (resampled_X.nbytes + resampled_y.nbytes) / 2 ** 20
+
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    sampler = CachedSampler(SOUP(k=3), str(tmp_path), max_size=result_size() * 2.5)
+    cache_dir = CachedSampler._cache_dir(str(tmp_path))
+    sampler.fit_resample(X[2:], y[2:])
+    sampler.fit_resample(X, y)
+    sampler.fit_resample(X[2:], y[2:])
+    sampler.fit_resample(X[1:], y[1:])
+
+    assert len(os.listdir(cache_dir)) == 2
+    _, hits, _ = resample_counters(lambda: sampler.fit_resample(X[2:], y[2:]))
+    assert hits == 1
+
+
+def test_memory_cache_is_bounded():
+    sampler = CachedSampler(SOUP(k=3), max_size=result_size() * 2.5)
+    for start in (2, 0, 2, 1):
+        sampler.fit_resample(X[start:], y[start:])
+
+    _, hits, _ = resample_counters(lambda: sampler.fit_resample(X[2:], y[2:]))
+    assert hits == 1
+    _, hits, _ = resample_counters(lambda: sampler.fit_resample(X, y))
+    assert hits == 0
+
+
+def test_memory_cache_is_bounded_by_default(monkeypatch):
+    monkeypatch.setattr(cached, 'DEFAULT_MEMORY_CACHE_SIZE', result_size() * 1.5)
+    sampler = CachedSampler(SOUP(k=3))
+    sampler.fit_resample(X, y)
+    sampler.fit_resample(X[1:], y[1:])
+
+    _, hits, _ = resample_counters(lambda: sampler.fit_resample(X, y))
+    assert hits == 0
+
+
+@pytest.mark.parametrize("pipeline_memory", [False, True])
+def test_pipeline_model_selection_resamples_each_fold_once(pipeline_memory, tmp_path):
+    pipeline = Pipeline([('soup', CachedSampler(SOUP(k=3), str(tmp_path / 'samples'))),
+                         ('tree', DecisionTreeClassifier())], memory=str(tmp_path) if pipeline_memory else None)
+    search = GridSearchCV(pipeline, {'tree__max_depth': [1, 2, 3]}, cv=StratifiedKFold(3))
+
+    _, hits, misses = resample_counters(lambda: search.fit(X, y))
+    assert misses == 3 + 1
+    assert hits == (0 if pipeline_memory else 3 * 2)
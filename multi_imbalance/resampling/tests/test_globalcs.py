@@ -2,6 +2,7 @@ from collections import Counter
 
 import numpy as np
 import pytest
+from scipy.sparse import csr_matrix
 
 from multi_imbalance.resampling.global_cs import GlobalCS
 
@@ -85,3 +86,59 @@ def test_output_equal_replication(X, y, global_cs_mock):
         max_quantity = max(duplicates_quantities)
 
         assert max_quantity - min_quantity <= 1
+
+
+@pytest.mark.parametrize("X, y", complete_test_data)
+def test_sparse_input(X, y):
+    X_dense, y_dense = GlobalCS(shuffle=False).fit_resample(X, y)
+    X_sparse, y_sparse = GlobalCS(shuffle=False).fit_resample(csr_matrix(X), y)
+    assert isinstance(X_sparse, csr_matrix)
+    assert (X_sparse.toarray() == X_dense).all()
+    assert (y_sparse == y_dense).all()
+
+
+@pytest.mark.parametrize("X, y", complete_test_data)
+def test_float32_dtype(X, y):
+    X_64, y_64 = GlobalCS(shuffle=False).fit_resample(X, y)
+    X_32, y_32 = GlobalCS(shuffle=False, dtype=np.float32).fit_resample(X, y)
+    assert X_32.dtype == np.float32
+    assert np.allclose(X_32, X_64)
+    assert (y_32 == y_64).all()
+
+
+@pytest.mark.parametrize("reservoir_size", [None, 3])
+def test_partial_fit_resample_balances_everything_returned(reservoir_size):
+    rng = np.random.RandomState(0)
+    y = rng.choice([0, 1, 2], size=200, p=[0.7, 0.2, 0.1])
+    X = np.arange(200, dtype=float).reshape(-1, 1) * [1, 1]
+    global_cs = GlobalCS(reservoir_size=reservoir_size, random_state=0)
+
+    X_returned, y_returned = [], []
+    for start in range(0, 200, 50):
+        X_batch, y_batch = global_cs.partial_fit_resample(X[start:start + 50], y[start:start + 50])
+        X_returned.append(X_batch)
+        y_returned.append(y_batch)
+        quantities = Counter(np.concatenate(y_returned))
+        assert set(quantities.values()) == {max(Counter(y[:start + 50]).values())}
+
+    X_returned, y_returned = np.vstack(X_returned), np.concatenate(y_returned)
+    assert (y[X_returned[:, 0].astype(int)] == y_returned).all()
+    if reservoir_size is not None:
+        assert all(reservoir.shape[0] == 3 for reservoir in global_cs._reservoirs.values())
+
+
+@pytest.mark.parametrize("X, y", complete_test_data)
+def test_partial_fit_resample_single_batch_same_as_fit_resample(X, y):
+    X_partial, y_partial = GlobalCS(shuffle=False).partial_fit_resample(csr_matrix(X), y)
+    X_expected, y_expected = GlobalCS(shuffle=False).fit_resample(X, y)
+    assert sorted(map(tuple, np.column_stack((X_partial.toarray(), y_partial)))) == \
+        sorted(map(tuple, np.column_stack((X_expected, y_expected))))
+
+
+def test_partial_fit_resample_balanced_when_majority_class_changes():
+    global_cs = GlobalCS(shuffle=False)
+    _, y_first = global_cs.partial_fit_resample(np.zeros((12, 2)), np.array([0] * 10 + [1] * 2))
+    _, y_second = global_cs.partial_fit_resample(np.ones((20, 2)), np.array([1] * 20))
+
+    assert Counter(np.concatenate((y_first, y_second))) == {0: 30, 1: 30}
+    assert global_cs.max_quantity == 30
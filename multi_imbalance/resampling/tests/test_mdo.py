@@ -2,6 +2,7 @@ from collections import Counter, defaultdict
 
 import numpy as np
 import pytest
+from scipy.sparse import csr_matrix
 from numpy.testing import assert_array_equal, assert_allclose, assert_array_almost_equal
 
 from multi_imbalance.resampling.mdo import MDO
@@ -120,4 +121,29 @@ def test_mdo_api(mdo_mock):
     clf.k1 = 0
     clf.class_balances = maj_int_min
     X_r, y_r = clf.fit_resample(X, y_imb_hard)
-    assert X_r.shape == (28,2)
\ No newline at end of file
+    assert X_r.shape == (28,2)
+
+def test_mdo_neighbors_backend():
+    maj_int_min = {'maj': [0], 'int': [], 'min': [1]}
+    X_exact, y_exact = MDO(k=5, maj_int_min=maj_int_min).fit_resample(X, y_imb_hard)
+    X_approx, y_approx = MDO(k=5, maj_int_min=maj_int_min, neighbors='rp_forest').fit_resample(X, y_imb_hard)
+    assert_array_almost_equal(X_exact, X_approx)
+    assert_array_equal(y_exact, y_approx)
+
+
+def test_sparse_input():
+    maj_int_min = {'maj': [0], 'int': [], 'min': [1]}
+    X_dense, y_dense = MDO(k=5, maj_int_min=maj_int_min).fit_resample(X, y_imb_hard)
+    X_sparse, y_sparse = MDO(k=5, maj_int_min=maj_int_min).fit_resample(csr_matrix(X), y_imb_hard)
+    assert isinstance(X_sparse, csr_matrix)
+    assert_array_almost_equal(X_sparse.toarray(), X_dense)
+    assert_array_equal(y_sparse, y_dense)
+
+
+def test_float32_dtype():
+    maj_int_min = {'maj': [0], 'int': [], 'min': [1]}
+    X_64, y_64 = MDO(k=5, maj_int_min=maj_int_min).fit_resample(X, y_imb_hard)
+    X_32, y_32 = MDO(k=5, maj_int_min=maj_int_min, dtype=np.float32).fit_resample(X, y_imb_hard)
+    assert X_32.dtype == np.float32
+    assert_allclose(X_32, X_64, rtol=1e-4, atol=1e-4)
+    assert_array_equal(y_32, y_64)
@@ -2,9 +2,13 @@ from collections import Counter, defaultdict
 
 import numpy as np
 import pytest
+import sklearn
+from scipy.sparse import csr_matrix
+from sklearn.neighbors import NearestNeighbors
 from numpy.testing import assert_array_almost_equal
 
 from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.utils.data import ClassProfile
 
 X = np.array([
     [0.05837771, 0.57543339],
@@ -125,3 +129,81 @@ def test_undersample(X, y, class_name, expected_undersampling, expected_oversamp
     undersampled_X, undersampled_y = clf._undersample(X, y, class_name)
     assert len(undersampled_X) == expected_undersampling
     assert len(undersampled_y) == expected_undersampling
+
+
+@pytest.mark.parametrize("X, y, zero_safe_levels, one_safe_levels, first_sample_safe", complete_test_data)
+def test_neighbors_backend(X, y, zero_safe_levels, one_safe_levels, first_sample_safe):
+    X_exact, y_exact = SOUP(k=5).fit_resample(X, y)
+    X_approx, y_approx = SOUP(k=5, neighbors='rp_forest').fit_resample(X, y)
+    assert_array_almost_equal(X_exact, X_approx)
+    assert (y_exact == y_approx).all()
+
+
+def test_chunked_neighbour_queries():
+    X_expected, y_expected = SOUP(k=5).fit_resample(X, y_imb_hard)
+    with sklearn.config_context(working_memory=0.0001):
+        X_chunked, y_chunked = SOUP(k=5, n_jobs=2).fit_resample(X, y_imb_hard)
+    assert_array_almost_equal(X_expected, X_chunked)
+    assert (y_expected == y_chunked).all()
+
+
+@pytest.mark.parametrize("X, y, zero_safe_levels, one_safe_levels, first_sample_safe", complete_test_data)
+def test_sparse_input(X, y, zero_safe_levels, one_safe_levels, first_sample_safe):
+    X_dense, y_dense = SOUP(k=5).fit_resample(X, y)
+    X_sparse, y_sparse = SOUP(k=5).fit_resample(csr_matrix(X), y)
+    assert isinstance(X_sparse, csr_matrix)
+    assert_array_almost_equal(X_sparse.toarray(), X_dense)
+    assert (y_sparse == y_dense).all()
+
+
+@pytest.mark.parametrize("X, y, zero_safe_levels, one_safe_levels, first_sample_safe", complete_test_data)
+def test_float32_dtype(X, y, zero_safe_levels, one_safe_levels, first_sample_safe):
+    X_64, y_64 = SOUP(k=5).fit_resample(X, y)
+    X_32, y_32 = SOUP(k=5, dtype=np.float32).fit_resample(X, y)
+    assert X_32.dtype == np.float32
+    assert_array_almost_equal(X_32, X_64, decimal=5)
+    assert (y_32 == y_64).all()
+
+
+@pytest.mark.parametrize("X, y, zero_safe_levels, one_safe_levels, first_sample_safe", complete_test_data)
+def test_class_safe_levels_same_as_sample_safe_levels(X, y, zero_safe_levels, one_safe_levels, first_sample_safe,
+                                                      soup_mock):
+    clf = soup_mock(X, y)
+    neighbour_indices = NearestNeighbors(n_neighbors=6).fit(X).kneighbors(X, return_distance=False)[:, 1:]
+    for class_name in (0, 1):
+        levels = clf._construct_class_safe_levels(X, y, class_name)
+        for sample_id, level in levels.items():
+            expected = clf._calculate_sample_safe_level(class_name, Counter(y[neighbour_indices[sample_id]]))
+            assert level == pytest.approx(expected)
+
+
+def test_shared_class_profile():
+    X_expected, y_expected = SOUP(k=5).fit_resample(X, y_imb_hard)
+    X_shared, y_shared = SOUP(k=5, class_profile=ClassProfile(y_imb_hard)).fit_resample(X, y_imb_hard)
+    assert_array_almost_equal(X_expected, X_shared)
+    assert (y_expected == y_shared).all()
+    with pytest.raises(ValueError):
+        SOUP(k=5, class_profile=ClassProfile(y_imb_hard[:-1])).fit_resample(X, y_imb_hard)
+
+
+@pytest.mark.parametrize("sparse_input", [False, True])
+def test_partial_fit_resample_same_as_fit_resample_on_history(sparse_input):
+    rng = np.random.RandomState(1)
+    X = np.vstack([rng.normal(0, 1, (90, 3)), rng.normal(0.7, 1, (30, 3)), rng.normal(1.4, 1, (15, 3))])
+    y = np.repeat([0, 1, 2], [90, 30, 15])
+    permutation = rng.permutation(y.shape[0])
+    X, y = np.abs(X[permutation]), y[permutation]
+    if sparse_input:
+        X = csr_matrix(X)
+
+    soup = SOUP(k=5)
+    for start, stop in ((0, 40), (40, 85), (85, 135)):
+        X_partial, y_partial = soup.partial_fit_resample(X[start:stop], y[start:stop])
+        X_expected, y_expected = SOUP(k=5).fit_resample(X[:stop], y[:stop])
+        if sparse_input:
+            X_partial, X_expected = X_partial.toarray(), X_expected.toarray()
+        assert (X_partial == X_expected).all()
+        assert (y_partial == y_expected).all()
+
+    expected_neighbours = NearestNeighbors(n_neighbors=6).fit(X).kneighbors(X, return_distance=False)[:, 1:]
+    assert (np.sort(soup._neighbours, axis=1) == np.sort(expected_neighbours, axis=1)).all()
@@ -1,6 +1,8 @@
 from collections import Counter
 
 import numpy as np
+from numpy.testing import assert_array_almost_equal
+from scipy.sparse import csr_matrix
 
 from multi_imbalance.resampling.spider import SPIDER3
 from multi_imbalance.utils.array_util import (union, intersect, setdiff)
@@ -46,6 +48,16 @@ def test_setdiff():
     assert (actual == expected).all()
 
 
+def test_union_intersect_setdiff_sparse():
+    arr1 = csr_matrix(np.array([[1, 0, 3], [0, 5, 0]]))
+    arr2 = csr_matrix(np.array([[1, 0, 3]]))
+
+    assert (union(arr1, arr2).toarray() == np.array([[1, 0, 3], [0, 5, 0], [1, 0, 3]])).all()
+    assert (intersect(arr1, arr2).toarray() == np.array([[1, 0, 3]])).all()
+    assert (setdiff(arr1, arr2).toarray() == np.array([[0, 5, 0]])).all()
+    assert isinstance(setdiff(arr1, arr2), csr_matrix)
+
+
 def test_knn():
     X = np.array([
         [1, 1],
@@ -57,9 +69,10 @@ def test_knn():
 
     y = np.array(["MIN", "MIN", "MAJ", "MAJ", "MAJ"])
 
-    DS = np.append(X, y.reshape(y.shape[0], 1), axis=1)
+    spider._X, spider._y = X.astype(float), y
+    DS = np.arange(5)
 
-    assert (DS[4] == spider._knn(DS[0], DS)).all()
+    assert (spider._knn(0, DS) == [4]).all()
 
 
 def test_min_cost_classes():
@@ -73,11 +86,11 @@ def test_min_cost_classes():
 
     y = np.array(["MIN", "MIN", "MAJ", "MAJ", "MAJ"])
 
-    DS = np.append(X, y.reshape(y.shape[0], 1), axis=1)
     spider._fit_resample(X, y)
-    spider._min_cost_classes(DS[0], DS)
-    assert (spider._min_cost_classes(DS[0], DS) == ["MAJ"]).all()
-    assert (spider._min_cost_classes(DS[4], DS) == ["MIN", "MAJ"]).all()
+    spider._X, spider._y = X.astype(float), y
+    DS = np.arange(5)
+    assert (spider._min_cost_classes(0, DS) == ["MAJ"]).all()
+    assert (spider._min_cost_classes(4, DS) == ["MIN", "MAJ"]).all()
 
     
 def test_estimate_cost_matrix():
@@ -98,4 +111,96 @@ def test_fit_resample():
     cnt = Counter(y_resampled)
     assert cnt[1] == 72
     assert cnt[2] == 57
-    assert cnt[3] == 30
\ No newline at end of file
+    assert cnt[3] == 30
+
+def test_fit_resample_neighbors_backend():
+    np.random.seed(7)
+    X = np.vstack([np.random.normal(0, 1, (100, 2)),
+                   np.random.normal(3, 5, (30, 2)),
+                   np.random.normal(-2, 2, (20, 2))])
+
+    y = np.array([1] * 100 + [2] * 30 + [3] * 20)
+    X_resampled, y_resampled = SPIDER3(5, neighbors='rp_forest').fit_resample(X, y)
+    cnt = Counter(y_resampled)
+    assert X_resampled.shape[0] == y_resampled.shape[0]
+    assert cnt[1] < 100
+    assert cnt[3] > 20
+
+
+def test_fit_resample_sparse():
+    np.random.seed(7)
+    X = np.vstack([np.random.normal(0, 1, (100, 2)),
+                   np.random.normal(3, 5, (30, 2)),
+                   np.random.normal(-2, 2, (20, 2))])
+    X[X < 0] = 0
+
+    y = np.array([1] * 100 + [2] * 30 + [3] * 20)
+    X_dense, y_dense = SPIDER3(5).fit_resample(X, y)
+    X_sparse, y_sparse = SPIDER3(5).fit_resample(csr_matrix(X), y)
+    assert isinstance(X_sparse, csr_matrix)
+    assert_array_almost_equal(X_sparse.toarray(), X_dense)
+    assert (y_sparse == y_dense).all()
+
+
+def test_float32_dtype():
+    np.random.seed(7)
+    X = np.vstack([np.random.normal(0, 1, (100, 2)),
+                   np.random.normal(3, 5, (30, 2)),
+                   np.random.normal(-2, 2, (20, 2))])
+    y = np.array([1] * 100 + [2] * 30 + [3] * 20)
+    X_64, y_64 = SPIDER3(5).fit_resample(X, y)
+    X_32, y_32 = SPIDER3(5, dtype=np.float32).fit_resample(X, y)
+    assert X_32.dtype == np.float32
+    assert y_32.dtype == y.dtype
+    assert Counter(y_32) == Counter(y_64)
+    assert_array_almost_equal(X_32, X_64, decimal=4)
+
+
+def test_min_cost_classes_batch():
+    np.random.seed(7)
+    X = np.round(np.vstack([np.random.normal(0, 1, (60, 2)), np.random.normal(1, 2, (20, 2))]))
+    y = np.array([1] * 60 + [2] * 20)
+    sp = SPIDER3(3)
+    sp.fit_resample(X, y)
+    sp._X, sp._y = X, y
+    DS = np.concatenate((np.arange(80), [5, 70]))
+    xs = np.array([0, 5, 70, 79])
+
+    min_cost = sp._min_cost_classes_batch(xs, DS)
+    for x, neighbors, mask in zip(xs, sp._knn_batch(xs, DS), min_cost):
+        assert sorted(neighbors) == sorted(sp._knn(x, DS))
+        assert (sp._classes[mask] == sp._min_cost_classes(x, DS)).all()
+
+
+def test_count_copies_matches_adding_copies_one_by_one():
+    np.random.seed(3)
+    X = np.vstack([np.random.normal(0, 1, (60, 2)), np.random.normal(1, 1, (15, 2)), np.random.normal(-1, 1, (8, 2))])
+    y = np.array([0] * 60 + [1] * 15 + [2] * 8)
+    cost = np.array([[0, 1, 1], [3, 0, 1], [7, 2, 0]])
+    for k, cost in ((1, None), (5, None), (5, cost)):
+        sp = SPIDER3(k, cost=cost)
+        sp._initialize_algorithm(X, y)
+        sp.DS, sp.AS, sp.RS = np.arange(y.shape[0]), np.zeros(y.shape[0], dtype=int), np.array([], dtype=int)
+        union, weights = sp._ds_as_rs_union()
+        for x in np.flatnonzero(y != 0):
+            copies = 0
+            while True:
+                neighbors, neighbor_weights, _ = sp._weighted_knn([x], union, weights)[0]
+                if sp._min_cost_mask([y[neighbors]], [neighbor_weights])[0, sp._class_positions(y[x])]:
+                    break
+                weights[x] += 1
+                copies += 1
+            weights[x] -= copies
+            neighbors, neighbor_weights, distances = sp._weighted_knn([x], union, weights)[0]
+            assert sp._count_copies(x, neighbors, neighbor_weights, distances, True) == copies
+
+
+def test_resampled_rows_are_exact_copies_of_input_rows():
+    np.random.seed(5)
+    X = np.round(np.vstack([np.random.normal(0, 3, (60, 3)), np.random.normal(2, 3, (20, 3))]) * 10) / 10
+    y = np.array([1] * 60 + [2] * 20)
+    X_before = X.copy()
+    X_resampled, _ = SPIDER3(3).fit_resample(X, y)
+
+    assert (X == X_before).all()
+    assert (X_resampled[:, np.newaxis] == X[np.newaxis]).all(axis=2).any(axis=1).all()
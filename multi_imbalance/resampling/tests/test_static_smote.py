@@ -17,3 +17,15 @@ def test_static_smote():
     assert cnt[1] == 100
     assert cnt[2] == 60
     assert cnt[3] == 80
+
+
+def test_float32_dtype():
+    X = np.vstack([np.random.normal(0, 1, (100, 2)),
+                   np.random.normal(3, 5, (30, 2)),
+                   np.random.normal(-2, 2, (20, 2))])
+
+    y = np.array([1] * 100 + [2] * 30 + [3] * 20)
+    X_resampled, y_resampled = StaticSMOTE(dtype=np.float32).fit_resample(X, y)
+    assert X_resampled.dtype == np.float32
+    assert y_resampled.dtype == y.dtype
+    assert Counter(y_resampled) == {1: 100, 2: 60, 3: 80}
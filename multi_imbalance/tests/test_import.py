@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import multi_imbalance
+
+# wall-clock limit of the package import in seconds, the timing test runs only when it is set, as it depends on the
+# machine and its load
+IMPORT_TIME_BUDGET = os.environ.get('MULTI_IMBALANCE_IMPORT_BUDGET')
+
+_SCRIPT = '''
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+print(json.dumps([perf_counter() - start, sorted(sys.modules)]))
+'''
+
+
+def fresh_import(module):
+    output = subprocess.run([sys.executable, '-c', _SCRIPT.format(module=module)], check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output)
+
+
+@pytest.mark.skipif(not IMPORT_TIME_BUDGET, reason="MULTI_IMBALANCE_IMPORT_BUDGET is not set")
+def test_import_time_budget():
+    seconds = min(fresh_import('multi_imbalance')[0] for _ in range(3))
+    assert seconds < float(IMPORT_TIME_BUDGET)
+
+
+@pytest.mark.parametrize("module, deferred", [
+    ('multi_imbalance', ['sklearn', 'imblearn', 'pandas', 'scipy']),
+    ('multi_imbalance.utils.data', ['pandas', 'scipy.io']),
+    ('multi_imbalance.utils.plot', ['matplotlib', 'seaborn']),
+    ('multi_imbalance.ensemble.ovo', ['imblearn', 'pandas']),
+    ('multi_imbalance.ensemble.ecoc', ['imblearn', 'pandas']),
+    ('multi_imbalance.ensemble.mrbbagging', ['sklearn.feature_selection']),
+    ('multi_imbalance.datasets', ['pandas', 'scipy.io']),
+])
+def test_heavy_dependencies_are_deferred(module, deferred):
+    _, modules = fresh_import(module)
+    assert not set(deferred) & set(modules)
+
+
+def test_lazy_submodules():
+    assert multi_imbalance.ensemble.ovo.OVO.__name__ == 'OVO'
+    assert 'soup' in dir(multi_imbalance.resampling)
+    with pytest.raises(AttributeError):
+        multi_imbalance.unknown
@@ -0,0 +1,6 @@
+from multi_imbalance._lazy import lazy_submodules
+
+__all__ = ['arff_stream', 'array_util', 'data', 'experiment', 'metrics', 'min_int_maj', 'neighbors', 'plot',
+           'profiling']
+
+__getattr__, __dir__ = lazy_submodules(__name__, __all__)
@@ -0,0 +1,273 @@
+"""
+Streaming reader of ARFF files that do not fit in memory.
+
+The file is read twice. The first pass (scan_arff) collects the number of rows, the means of numeric attributes and
+the vocabularies and modes of nominal attributes, the second pass converts chunks of rows directly to float arrays.
+The result is the same as the one of multi_imbalance.utils.data.load_arff_dataset: missing numeric values are
+replaced with the mean and missing nominal values with the mode, numeric attributes come first followed by
+one hot encoded nominal attributes (with sorted categories) and labels are encoded with sorted class names.
+"""
+import csv
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+_NUMERIC_TYPES = ('numeric', 'real', 'integer')
+
+
+class ArffSchema:
+    """
+    Result of the first pass over an ARFF file.
+
+    Attributes:
+        * names - names of attributes, the last one is the class attribute
+        * nominal - flags, True for nominal attributes
+        * n_rows - number of data rows
+        * means - means of numeric attributes (dict attribute index -> mean)
+        * vocabularies - sorted values of nominal attributes present in the data (dict attribute index -> list)
+        * modes - the most frequent value of nominal attributes, the smallest one in case of a tie
+        * labels - sorted class names
+    """
+
+    def __init__(self, names, nominal):
+        self.names = names
+        self.nominal = nominal
+        self.n_rows = 0
+        self.means = dict()
+        self.vocabularies = dict()
+        self.modes = dict()
+        self.labels = []
+
+    @property
+    def feature_indices(self):
+        """
+        Indices of the non class attributes, numeric attributes first.
+        """
+        features = range(len(self.names) - 1)
+        return [i for i in features if not self.nominal[i]] + [i for i in features if self.nominal[i]]
+
+    @property
+    def non_cat_length(self):
+        return sum(not self.nominal[i] for i in range(len(self.names) - 1))
+
+    def n_columns(self, one_hot_encode=True):
+        """
+        Number of columns of X.
+        """
+        if not one_hot_encode:
+            return len(self.names) - 1
+        return self.non_cat_length + sum(len(self.vocabularies[i]) for i in self.feature_indices if self.nominal[i])
+
+
+def _parse_header(f):
+    names, nominal = [], []
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith('%'):
+            continue
+        keyword = line.split(None, 1)[0].lower()
+        if keyword == '@attribute':
+            name, attribute_type = _split_attribute(line)
+            if attribute_type.startswith('{'):
+                nominal.append(True)
+            elif attribute_type.lower() in _NUMERIC_TYPES:
+                nominal.append(False)
+            else:
+                raise ValueError(f'Unsupported type of attribute {name}: {attribute_type}')
+            names.append(name)
+        elif keyword == '@data':
+            if len(names) < 2:
+                raise ValueError('ARFF file should contain at least one feature and the class attribute')
+            return ArffSchema(names, nominal)
+    raise ValueError('ARFF file does not contain @data section')
+
+
+def _split_attribute(line):
+    rest = line.split(None, 1)[1].strip()
+    if rest[0] in '\'"':
+        end = rest.index(rest[0], 1)
+        return rest[1:end], rest[end + 1:].strip()
+    name, attribute_type = rest.split(None, 1)
+    return name, attribute_type.strip()
+
+
+def _iter_row_chunks(path, chunk_size):
+    """
+    Yields schema-less chunks of data rows as two dimensional arrays of stripped strings.
+    """
+    with open(path) as f:
+        schema = _parse_header(f)
+        n_attributes = len(schema.names)
+        lines = []
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('%'):
+                continue
+            if line.startswith('{'):
+                raise ValueError('Sparse ARFF data is not supported')
+            lines.append(line)
+            if len(lines) == chunk_size:
+                yield _split_rows(lines, n_attributes)
+                lines = []
+        if lines:
+            yield _split_rows(lines, n_attributes)
+
+
+def _split_rows(lines, n_attributes):
+    if any('"' in line or "'" in line for line in lines):
+        rows = [next(csv.reader([line], quotechar="'" if "'" in line else '"', skipinitialspace=True))
+                for line in lines]
+    else:
+        rows = [line.split(',') for line in lines]
+    if any(len(row) != n_attributes for row in rows):
+        raise ValueError(f'Expected {n_attributes} values in every data row')
+    return np.char.strip(np.array(rows, dtype=str))
+
+
+def scan_arff(path, chunk_size=10000):
+    """
+    First pass over an ARFF file.
+
+    :param path:
+        location of the ARFF file
+    :param chunk_size:
+        number of rows parsed at once
+    :return:
+        ArffSchema
+    """
+    with open(path) as f:
+        schema = _parse_header(f)
+
+    sums, counts = np.zeros(len(schema.names)), np.zeros(len(schema.names))
+    value_counts = {i: dict() for i, nominal in enumerate(schema.nominal) if nominal}
+    class_index = len(schema.names) - 1
+    labels = set()
+    for rows in _iter_row_chunks(path, chunk_size):
+        schema.n_rows += rows.shape[0]
+        for i, nominal in enumerate(schema.nominal):
+            column = rows[:, i]
+            if i == class_index:
+                labels.update(np.unique(column).tolist())
+            elif nominal:
+                values, occurrences = np.unique(column[column != '?'], return_counts=True)
+                for value, occurrence in zip(values.tolist(), occurrences.tolist()):
+                    value_counts[i][value] = value_counts[i].get(value, 0) + occurrence
+            else:
+                numbers = _to_float(column)
+                sums[i] += np.nansum(numbers)
+                counts[i] += np.count_nonzero(~np.isnan(numbers))
+
+    for i in range(class_index):
+        if schema.nominal[i]:
+            schema.vocabularies[i] = sorted(value_counts[i])
+            schema.modes[i] = min(value_counts[i], key=lambda value: (-value_counts[i][value], value), default='?')
+        else:
+            schema.means[i] = sums[i] / counts[i] if counts[i] else np.nan
+    schema.labels = sorted(labels, key=float) if not schema.nominal[class_index] else sorted(labels)
+    return schema
+
+
+def _to_float(column):
+    return np.where(column == '?', 'nan', column).astype(float)
+
+
+def _encode(values, vocabulary, missing):
+    values = np.where(values == '?', missing, values)
+    uniques, inverse = np.unique(values, return_inverse=True)
+    positions = {value: position for position, value in enumerate(vocabulary)}
+    return np.array([positions[value] for value in uniques.tolist()], dtype=int)[inverse]
+
+
+def iter_arff_chunks(path, chunk_size=10000, one_hot_encode=True, dtype=np.float64, schema=None):
+    """
+    Reads an ARFF file in chunks of rows. Only a single chunk is kept in memory at a time.
+
+    :param path:
+        location of the ARFF file
+    :param chunk_size:
+        number of rows in a chunk
+    :param one_hot_encode:
+        flag, if true nominal attributes are one hot encoded, otherwise they are replaced with the positions of
+        their values in the sorted vocabulary
+    :param dtype:
+        floating point type of X chunks
+    :param schema:
+        result of scan_arff, computed if None
+    :return:
+        generator of (X_chunk, y_chunk) tuples
+    """
+    if schema is None:
+        schema = scan_arff(path, chunk_size)
+
+    offsets, offset = dict(), schema.non_cat_length
+    for i in schema.feature_indices:
+        if schema.nominal[i]:
+            offsets[i] = offset
+            offset += len(schema.vocabularies[i]) if one_hot_encode else 1
+    n_columns = schema.n_columns(one_hot_encode)
+    class_index = len(schema.names) - 1
+
+    for rows in _iter_row_chunks(path, chunk_size):
+        X = np.zeros((rows.shape[0], n_columns), dtype=dtype)
+        for column, i in enumerate(schema.feature_indices):
+            if not schema.nominal[i]:
+                numbers = _to_float(rows[:, i])
+                X[:, column] = np.where(np.isnan(numbers), schema.means[i], numbers)
+            else:
+                codes = _encode(rows[:, i], schema.vocabularies[i], schema.modes[i])
+                if one_hot_encode:
+                    X[np.arange(rows.shape[0]), offsets[i] + codes] = 1
+                else:
+                    X[:, offsets[i]] = codes
+
+        labels = rows[:, class_index]
+        if schema.nominal[class_index]:
+            y = _encode(labels, schema.labels, '?')
+        else:
+            y = np.searchsorted(np.array(schema.labels, dtype=float), labels.astype(float))
+        yield X, y
+
+
+def load_arff_streaming(path, chunk_size=10000, one_hot_encode=True, dtype=np.float64, out=None,
+                        return_non_cat_length=False):
+    """
+    Loads an ARFF file chunk by chunk into a preallocated array, the memory used besides the result is bounded by
+    the chunk size.
+
+    :param path:
+        location of the ARFF file
+    :param chunk_size:
+        number of rows parsed at once
+    :param one_hot_encode:
+        flag, if true nominal attributes are one hot encoded, see iter_arff_chunks
+    :param dtype:
+        floating point type of X
+    :param out:
+        path of a .npy file, if given X is written to this file through a memory map and returned as a read only
+        memory map, so that it does not have to fit in memory. If None, X is a numpy array.
+    :param return_non_cat_length:
+        flag, if true returns the number of non categorical variables
+    :returns:
+        - ndarray X - numeric attributes followed by nominal attributes
+        - ndarray y - one dimensional numpy array with the classification target
+        - int non_cat_length - number of non categorical variables (only if return_non_cat_length=True)
+    """
+    schema = scan_arff(path, chunk_size)
+    shape = (schema.n_rows, schema.n_columns(one_hot_encode))
+    X = np.empty(shape, dtype=dtype) if out is None else open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    y = np.empty(schema.n_rows, dtype=int)
+
+    start = 0
+    for X_chunk, y_chunk in iter_arff_chunks(path, chunk_size, one_hot_encode, dtype, schema):
+        X[start:start + X_chunk.shape[0]] = X_chunk
+        y[start:start + X_chunk.shape[0]] = y_chunk
+        start += X_chunk.shape[0]
+
+    if out is not None:
+        X.flush()
+        del X
+        X = np.load(out, mmap_mode='r')
+
+    if return_non_cat_length:
+        return X, y, schema.non_cat_length
+    return X, y
@@ -1,9 +1,13 @@
+import tempfile
+
 import numpy as np
+from scipy import sparse
+from sklearn.utils import gen_batches, get_chunk_n_rows
 
 
 def setdiff(arr1, arr2):
     """
-    Performs the difference over two numpy arrays.
+    Performs the difference over two numpy arrays or scipy sparse matrices.
 
     :param arr1:
         Numpy array number 1.
@@ -14,14 +18,15 @@ def setdiff(arr1, arr2):
     """
 
     for element in arr2:
-        if contains(arr1, element):
-            arr1 = np.delete(arr1, index_of(arr1, element), 0)
+        idx = index_of(arr1, element)
+        if idx != -1:
+            arr1 = delete_rows(arr1, [idx])
     return arr1
 
 
 def union(arr1, arr2):
     """
-    Performs the union over two numpy arrays
+    Performs the union over two numpy arrays or scipy sparse matrices
     (not removing duplicates, as it's how the algorithm SPIDER3 actually works).
 
     :param arr1:
@@ -32,12 +37,12 @@ def union(arr1, arr2):
         The union of arr1 and arr2.
     """
 
-    if arr1.size == 0:
+    if arr1.shape[0] == 0:
         return arr2
-    elif arr2.size == 0:
+    elif arr2.shape[0] == 0:
         return arr1
     else:
-        return np.append(arr1, arr2, axis=0)
+        return vstack((arr1, arr2))
 
 
 def contains(dataset, example):
@@ -47,20 +52,17 @@ def contains(dataset, example):
     :param example:
     :return: True or False depending on whether dataset contains the example.
     """
-    for x in dataset:
-        if all(x == example):
-            return True
-    return False
+    return bool(equal_rows_mask(dataset, example).any())
 
 
 def index_of(arr, example):
     """
     :return: Index of learning exmaple in arr.
     """
-    for i, x in enumerate(arr):
-        if all(x == example):
-            return i
-    return -1
+    equal_rows = np.flatnonzero(equal_rows_mask(arr, example))
+    if equal_rows.shape[0] == 0:
+        return -1
+    return equal_rows[0]
 
 
 def intersect(arr1, arr2):
@@ -75,11 +77,179 @@ def intersect(arr1, arr2):
         The intersection of arr1 and arr2.
     """
 
-    if arr1.size == 0 or arr2.size == 0:
+    if arr1.shape[0] == 0 or arr2.shape[0] == 0:
         return np.array([])
 
     result = np.array([])
     for x in arr1:
         if contains(arr2, x):
-            result = union(result, np.array([x]))
+            result = union(result, x if sparse.issparse(x) else np.array([x]))
     return result
+
+
+def vstack(arrays):
+    """
+    Stacks rows of numpy arrays or scipy sparse matrices. The result is a CSR matrix if any of the arrays is sparse.
+
+    :param arrays:
+        Sequence of two dimensional arrays with the same number of columns.
+    :return:
+        Stacked array.
+    """
+    if any(sparse.issparse(arr) for arr in arrays):
+        return sparse.vstack([sparse.csr_matrix(arr) for arr in arrays], format='csr')
+    return np.vstack(arrays)
+
+
+def delete_rows(arr, indices):
+    """
+    Removes rows from a numpy array or a scipy sparse matrix, sparse input stays sparse.
+
+    :param arr:
+        Two dimensional array.
+    :param indices:
+        Indices of rows to remove.
+    :return:
+        Array without the given rows.
+    """
+    if sparse.issparse(arr):
+        mask = np.ones(arr.shape[0], dtype=bool)
+        mask[indices] = False
+        return arr.tocsr()[np.flatnonzero(mask)]
+    return np.delete(arr, indices, axis=0)
+
+
+def equal_rows_mask(dataset, example):
+    """
+    :param dataset:
+        Two dimensional numpy array or scipy sparse matrix.
+    :param example:
+        Single row.
+    :return: Boolean mask of rows of dataset equal to example.
+    """
+    if dataset.shape[0] == 0:
+        return np.zeros(0, dtype=bool)
+
+    if sparse.issparse(dataset):
+        example = sparse.csr_matrix(example)
+        diff = dataset.tocsr() - sparse.csr_matrix(np.ones((dataset.shape[0], 1))) @ example
+        diff.eliminate_zeros()
+        return diff.getnnz(axis=1) == 0
+
+    return np.all(dataset == example, axis=1)
+
+
+def as_float(X, dtype=None):
+    """
+    Converts X to the floating point type used for computations. This is the dtype policy shared by all samplers and
+    ensembles: an explicitly given dtype (e.g. np.float32) is always used, otherwise float32 and float64 input is
+    preserved and any other input is converted to float64.
+
+    :param X:
+        Numpy array or scipy sparse matrix.
+    :param dtype:
+        Floating point type or None.
+    :return:
+        X converted to the floating point type (not copied if it already has this type).
+    """
+    if dtype is None:
+        dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+    return X.astype(dtype, copy=False)
+
+
+def allocate_rows(n_rows, n_columns, dtype, memory_budget=None):
+    """
+    Allocates an uninitialised two dimensional array. If it is bigger than the memory budget, it is a numpy.memmap
+    backed by an anonymous temporary file (in the directory given by the TMPDIR environment variable), which is removed
+    when the array is garbage collected.
+
+    :param n_rows:
+        Number of rows.
+    :param n_columns:
+        Number of columns.
+    :param dtype:
+        Type of the array.
+    :param memory_budget:
+        Size in MiB above which the array is memory mapped, None means that it is always kept in memory.
+    :return:
+        Numpy array or numpy.memmap.
+    """
+    nbytes = n_rows * n_columns * np.dtype(dtype).itemsize
+    if memory_budget is None or nbytes <= memory_budget * 2 ** 20 or nbytes == 0:
+        return np.empty((n_rows, n_columns), dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode='w+', shape=(n_rows, n_columns))
+
+
+def take_rows(arr, indices, memory_budget=None, working_memory=None):
+    """
+    Gathers rows of a numpy array, numpy.memmap or scipy sparse matrix. Rows of dense arrays are copied in chunks of
+    the working memory size, so that gathering rows of a memory mapped array larger than RAM needs bounded memory,
+    and the result is spilled to a temporary memory mapped file if it exceeds the memory budget.
+
+    :param arr:
+        Two dimensional array.
+    :param indices:
+        Indices of rows to take.
+    :param memory_budget:
+        Size of the result in MiB above which it is memory mapped, see allocate_rows.
+    :param working_memory:
+        Size of a chunk in MiB, if None sklearn's working_memory config is used.
+    :return:
+        Array with the given rows.
+    """
+    indices = np.asarray(indices, dtype=np.intp)
+    if sparse.issparse(arr):
+        return arr.tocsr()[indices]
+
+    out = allocate_rows(indices.shape[0], arr.shape[1], arr.dtype, memory_budget)
+    row_bytes = max(arr.shape[1] * arr.dtype.itemsize, 1)
+    chunk_n_rows = get_chunk_n_rows(row_bytes=row_bytes, max_n_rows=max(indices.shape[0], 1),
+                                    working_memory=working_memory)
+    for chunk in gen_batches(indices.shape[0], chunk_n_rows):
+        out[chunk] = arr[indices[chunk]]
+    return out
+
+
+def spill(arr, memory_budget=None):
+    """
+    Moves a dense array bigger than the memory budget to a temporary memory mapped file, see allocate_rows.
+
+    :param arr:
+        Numpy array or scipy sparse matrix, sparse matrices and arrays that are already memory mapped are returned
+        unchanged.
+    :param memory_budget:
+        Size in MiB above which the array is memory mapped, None means that arr is always returned unchanged.
+    :return:
+        arr or its memory mapped copy.
+    """
+    if memory_budget is None or sparse.issparse(arr) or isinstance(arr, np.memmap) or arr.ndim != 2 \
+            or arr.nbytes <= memory_budget * 2 ** 20:
+        return arr
+    out = allocate_rows(arr.shape[0], arr.shape[1], arr.dtype, memory_budget)
+    out[:] = arr
+    return out
+
+
+class MemmapReference:
+    """
+    Reference to a file backed numpy.memmap, which is pickled as the file location instead of the data. It is used to
+    pass memory mapped training data to worker processes, which reopen the file read only.
+    """
+
+    def __init__(self, arr):
+        self.filename = arr.filename
+        self.dtype = arr.dtype
+        self.shape = arr.shape
+        self.offset = arr.offset
+        self.order = 'F' if arr.flags.f_contiguous and not arr.flags.c_contiguous else 'C'
+
+    @staticmethod
+    def supported(arr):
+        """
+        :return: True if arr is a whole memory mapped file (not a view of it) which can be reopened by its location.
+        """
+        return isinstance(arr, np.memmap) and arr.filename is not None and arr.base is getattr(arr, '_mmap', None)
+
+    def open(self):
+        return np.memmap(self.filename, dtype=self.dtype, mode='r', shape=self.shape, offset=self.offset,
+                         order=self.order)
@@ -1,16 +1,16 @@
 import glob
+import hashlib
+import json
+import os
 from collections import OrderedDict, Counter
 from pathlib import Path
-from statistics import median
 
 import numpy as np
-import pandas as pd
-from scipy.io import arff
 from sklearn.preprocessing import LabelEncoder
 from sklearn.utils import Bunch
 
 
-def construct_flat_2pc_df(X, y) -> pd.DataFrame:
+def construct_flat_2pc_df(X, y) -> 'pandas.DataFrame':
     """
     This function takes two dimensional X and one dimensional y arrays, concatenates and returns them as data frame
 
@@ -21,6 +21,8 @@ def construct_flat_2pc_df(X, y) -> pd.DataFrame:
     :return:
         Data frame with 3 columns x1 x2 and y and with number of rows equal to number of rows in X
     """
+    import pandas as pd
+
     y = pd.DataFrame({'y': y})
     X_df = pd.DataFrame(data=X, columns=['x1', 'x2'])
 
@@ -34,7 +36,11 @@ def get_project_root() -> Path:  # pragma no cover
     return Path(__file__).parent.parent.parent
 
 
-def load_arff_dataset(path: str, one_hot_encode: bool = True, return_non_cat_length: bool = False):
+ARFF_CACHE_VERSION = 1
+
+
+def load_arff_dataset(path: str, one_hot_encode: bool = True, return_non_cat_length: bool = False,
+                      cache_dir: str = None, mmap_mode: str = None):
     """
     Load and return the dataset saved in arff type file
 
@@ -44,11 +50,34 @@ def load_arff_dataset(path: str, one_hot_encode: bool = True, return_non_cat_len
         flag, if true encodes categorical variables using OneHotEncoder
     :param bool return_non_cat_length:
         flag, if true returns the number of non categorical variables
+    :param str cache_dir:
+        directory of the on-disk cache of processed datasets. If given, the processed X and y are stored there as .npy
+        files and later loads skip parsing. A cache entry is rebuilt when the cache version or the encoding options
+        differ, or when the file modification time changed and so did the content hash. If None, no cache is used.
+    :param str mmap_mode:
+        memory-map mode used to open the cached arrays (see numpy.load), e.g. 'r' to open them read only. None
+        (default) loads them into memory. Arrays of python objects (categorical values without one hot encoding)
+        are always loaded into memory.
     :returns:
         - ndarray X - dimensional numpy array where non categorical variables are stored in first columns followed by categorical variables
         - ndarray y - one dimensional numpy array with the classification target
         - bool non_cat_length - number of non categorical variables (only if return_non_cat_length=True)
     """
+    if cache_dir is None:
+        X, y, non_cat_length = _parse_arff(path, one_hot_encode)
+    else:
+        X, y, non_cat_length = _load_cached_arff(path, one_hot_encode, cache_dir, mmap_mode)
+
+    if return_non_cat_length:
+        return X, y, non_cat_length
+    else:
+        return X, y
+
+
+def _parse_arff(path, one_hot_encode):
+    import pandas as pd
+    from scipy.io import arff
+
     data, meta = arff.loadarff(path)
 
     df = pd.DataFrame(data)
@@ -76,13 +105,84 @@ def load_arff_dataset(path: str, one_hot_encode: bool = True, return_non_cat_len
         col_list = non_categorical_cols + categorical_cols
         X = df[col_list]
 
-    if return_non_cat_length:
-        return X.to_numpy(), y, len(non_categorical_cols)
-    else:
-        return X.to_numpy(), y
+    return X.to_numpy(), y, len(non_categorical_cols)
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _save_atomic(path, save):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        save(f)
+    os.replace(tmp_path, path)
+
+
+def _load_cached_arff(path, one_hot_encode, cache_dir, mmap_mode):
+    """
+    Returns X, y and the number of non categorical variables from the cache entry of the arff file, the entry is
+    (re)built if it is missing or stale. The metadata file is written last, so an interrupted write is never used.
+    """
+    path = os.path.abspath(path)
+    options = {'one_hot_encode': one_hot_encode}
+    key = hashlib.sha1(json.dumps([path, options]).encode()).hexdigest()[:16]
+    entry = os.path.join(cache_dir, f'{Path(path).stem}-{key}')
+    meta_path = os.path.join(entry, 'meta.json')
+    stat = os.stat(path)
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+
+    if meta is not None and (meta.get('version') != ARFF_CACHE_VERSION or meta.get('options') != options):
+        meta = None
+    if meta is not None and (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+        if meta['sha256'] == _file_sha256(path):
+            meta['mtime_ns'], meta['size'] = stat.st_mtime_ns, stat.st_size
+            _save_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+        else:
+            meta = None
+
+    if meta is None:
+        X, y, non_cat_length = _parse_arff(path, one_hot_encode)
+        os.makedirs(entry, exist_ok=True)
+        allow_pickle = X.dtype == object
+        _save_atomic(os.path.join(entry, 'X.npy'), lambda f: np.save(f, X, allow_pickle=allow_pickle))
+        _save_atomic(os.path.join(entry, 'y.npy'), lambda f: np.save(f, y))
+        meta = {'version': ARFF_CACHE_VERSION, 'source': path, 'options': options, 'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size, 'sha256': _file_sha256(path), 'allow_pickle': bool(allow_pickle),
+                'non_cat_length': non_cat_length}
+        _save_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+
+    allow_pickle = meta['allow_pickle']
+    X = np.load(os.path.join(entry, 'X.npy'), mmap_mode=None if allow_pickle else mmap_mode,
+                allow_pickle=allow_pickle)
+    y = np.load(os.path.join(entry, 'y.npy'), mmap_mode=mmap_mode)
+    return X, y, meta['non_cat_length']
+
 
+def load_datasets_arff(return_non_cat_length=False, dataset_paths=None, cache_dir=None, mmap_mode=None):
+    """
+    Load the arff datasets, by default all files from data/arff directory of the project.
 
-def load_datasets_arff(return_non_cat_length=False, dataset_paths=None):
+    :param return_non_cat_length:
+        flag, if true the number of non categorical variables is stored in non_cat_length attribute of datasets
+    :param dataset_paths:
+        list of paths of arff files
+    :param cache_dir:
+        directory of the on-disk cache of processed datasets, see load_arff_dataset
+    :param mmap_mode:
+        memory-map mode of the cached arrays, see load_arff_dataset
+    :return:
+        OrderedDict dataset name -> Bunch with data, target and DESCR attributes
+    """
     if dataset_paths is None:
         dataset_paths = glob.glob(f'{get_project_root()}/data/arff/*')
 
@@ -91,10 +191,12 @@ def load_datasets_arff(return_non_cat_length=False, dataset_paths=None):
         dataset_file = path.split('/')[-1]
         dataset_name = dataset_file.split('.')[0]
         if return_non_cat_length:
-            X, y, cat_length = load_arff_dataset(path, return_non_cat_length=return_non_cat_length)
+            X, y, cat_length = load_arff_dataset(path, return_non_cat_length=return_non_cat_length,
+                                                 cache_dir=cache_dir, mmap_mode=mmap_mode)
             datasets[dataset_name] = Bunch(data=X, target=y, non_cat_length=cat_length, DESCR=dataset_name)
         else:
-            X, y = load_arff_dataset(path, return_non_cat_length=return_non_cat_length)
+            X, y = load_arff_dataset(path, return_non_cat_length=return_non_cat_length, cache_dir=cache_dir,
+                                     mmap_mode=mmap_mode)
             datasets[dataset_name] = Bunch(data=X, target=y, DESCR=dataset_name)
 
     return datasets
@@ -118,28 +220,112 @@ def construct_maj_int_min(y: np.ndarray, strategy='median') -> OrderedDict:
         dictionary with keys 'maj', 'int', 'min. The value for each key is a list containing the class labels belonging
         to the given group
     """
-    class_sizes = Counter(y)
+    return ClassProfile(y, strategy).maj_int_min
 
-    if strategy == 'median':
-        middle_size = median(list(class_sizes.values()))
-    elif strategy == 'average':
-        middle_size = np.mean(list(class_sizes.values()))
-    else:
-        raise ValueError(f'Unrecognized {strategy}. Only "median" and "average" are allowed.')
-
-    maj_int_min = OrderedDict({
-        'maj': list(),
-        'int': list(),
-        'min': list()
-    })
-    for class_label, class_size in class_sizes.items():
-        if class_size == middle_size:
-            class_group = 'int'
-        elif class_size < middle_size:
-            class_group = 'min'
+
+def class_similarity(counts):
+    """
+    Computes the similarity between classes used by SOUP: min(q_i, q_j) / max(q_i, q_j) for class sizes q_i, q_j.
+
+    :param counts:
+        one dimensional array with class sizes
+    :return:
+        symmetric array (number of classes x number of classes) with ones on the diagonal
+    """
+    counts = np.asarray(counts, dtype=float)
+    return np.minimum.outer(counts, counts) / np.maximum.outer(counts, counts)
+
+
+class ClassProfile:
+    """
+    Class statistics of a label vector computed with a single np.unique pass. A profile can be passed to the samplers
+    and ensembles (class_profile parameter) so that the statistics of the same labels are computed only once.
+
+    Attributes:
+        * classes - sorted class labels
+        * encoded - index of the class of every example in classes
+        * counts - number of examples of every class
+        * order - indices of classes in the order of their first occurrence in y (the iteration order of Counter(y))
+        * maj_int_min - the same dictionary as returned by construct_maj_int_min
+        * similarity - class_similarity of the counts
+    """
+
+    def __init__(self, y, strategy='median'):
+        """
+        :param y:
+            one dimensional numpy array with class labels
+        :param strategy:
+            division into minority and majority classes, see construct_maj_int_min
+        """
+        y = np.asarray(y)
+        self.classes, first_indices, self.encoded, self.counts = np.unique(y, return_index=True, return_inverse=True,
+                                                                           return_counts=True)
+        self.encoded = self.encoded.reshape(-1)
+        self.order = np.argsort(first_indices, kind='stable')
+        self.maj_int_min = self._split_classes(strategy)
+        self.similarity = class_similarity(self.counts)
+
+    @property
+    def n_samples(self):
+        return self.encoded.shape[0]
+
+    def quantities(self):
+        """
+        :return:
+            new Counter equal to Counter(y), with the same iteration order
+        """
+        return Counter(dict(zip(self.classes[self.order].tolist(), self.counts[self.order].tolist())))
+
+    def encode(self, labels):
+        """
+        :param labels:
+            array with labels of classes present in the profile
+        :return:
+            indices of the labels in classes
+        """
+        return np.searchsorted(self.classes, labels)
+
+    def check(self, y):
+        """
+        Raises ValueError if the profile was not computed for y, e.g. it was computed for another fold of the same
+        size.
+        """
+        if self.n_samples != len(y):
+            raise ValueError(f'Class profile was computed for {self.n_samples} labels, but y has {len(y)} labels')
+        if not np.array_equal(self.classes[self.encoded], np.asarray(y)):
+            raise ValueError('Class profile was computed for other labels than y')
+
+    def _split_classes(self, strategy):
+        if strategy == 'median':
+            middle_size = np.median(self.counts)
+        elif strategy == 'average':
+            middle_size = np.mean(self.counts)
         else:
-            class_group = 'maj'
+            raise ValueError(f'Unrecognized {strategy}. Only "median" and "average" are allowed.')
 
-        maj_int_min[class_group].append(class_label)
+        groups = np.where(self.counts == middle_size, 'int', np.where(self.counts < middle_size, 'min', 'maj'))
+        maj_int_min = OrderedDict({
+            'maj': list(),
+            'int': list(),
+            'min': list()
+        })
+        for class_label, class_group in zip(self.classes[self.order].tolist(), groups[self.order].tolist()):
+            maj_int_min[class_group].append(class_label)
+        return maj_int_min
 
-    return maj_int_min
+
+def get_class_profile(y, class_profile=None, strategy='median'):
+    """
+    :param y:
+        one dimensional numpy array with class labels
+    :param class_profile:
+        ClassProfile of y or None
+    :param strategy:
+        division into minority and majority classes of a new profile, see construct_maj_int_min
+    :return:
+        class_profile if it is given (after checking that it matches y), otherwise a new ClassProfile of y
+    """
+    if class_profile is None:
+        return ClassProfile(y, strategy)
+    class_profile.check(y)
+    return class_profile
@@ -0,0 +1,242 @@
+"""
+Cross-validation experiments over grids of datasets, resampling algorithms and classifiers.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import deepcopy
+
+import numpy as np
+from joblib import effective_n_jobs, hash as joblib_hash
+from scipy import sparse
+from sklearn.model_selection import StratifiedKFold
+
+from multi_imbalance.utils.array_util import MemmapReference
+from multi_imbalance.utils.data import _save_atomic
+from multi_imbalance.utils.metrics import gmean_score
+
+FOLD_CACHE_VERSION = 2
+
+
+def _named(estimators):
+    """
+    :return: list of (name, estimator) pairs of a dict or of a list of estimators named after their classes
+    """
+    if isinstance(estimators, dict):
+        return list(estimators.items())
+    named = [(type(estimator).__name__ if estimator is not None else 'None', estimator) for estimator in estimators]
+    names = [name for name, _ in named]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f'Estimators {duplicated} are given more than once, pass a dict to name them')
+    return named
+
+
+def _digest(*parts):
+    sha1 = hashlib.sha1()
+    for part in parts:
+        sha1.update(part if isinstance(part, bytes) else repr(part).encode())
+    return sha1.hexdigest()[:16]
+
+
+def _data_digest(X):
+    """
+    :return: digest of the content of X. A file backed memmap is identified by the location, size and modification
+        time of its file, so that it is not read
+    """
+    if MemmapReference.supported(X):
+        stat = os.stat(X.filename)
+        return _digest(X.filename, X.offset, X.dtype.str, X.shape, stat.st_size, stat.st_mtime_ns)
+    return joblib_hash(X)
+
+
+def read_results(results_path):
+    """
+    Reads the results of run_experiment. An incomplete last line, left by an interrupted run, is skipped.
+
+    :param results_path:
+        path of the results file in JSON lines format
+    :return:
+        list of dicts, one per dataset, fold, sampler and classifier
+    """
+    results = []
+    if not os.path.exists(results_path):
+        return results
+    with open(results_path) as f:
+        for line in f:
+            if line.endswith('\n'):
+                results.append(json.loads(line))
+    return results
+
+
+def _truncate_incomplete_line(results_path):
+    if not os.path.exists(results_path):
+        return
+    with open(results_path, 'rb+') as f:
+        content = f.read()
+        if content and not content.endswith(b'\n'):
+            f.truncate(content.rfind(b'\n') + 1)
+
+
+def _load_fold(entry):
+    meta_path = os.path.join(entry, 'meta.json')
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != FOLD_CACHE_VERSION:
+        return None
+    if meta['sparse']:
+        X = sparse.load_npz(os.path.join(entry, 'X.npz'))
+    else:
+        X = np.load(os.path.join(entry, 'X.npy'), mmap_mode='r')
+    y = np.load(os.path.join(entry, 'y.npy'))
+    return X, y, meta['resample_time']
+
+
+def _save_fold(entry, X, y, resample_time):
+    """
+    Writes a resampled training fold to a cache entry. The metadata file is written last, so an interrupted write is
+    never used.
+    """
+    os.makedirs(entry, exist_ok=True)
+    if sparse.issparse(X):
+        _save_atomic(os.path.join(entry, 'X.npz'), lambda f: sparse.save_npz(f, X))
+    else:
+        _save_atomic(os.path.join(entry, 'X.npy'), lambda f: np.save(f, X))
+    _save_atomic(os.path.join(entry, 'y.npy'), lambda f: np.save(f, y))
+    meta = {'version': FOLD_CACHE_VERSION, 'sparse': sparse.issparse(X), 'resample_time': resample_time}
+    _save_atomic(os.path.join(entry, 'meta.json'), lambda f: f.write(json.dumps(meta).encode()))
+
+
+def _run_task(task):
+    """
+    Resamples a training fold (or loads it from the fold cache) and evaluates all remaining classifiers on it.
+
+    :return: list of result dicts
+    """
+    X, y, train, test, sampler, classifiers, metrics, cache_entry, record = task
+    if isinstance(X, MemmapReference):
+        X = X.open()
+    X_train, y_train = X[train], y[train]
+
+    cached = _load_fold(cache_entry) if cache_entry is not None else None
+    if cached is not None:
+        X_resampled, y_resampled, resample_time = cached
+    elif sampler is None:
+        X_resampled, y_resampled, resample_time = X_train, y_train, 0.0
+    else:
+        start = time.perf_counter()
+        X_resampled, y_resampled = deepcopy(sampler).fit_resample(X_train, y_train)
+        resample_time = time.perf_counter() - start
+        if cache_entry is not None:
+            _save_fold(cache_entry, X_resampled, y_resampled, resample_time)
+
+    X_test, y_test = X[test], y[test]
+    results = []
+    for classifier_name, classifier in classifiers:
+        classifier = deepcopy(classifier)
+        start = time.perf_counter()
+        classifier.fit(X_resampled, y_resampled)
+        fit_time = time.perf_counter() - start
+        start = time.perf_counter()
+        y_pred = classifier.predict(X_test)
+        predict_time = time.perf_counter() - start
+
+        result = dict(record, classifier=classifier_name, n_train=int(train.shape[0]),
+                      n_resampled=int(y_resampled.shape[0]), resample_time=resample_time,
+                      resample_cached=cached is not None, fit_time=fit_time, predict_time=predict_time)
+        for metric_name, metric in metrics.items():
+            result[metric_name] = float(metric(y_test, y_pred))
+        results.append(result)
+    return results
+
+
+def run_experiment(datasets, samplers, classifiers, results_path, cv=None, metrics=None, cache_dir=None,
+                   n_jobs=None):
+    """
+    Evaluates every pair of a resampling algorithm and a classifier on every dataset with cross-validation. The
+    (dataset, fold, sampler) tasks are run in parallel worker processes, each task resamples the training fold once
+    and fits all classifiers on it. Memory mapped datasets are reopened by the workers instead of being copied.
+
+    Every result is appended to the results file as soon as its task finishes. When the results file already exists,
+    the run is resumed: the results found in it are kept and only the missing ones are computed, so an interrupted
+    experiment can be started again with the same arguments.
+
+    :param datasets:
+        mapping dataset name -> Bunch with data and target attributes, e.g. returned by
+        multi_imbalance.datasets.load_datasets or multi_imbalance.utils.data.load_datasets_arff
+    :param samplers:
+        dict name -> resampling algorithm implementing fit_resample, or a list of them named after their classes.
+        None stands for training on the original fold
+    :param classifiers:
+        dict name -> classifier or ensemble implementing fit and predict, or a list of them named after their
+        classes
+    :param results_path:
+        path of the results file. Results are stored in JSON lines format, one dict per dataset, fold, sampler and
+        classifier with the metrics, the sizes of the training fold before and after resampling and the resampling,
+        fitting and prediction times in seconds, see read_results
+    :param cv:
+        cross-validation splitter, by default StratifiedKFold(5, shuffle=True, random_state=0). Its splits have to
+        be deterministic for the results of a resumed run to be consistent
+    :param metrics:
+        dict name -> function(y_true, y_pred), by default {'gmean': gmean_score}
+    :param cache_dir:
+        directory in which resampled training folds are cached, so that they are reused by resumed runs and by runs
+        with other classifiers. The cache key includes the sampler parameters, the indices of the fold and a digest
+        of the dataset (of the file location, size and modification time for memory mapped datasets). If None,
+        folds are not cached
+    :param n_jobs:
+        number of worker processes, -1 means all processors. If None or 1, tasks are run in the current process
+    :return:
+        list of the result dicts of all datasets, folds, samplers and classifiers, including the resumed ones
+    """
+    if cv is None:
+        cv = StratifiedKFold(n_splits=5, shuffle=True, random_state=0)
+    if metrics is None:
+        metrics = {'gmean': gmean_score}
+    samplers, classifiers = _named(samplers), _named(classifiers)
+
+    _truncate_incomplete_line(results_path)
+    results = read_results(results_path)
+    done = {(r['dataset'], r['fold'], r['split'], r['sampler'], r['classifier']) for r in results}
+
+    tasks = []
+    for dataset_name, dataset in datasets.items():
+        X, y = dataset.data, np.asarray(dataset.target)
+        shared_X = MemmapReference(X) if MemmapReference.supported(X) else X
+        data_digest = _data_digest(X) if cache_dir is not None else None
+        for fold, (train, test) in enumerate(cv.split(X, y)):
+            split = _digest(train.tobytes(), test.tobytes())
+            for sampler_name, sampler in samplers:
+                remaining = [(name, classifier) for name, classifier in classifiers
+                             if (dataset_name, fold, split, sampler_name, name) not in done]
+                if not remaining:
+                    continue
+                cache_entry = None
+                if cache_dir is not None and sampler is not None:
+                    key = _digest(FOLD_CACHE_VERSION, data_digest, y.tobytes(), split, type(sampler).__name__,
+                                  sampler.get_params() if hasattr(sampler, 'get_params') else None)
+                    cache_entry = os.path.join(cache_dir, f'{dataset_name}-{fold}-{sampler_name}-{key}')
+                record = {'dataset': dataset_name, 'fold': fold, 'split': split, 'sampler': sampler_name}
+                tasks.append((shared_X, y, train, test, sampler, remaining, metrics, cache_entry, record))
+
+    with open(results_path, 'a') as f:
+        def write(task_results):
+            for result in task_results:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            results.extend(task_results)
+
+        if n_jobs is None or effective_n_jobs(n_jobs) == 1:
+            for task in tasks:
+                write(_run_task(task))
+        else:
+            with ProcessPoolExecutor(max_workers=effective_n_jobs(n_jobs)) as executor:
+                for future in as_completed([executor.submit(_run_task, task) for task in tasks]):
+                    write(future.result())
+
+    return results
@@ -0,0 +1,345 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from joblib import effective_n_jobs
+from scipy import sparse
+from sklearn.base import BaseEstimator, clone
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.neighbors import NearestNeighbors
+from sklearn.utils import check_random_state, check_array, gen_batches, get_chunk_n_rows
+
+from multi_imbalance.utils.profiling import phase, count
+
+_allowed_backends = ['exact', 'rp_forest']
+
+
+def make_neighbors(neighbors=None, n_neighbors=5):
+    """
+    Creates an unfitted nearest neighbours estimator used by the resampling algorithms.
+
+    :param neighbors:
+        neighbour search backend. Possible values:
+
+        * None or 'exact' :
+            exact search with sklearn NearestNeighbors
+        * 'rp_forest' :
+            approximate search with RPForestNeighbors
+        * estimator :
+            an instance of a class that implements fit and kneighbors methods and has n_neighbors parameter,
+            it is cloned before use
+    :param n_neighbors:
+        number of neighbours returned by kneighbors by default
+    :return:
+        unfitted estimator with n_neighbors set
+    """
+    if neighbors is None or neighbors == 'exact':
+        return NearestNeighbors(n_neighbors=n_neighbors)
+
+    if isinstance(neighbors, str):
+        if neighbors not in _allowed_backends:
+            raise ValueError("Unknown neighbors backend: %s, expected to be one of %s."
+                             % (neighbors, _allowed_backends))
+        return RPForestNeighbors(n_neighbors=n_neighbors)
+
+    if not hasattr(neighbors, 'fit') or not hasattr(neighbors, 'kneighbors'):
+        raise ValueError("Your neighbors backend must implement fit and kneighbors methods")
+    return clone(neighbors).set_params(n_neighbors=n_neighbors)
+
+
+def fit_neighbors(nn, X):
+    """
+    Fits a nearest neighbours estimator, the index build is recorded by the instrumentation
+    (see multi_imbalance.utils.profiling).
+
+    :param nn:
+        unfitted estimator, e.g. created with make_neighbors
+    :param X:
+        two dimensional array with examples to index
+    :return:
+        fitted estimator
+    """
+    with phase('knn_fit'):
+        nn.fit(X)
+    count('knn_index_builds')
+    return nn
+
+
+def kneighbors_chunked(nn, X, n_neighbors=None, return_distance=False, working_memory=None, n_jobs=None):
+    """
+    Queries a fitted nearest neighbours estimator in chunks of rows, so that the distance block computed for a single
+    chunk (chunk rows x number of fitted examples) does not exceed the working memory budget. Results are written
+    into preallocated arrays.
+
+    :param nn:
+        fitted estimator that implements kneighbors method
+    :param X:
+        two dimensional array with query examples
+    :param n_neighbors:
+        number of neighbours to return, defaults to nn.n_neighbors
+    :param return_distance:
+        flag, if true distances are returned along with the indices
+    :param working_memory:
+        memory budget for a single chunk in MiB, if None sklearn's working_memory config is used
+        (it can be changed globally with sklearn.config_context)
+    :param n_jobs:
+        number of threads used to query the chunks, None means 1
+    :return:
+        indices array of shape (number of queries x n_neighbors), preceded by distances array if return_distance
+    """
+    if n_neighbors is None:
+        n_neighbors = nn.n_neighbors
+
+    n_queries = X.shape[0]
+    indices = np.empty((n_queries, n_neighbors), dtype=np.intp)
+    distances = np.empty((n_queries, n_neighbors)) if return_distance else None
+
+    row_bytes = 8 * getattr(nn, 'n_samples_fit_', n_queries)
+    chunk_n_rows = get_chunk_n_rows(row_bytes=row_bytes, max_n_rows=n_queries, working_memory=working_memory)
+
+    def query(chunk):
+        if return_distance:
+            distances[chunk], indices[chunk] = nn.kneighbors(X[chunk], n_neighbors=n_neighbors, return_distance=True)
+        else:
+            indices[chunk] = nn.kneighbors(X[chunk], n_neighbors=n_neighbors, return_distance=False)
+
+    chunks = list(gen_batches(n_queries, chunk_n_rows))
+    with phase('knn_query'):
+        if n_jobs is None or effective_n_jobs(n_jobs) == 1 or len(chunks) == 1:
+            for chunk in chunks:
+                query(chunk)
+        else:
+            with ThreadPoolExecutor(max_workers=effective_n_jobs(n_jobs)) as executor:
+                list(executor.map(query, chunks))
+    count('knn_queries', n_queries)
+
+    if return_distance:
+        return distances, indices
+    return indices
+
+
+def kneighbors_per_group(nn, X, y, groups, n_neighbors, n_jobs=None):
+    """
+    Answers nearest neighbours queries restricted to groups of classes (e.g. pairs of classes in OVO or classes with
+    non zero codes in an ECOC dichotomy) with a single index over all fitted examples. The index is queried for
+    n_neighbors times the number of classes neighbours and the result is filtered for every group. Only the queries
+    for which some group gets fewer than n_neighbors examples are repeated with twice as many neighbours.
+
+    :param nn:
+        estimator that implements kneighbors method, fitted on all examples
+    :param X:
+        two dimensional array with query examples
+    :param y:
+        one dimensional array with class indices (0, ..., number of classes - 1) of the fitted examples
+    :param groups:
+        boolean array (number of groups x number of classes), True for the classes of a group
+    :param n_neighbors:
+        number of neighbours per group
+    :param n_jobs:
+        number of threads used for the queries, see kneighbors_chunked
+    :return:
+        array (number of groups x number of queries x n_neighbors) with class indices of the nearest fitted examples
+        of each group, ordered by distance. If a group has fewer than n_neighbors examples, missing entries are -1
+    """
+    groups = np.asarray(groups, dtype=bool)
+    y = np.asarray(y)
+    n_fitted = y.shape[0]
+    needed = np.minimum(n_neighbors, groups[:, y].sum(axis=1))
+    result = np.full((groups.shape[0], X.shape[0], n_neighbors), -1, dtype=np.min_scalar_type(-groups.shape[1]))
+
+    pending = np.arange(X.shape[0])
+    query_size = min(n_fitted, n_neighbors * groups.shape[1])
+    while pending.shape[0] > 0:
+        neighbour_classes = y[kneighbors_chunked(nn, X[pending], n_neighbors=query_size, n_jobs=n_jobs)]
+        complete = np.ones(pending.shape[0], dtype=bool)
+        for group_idx, group in enumerate(groups):
+            relevant = group[neighbour_classes]
+            rank = np.cumsum(relevant, axis=1)
+            found = rank[:, -1] >= needed[group_idx]
+            complete &= found
+            taken = relevant & (rank <= n_neighbors)
+            taken[~found] = False
+            if needed[group_idx] > 0 and found.any():
+                result[group_idx, pending[found], :needed[group_idx]] = \
+                    neighbour_classes[taken].reshape(-1, needed[group_idx])
+        if query_size == n_fitted:
+            break
+        pending = pending[~complete]
+        query_size = min(n_fitted, 2 * query_size)
+
+    return result
+
+
+class RPForestNeighbors(BaseEstimator):
+    """
+    Approximate nearest neighbours search with a forest of random projection trees. Each tree recursively splits the
+    training set in halves by the median of a projection onto a random direction. A query is routed to one leaf in
+    every tree and the exact euclidean distances are computed only to the examples gathered from these leaves.
+    More trees and bigger leaves give higher recall at the cost of slower queries.
+    """
+
+    def __init__(self, n_neighbors=5, n_trees=10, leaf_size=50, random_state=0):
+        """
+        :param n_neighbors:
+            number of neighbours returned by kneighbors by default
+        :param n_trees:
+            number of random projection trees
+        :param leaf_size:
+            maximal number of examples in a leaf, it is raised to 2 * n_neighbors if smaller
+        :param random_state:
+            the seed of the pseudo random number generator
+        """
+        self.n_neighbors = n_neighbors
+        self.n_trees = n_trees
+        self.leaf_size = leaf_size
+        self.random_state = random_state
+
+    def fit(self, X, y=None):
+        """
+        Builds the forest.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix (number of samples x number of features)
+            with float numbers
+        :param y:
+            ignored
+        :return:
+            self: object
+        """
+        self._fit_X = check_array(X, accept_sparse='csr', dtype=float)
+        self.n_samples_fit_ = self._fit_X.shape[0]
+        self._leaf_size = max(self.leaf_size, 2 * self.n_neighbors, 1)
+        random_state = check_random_state(self.random_state)
+        self._trees = [self._build_tree(random_state) for _ in range(self.n_trees)]
+        return self
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        """
+        Finds the approximate k nearest neighbours of each example in X.
+
+        :param X:
+            two dimensional numpy array or scipy sparse matrix with query examples, if None the training examples
+            are used
+        :param n_neighbors:
+            number of neighbours to return, defaults to the value passed to the constructor
+        :param return_distance:
+            flag, if true distances are returned along with the indices
+        :return:
+            distances and indices arrays of shape (number of queries x n_neighbors) sorted by increasing distance,
+            or only the indices if return_distance is False
+        """
+        if n_neighbors is None:
+            n_neighbors = self.n_neighbors
+        if n_neighbors > self._fit_X.shape[0]:
+            raise ValueError(f'Expected n_neighbors <= n_samples, but n_samples = {self._fit_X.shape[0]}, '
+                             f'n_neighbors = {n_neighbors}')
+
+        X = self._fit_X if X is None else check_array(X, accept_sparse='csr', dtype=float)
+        leaves = np.array([self._route(tree, X) for tree in self._trees]).reshape(len(self._trees), X.shape[0])
+
+        distances = np.empty((X.shape[0], n_neighbors))
+        indices = np.empty((X.shape[0], n_neighbors), dtype=int)
+        chunk_n_rows = get_chunk_n_rows(row_bytes=16 * len(self._trees) * self._leaf_size,
+                                        max_n_rows=max(X.shape[0], 1))
+        for chunk in gen_batches(X.shape[0], chunk_n_rows):
+            distances[chunk], indices[chunk] = self._kneighbors_chunk(X[chunk], leaves[:, chunk], n_neighbors)
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+    def _kneighbors_chunk(self, X, leaves, n_neighbors):
+        """
+        Gathers the candidates of the queries in X from their leaves, one distance block is computed for all queries
+        reaching the same leaf of a tree. The candidates of a query found in several trees are counted once, the
+        queries with less than n_neighbors candidates are compared with all training examples.
+
+        :param leaves:
+            array (number of trees x number of queries) with the leaves reached by the queries
+        :return:
+            distances and indices arrays of shape (number of queries x n_neighbors) sorted by increasing distance
+        """
+        candidates = np.full((X.shape[0], len(self._trees) * self._leaf_size), -1, dtype=int)
+        candidate_dist = np.full(candidates.shape, np.inf)
+        for tree_idx, tree in enumerate(self._trees):
+            order = np.argsort(leaves[tree_idx], kind='stable')
+            boundaries = np.flatnonzero(np.diff(leaves[tree_idx][order])) + 1
+            for queries in np.split(order, boundaries) if order.shape[0] > 0 else []:
+                leaf_indices = tree[4][leaves[tree_idx][queries[0]]]
+                columns = slice(tree_idx * self._leaf_size, tree_idx * self._leaf_size + leaf_indices.shape[0])
+                candidates[queries, columns] = leaf_indices
+                candidate_dist[queries, columns] = euclidean_distances(X[queries], self._fit_X[leaf_indices])
+
+        by_index = np.argsort(candidates, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, by_index, axis=1)
+        candidate_dist = np.take_along_axis(candidate_dist, by_index, axis=1)
+        candidate_dist[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = np.inf
+
+        nearest = np.argpartition(candidate_dist, n_neighbors - 1, axis=1)[:, :n_neighbors]
+        nearest_dist = np.take_along_axis(candidate_dist, nearest, axis=1)
+        nearest = np.take_along_axis(nearest, np.lexsort((nearest, nearest_dist), axis=1), axis=1)
+        distances = np.take_along_axis(candidate_dist, nearest, axis=1)
+        indices = np.take_along_axis(candidates, nearest, axis=1)
+
+        too_few = np.flatnonzero(np.isinf(distances[:, -1]))
+        if too_few.shape[0] > 0:
+            all_dist = euclidean_distances(X[too_few], self._fit_X)
+            indices[too_few] = np.argsort(all_dist, axis=1, kind='stable')[:, :n_neighbors]
+            distances[too_few] = np.take_along_axis(all_dist, indices[too_few], axis=1)
+        return distances, indices
+
+    def _build_tree(self, random_state):
+        """
+        Builds a single tree stored as flat arrays: projection directions, thresholds, children of internal nodes
+        and a list of example indices for leaves (None for internal nodes).
+        """
+        directions, thresholds, left, right, leaves = [], [], [], [], []
+        stack = [(np.arange(self._fit_X.shape[0]), self._new_node(directions, thresholds, left, right, leaves))]
+        while stack:
+            node_indices, node = stack.pop()
+            if node_indices.shape[0] <= self._leaf_size:
+                leaves[node] = node_indices
+                continue
+
+            direction = random_state.normal(size=self._fit_X.shape[1])
+            projections = self._fit_X[node_indices] @ direction
+            half = node_indices.shape[0] // 2
+            order = np.argpartition(projections, half)
+            left_part, right_part = order[:half], order[half:]
+
+            directions[node] = direction
+            thresholds[node] = (projections[left_part].max() + projections[right_part].min()) / 2
+            left[node] = self._new_node(directions, thresholds, left, right, leaves)
+            right[node] = self._new_node(directions, thresholds, left, right, leaves)
+            stack.append((node_indices[left_part], left[node]))
+            stack.append((node_indices[right_part], right[node]))
+
+        directions = np.array([np.zeros(self._fit_X.shape[1]) if d is None else d for d in directions])
+        return directions, np.array(thresholds), np.array(left), np.array(right), leaves
+
+    @staticmethod
+    def _new_node(directions, thresholds, left, right, leaves):
+        directions.append(None)
+        thresholds.append(0.)
+        left.append(-1)
+        right.append(-1)
+        leaves.append(None)
+        return len(leaves) - 1
+
+    @staticmethod
+    def _route(tree, X):
+        """
+        Returns the leaf reached by each example of X.
+        """
+        directions, thresholds, left, right, _ = tree
+        nodes = np.zeros(X.shape[0], dtype=int)
+        internal = left[nodes] != -1
+        while internal.any():
+            current = nodes[internal]
+            if sparse.issparse(X):
+                projections = np.asarray(X[np.flatnonzero(internal)].multiply(directions[current]).sum(axis=1)).ravel()
+            else:
+                projections = np.einsum('ij,ij->i', X[internal], directions[current])
+            goes_left = projections <= thresholds[current]
+            nodes[internal] = np.where(goes_left, left[current], right[current])
+            internal = left[nodes] != -1
+        return nodes
@@ -1,12 +1,19 @@
 from collections import Counter
 
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.decomposition import PCA
 
 from multi_imbalance.utils.data import construct_flat_2pc_df
 
-sns.set_style('darkgrid')
+
+def _plotting_modules():  # pragma no cover
+    """
+    Imports matplotlib and seaborn on the first plot, so that importing this module stays cheap.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set_style('darkgrid')
+    return plt, sns
 
 
 def plot_cardinality_and_2d_data(X, y, dataset_name='') -> None:  # pragma no cover
@@ -20,6 +27,7 @@ def plot_cardinality_and_2d_data(X, y, dataset_name='') -> None:  # pragma no co
     :param str dataset_name:
         title of chart
     """
+    plt, sns = _plotting_modules()
     n = len(Counter(y).keys())
     p = sns.color_palette("husl", n)
 
@@ -59,6 +67,7 @@ def plot_visual_comparision_datasets(X1, y1, X2, y2, dataset_name1='', dataset_n
     :param str dataset_name2:
         second dataset chart title
     """
+    plt, sns = _plotting_modules()
     n = len(Counter(y1).keys())
     p = sns.color_palette("husl", n)
 
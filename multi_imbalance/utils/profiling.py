@@ -0,0 +1,214 @@
+"""
+Opt-in instrumentation of the samplers and ensembles.
+
+Instrumentation is switched on inside the instrument() context manager or globally by setting the
+MULTI_IMBALANCE_PROFILE environment variable to a value other than '' or '0'. When it is on, every instrumented
+method (e.g. fit, predict or fit_resample) stores a ProfileReport with timings of its phases and counters (neighbour
+index builds and queries, rows copied, classifiers fitted etc.) in the profile_report_ attribute of the estimator.
+When it is off, the hooks cost a single check.
+
+Example::
+
+    with instrument() as profiler:
+        ovo = OVO().fit(X, y)
+    print(ovo.profile_report_)
+    profiler.report().to_chrome_trace('trace.json')  # open in chrome://tracing or https://ui.perfetto.dev
+"""
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+ENV_VARIABLE = 'MULTI_IMBALANCE_PROFILE'
+
+_active = []
+_lock = threading.Lock()
+
+
+def enabled():
+    """
+    :return: True if the instrumentation is switched on by instrument() or by the environment variable.
+    """
+    return bool(_active) or os.environ.get(ENV_VARIABLE, '') not in ('', '0')
+
+
+class Profiler:
+    """
+    Collects phases (named time intervals) and counters recorded while it is active.
+    """
+
+    def __init__(self, name='session'):
+        self.name = name
+        self.events = []
+        self.counters = Counter()
+        self.origin = perf_counter()
+
+    def report(self):
+        """
+        :return: ProfileReport with the data collected so far.
+        """
+        with _lock:
+            return ProfileReport(self.name, list(self.events), dict(self.counters), self.origin)
+
+
+class ProfileReport:
+    """
+    Structured result of an instrumented call.
+
+    Attributes:
+        * name - name of the instrumented call, e.g. 'OVO.fit'
+        * events - list of (phase name, start [s], duration [s], thread id) tuples, start is relative to the
+          beginning of the call
+        * counters - dict counter name -> value
+    """
+
+    def __init__(self, name, events, counters, origin=0.):
+        self.name = name
+        self.events = [(phase, start - origin, duration, thread) for phase, start, duration, thread in events]
+        self.counters = counters
+
+    @property
+    def phases(self):
+        """
+        :return: OrderedDict phase name -> {'calls': number of calls, 'total_time': total duration in seconds},
+            in order of the first occurrence
+        """
+        phases = OrderedDict()
+        for phase, _, duration, _ in self.events:
+            stats = phases.setdefault(phase, {'calls': 0, 'total_time': 0.})
+            stats['calls'] += 1
+            stats['total_time'] += duration
+        return phases
+
+    def to_dict(self):
+        return {'name': self.name, 'phases': self.phases, 'counters': self.counters}
+
+    def to_json(self, path=None):
+        """
+        :param path:
+            path of the output file, if None the JSON string is returned
+        """
+        content = json.dumps(self.to_dict(), indent=2)
+        if path is None:
+            return content
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def to_chrome_trace(self, path=None):
+        """
+        Exports the phases in the Chrome trace event format, readable by chrome://tracing and Perfetto.
+
+        :param path:
+            path of the output file, if None the trace is returned as a dict
+        """
+        pid = os.getpid()
+        trace = {
+            'traceEvents': [{'name': phase, 'cat': 'multi_imbalance', 'ph': 'X', 'ts': start * 1e6,
+                             'dur': duration * 1e6, 'pid': pid, 'tid': thread}
+                            for phase, start, duration, thread in self.events],
+            'displayTimeUnit': 'ms',
+            'otherData': {'name': self.name, 'counters': self.counters},
+        }
+        if path is None:
+            return trace
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+
+    def __str__(self):
+        lines = [self.name, f'{"phase":<40}{"calls":>8}{"time [s]":>12}']
+        lines += [f'{phase:<40}{stats["calls"]:>8}{stats["total_time"]:>12.4f}' for phase, stats in self.phases.items()]
+        lines += [f'{counter:<40}{value:>8}' for counter, value in sorted(self.counters.items())]
+        return '\n'.join(lines)
+
+
+@contextmanager
+def instrument(name='session'):
+    """
+    Switches the instrumentation on inside the with block.
+
+    :param name:
+        name of the returned profiler
+    :return:
+        Profiler collecting everything recorded inside the block
+    """
+    profiler = Profiler(name)
+    with _lock:
+        _active.append(profiler)
+    try:
+        yield profiler
+    finally:
+        with _lock:
+            _active.remove(profiler)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_phase = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        event = (self.name, self.start, perf_counter() - self.start, threading.get_ident())
+        with _lock:
+            for profiler in _active:
+                profiler.events.append(event)
+
+
+def phase(name):
+    """
+    Context manager recording the time spent in the with block as the phase name in all active profilers.
+    """
+    if not _active:
+        return _null_phase
+    return _Phase(name)
+
+
+def count(name, value=1):
+    """
+    Increases the counter name by value in all active profilers.
+    """
+    if not _active:
+        return
+    with _lock:
+        for profiler in _active:
+            profiler.counters[name] += int(value)
+
+
+def instrumented(method):
+    """
+    Decorator of estimator methods. If the instrumentation is on, the call is recorded as a phase named
+    'ClassName.method' and a ProfileReport of the call is stored in the profile_report_ attribute of the estimator.
+    """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not enabled():
+            return method(self, *args, **kwargs)
+
+        name = f'{type(self).__name__}.{method.__name__.lstrip("_")}'
+        with instrument(name) as profiler:
+            with phase(name):
+                result = method(self, *args, **kwargs)
+        self.profile_report_ = profiler.report()
+        return result
+
+    return wrapper
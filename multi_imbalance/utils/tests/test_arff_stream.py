@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from multi_imbalance.utils.arff_stream import scan_arff, iter_arff_chunks, load_arff_streaming
+from multi_imbalance.utils.data import load_arff_dataset
+
+MIXED_ARFF = """% comment
+@relation mixed
+@attribute 'first value' real
+@attribute color {red, green, blue}
+@attribute size integer
+@attribute class {a, b}
+@data
+1.5,red,3,a
+?,green,4,b
+2.5,?,?,a
+
+% another comment
+3.5,blue,6,b
+4.5,green,7,a
+"""
+
+
+@pytest.fixture
+def mixed_arff(tmp_path):
+    path = tmp_path / 'mixed.arff'
+    path.write_text(MIXED_ARFF)
+    return str(path)
+
+
+def test_scan_arff(mixed_arff):
+    schema = scan_arff(mixed_arff, chunk_size=2)
+    assert schema.names == ['first value', 'color', 'size', 'class']
+    assert schema.n_rows == 5
+    assert schema.means[0] == 3
+    assert schema.vocabularies[1] == ['blue', 'green', 'red']
+    assert schema.modes[1] == 'green'
+    assert schema.labels == ['a', 'b']
+    assert schema.n_columns() == 5
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 100])
+def test_same_as_load_arff_dataset(mixed_arff, chunk_size):
+    X_expected, y_expected, non_cat_expected = load_arff_dataset(mixed_arff, return_non_cat_length=True)
+    X, y, non_cat = load_arff_streaming(mixed_arff, chunk_size=chunk_size, return_non_cat_length=True)
+    assert np.allclose(X, X_expected.astype(float))
+    assert (y == y_expected).all()
+    assert non_cat == non_cat_expected == 2
+
+
+def test_without_one_hot_encoding(mixed_arff):
+    X, _ = load_arff_streaming(mixed_arff, one_hot_encode=False)
+    assert np.allclose(X[:, 2], [2, 1, 1, 0, 1])
+
+
+def test_chunks(mixed_arff):
+    chunks = list(iter_arff_chunks(mixed_arff, chunk_size=2, dtype=np.float32))
+    assert [X.shape for X, _ in chunks] == [(2, 5), (2, 5), (1, 5)]
+    assert all(X.dtype == np.float32 for X, _ in chunks)
+
+
+def test_memmap_output(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    ds_path = os.path.join(dir_path, 'ds_example.arrf')
+    X_expected, y_expected = load_arff_dataset(ds_path)
+    X, y = load_arff_streaming(ds_path, chunk_size=3, out=str(tmp_path / 'X.npy'))
+    assert isinstance(X, np.memmap)
+    assert np.allclose(X, X_expected)
+    assert (y == y_expected).all()
+
+
+def test_quoted_values(tmp_path):
+    path = tmp_path / 'quoted.arff'
+    path.write_text("@relation r\n@attribute x real\n@attribute color {'dark, blue', red}\n@attribute class {a, b}\n"
+                    "@data\n1,'dark, blue',a\n2,red,b\n")
+    X, y = load_arff_streaming(str(path))
+    assert np.allclose(X, [[1, 1, 0], [2, 0, 1]])
+    assert (y == [0, 1]).all()
+
+
+def test_unsupported_attribute_type(tmp_path):
+    path = tmp_path / 'string.arff'
+    path.write_text('@relation r\n@attribute name string\n@attribute class {a}\n@data\nx,a\n')
+    with pytest.raises(ValueError):
+        scan_arff(str(path))
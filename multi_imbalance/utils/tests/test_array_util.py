@@ -0,0 +1,49 @@
+import pickle
+
+import numpy as np
+from numpy.testing import assert_array_equal
+from scipy.sparse import csr_matrix
+
+from multi_imbalance.utils.array_util import allocate_rows, take_rows, spill, MemmapReference
+
+X = np.arange(60, dtype=float).reshape(20, 3)
+
+
+def test_allocate_rows():
+    assert type(allocate_rows(10, 3, np.float32)) is np.ndarray
+    assert type(allocate_rows(10, 3, np.float32, memory_budget=1)) is np.ndarray
+    memmap = allocate_rows(10, 3, np.float32, memory_budget=0)
+    assert isinstance(memmap, np.memmap)
+    assert memmap.shape == (10, 3) and memmap.dtype == np.float32
+
+
+def test_take_rows():
+    indices = [19, 0, 0, 7]
+    assert_array_equal(take_rows(X, indices, working_memory=1e-4), X[indices])
+    spilled = take_rows(X, indices, memory_budget=0)
+    assert isinstance(spilled, np.memmap)
+    assert_array_equal(spilled, X[indices])
+    assert_array_equal(take_rows(csr_matrix(X), indices).toarray(), X[indices])
+    assert take_rows(X, []).shape == (0, 3)
+
+
+def test_spill():
+    assert spill(X) is X
+    assert spill(X, memory_budget=1) is X
+    spilled = spill(X, memory_budget=0)
+    assert isinstance(spilled, np.memmap)
+    assert_array_equal(spilled, X)
+    assert spill(spilled, memory_budget=0) is spilled
+
+
+def test_memmap_reference(tmp_path):
+    path = str(tmp_path / 'X.npy')
+    np.save(path, X)
+    memmap = np.load(path, mmap_mode='r')
+    assert MemmapReference.supported(memmap)
+    assert not MemmapReference.supported(memmap[1:])
+    assert not MemmapReference.supported(X)
+
+    reference = pickle.loads(pickle.dumps(MemmapReference(memmap)))
+    assert_array_equal(reference.open(), X)
+    assert len(pickle.dumps(MemmapReference(memmap))) < X.nbytes
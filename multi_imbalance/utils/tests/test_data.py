@@ -1,11 +1,12 @@
 import os
-from collections import OrderedDict
+from unittest import mock
+from collections import OrderedDict, Counter
 
 import numpy as np
 import pytest
 
 from multi_imbalance.utils.data import construct_flat_2pc_df, load_arff_dataset, load_datasets_arff, \
-    construct_maj_int_min
+    construct_maj_int_min, ClassProfile, get_class_profile
 
 
 def test_2pc():
@@ -111,3 +112,77 @@ def test_construct_maj_int_min_when_wrong_strategy():
     with pytest.raises(ValueError):
         construct_maj_int_min(y, strategy='WRONG_STRATEGY')
 
+
+def test_class_profile():
+    y = np.array([3, 1, 1, 2, 2, 2, 0, 3, 3, 3, 5])
+    profile = ClassProfile(y)
+
+    assert (profile.classes == [0, 1, 2, 3, 5]).all()
+    assert (profile.classes[profile.encoded] == y).all()
+    assert (profile.counts == [1, 2, 3, 4, 1]).all()
+    assert list(profile.quantities().items()) == list(Counter(y).items())
+    assert profile.maj_int_min == OrderedDict({'maj': [3, 2], 'int': [1], 'min': [0, 5]})
+    assert (profile.encode([5, 0]) == [4, 0]).all()
+    np.testing.assert_array_almost_equal(profile.similarity[1], [0.5, 1, 2 / 3, 0.5, 0.5])
+
+
+def test_get_class_profile():
+    y = np.array([0, 0, 1])
+    profile = ClassProfile(y)
+    assert get_class_profile(y, profile) is profile
+    assert (get_class_profile(y).counts == [2, 1]).all()
+    with pytest.raises(ValueError):
+        get_class_profile(np.array([0, 1]), profile)
+    with pytest.raises(ValueError):
+        get_class_profile(np.array([0, 1, 0]), profile)
+
+
+
+@pytest.fixture
+def arff_copy(tmp_path):
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    path = tmp_path / 'ds_example.arff'
+    with open(os.path.join(dir_path, 'ds_example.arrf')) as f:
+        path.write_text(f.read())
+    return str(path)
+
+
+def test_load_arff_dataset_cached(arff_copy, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    x_expected, y_expected = load_arff_dataset(arff_copy)
+    x, y, non_cat = load_arff_dataset(arff_copy, return_non_cat_length=True, cache_dir=cache_dir, mmap_mode='r')
+    assert isinstance(x, np.memmap)
+    assert np.array_equal(x, x_expected)
+    assert np.array_equal(y, y_expected)
+    assert non_cat == 2
+
+    with mock.patch('multi_imbalance.utils.data._parse_arff') as parse:
+        x_cached, _ = load_arff_dataset(arff_copy, cache_dir=cache_dir)
+        parse.assert_not_called()
+    assert np.array_equal(x_cached, x_expected)
+
+
+def test_load_arff_dataset_cache_invalidation(arff_copy, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_arff_dataset(arff_copy, cache_dir=cache_dir)
+
+    stat = os.stat(arff_copy)
+    os.utime(arff_copy, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with mock.patch('multi_imbalance.utils.data._parse_arff') as parse:
+        load_arff_dataset(arff_copy, cache_dir=cache_dir)
+        parse.assert_not_called()
+
+    with open(arff_copy, 'a') as f:
+        f.write('\n0.0,0.0,MAJ\n')
+    x, y = load_arff_dataset(arff_copy, cache_dir=cache_dir)
+    assert not isinstance(x, np.memmap)
+    assert x.shape == (8, 2)
+    assert y.tolist() == [1, 1, 1, 1, 1, 1, 1, 0]
+
+
+def test_load_arff_dataset_cache_keeps_encoding_options_apart(arff_copy, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_arff_dataset(arff_copy, cache_dir=cache_dir)
+    x, _ = load_arff_dataset(arff_copy, one_hot_encode=False, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 2
+    assert x.shape == (7, 2)
@@ -0,0 +1,106 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.model_selection import StratifiedKFold
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.utils import Bunch
+
+from multi_imbalance.resampling.global_cs import GlobalCS
+from multi_imbalance.utils.experiment import run_experiment, read_results, _data_digest
+
+
+def make_datasets():
+    rng = np.random.RandomState(0)
+    datasets = {}
+    for name, n_minority in (('first', 10), ('second', 15)):
+        X = np.vstack([rng.normal(0, 1, (40, 3)), rng.normal(1, 1, (20, 3)), rng.normal(2, 1, (n_minority, 3))])
+        y = np.array([0] * 40 + [1] * 20 + [2] * n_minority)
+        datasets[name] = Bunch(data=X, target=y, DESCR=name)
+    return datasets
+
+
+def result_keys(results):
+    return sorted((r['dataset'], r['fold'], r['sampler'], r['classifier']) for r in results)
+
+
+def run(tmp_path, **kwargs):
+    arguments = dict(datasets=make_datasets(), samplers={'none': None, 'globalCS': GlobalCS(shuffle=False)},
+                     classifiers={'tree': DecisionTreeClassifier(random_state=0)},
+                     results_path=str(tmp_path / 'results.jsonl'), cv=StratifiedKFold(3))
+    arguments.update(kwargs)
+    return run_experiment(**arguments)
+
+
+def test_run_experiment(tmp_path):
+    results = run(tmp_path)
+
+    assert len(results) == 2 * 3 * 2
+    assert result_keys(read_results(str(tmp_path / 'results.jsonl'))) == result_keys(results)
+    for result in results:
+        assert 0 <= result['gmean'] <= 1
+        assert result['n_train'] in (46, 47, 50)
+        if result['sampler'] == 'globalCS':
+            assert result['n_resampled'] > result['n_train']
+
+
+def test_run_experiment_in_parallel(tmp_path):
+    serial = run(tmp_path, results_path=str(tmp_path / 'serial.jsonl'))
+    parallel = run(tmp_path, n_jobs=2)
+
+    key = lambda r: (r['dataset'], r['fold'], r['sampler'], r['classifier'])
+    assert [r['gmean'] for r in sorted(serial, key=key)] == [r['gmean'] for r in sorted(parallel, key=key)]
+
+
+def test_resume_interrupted_run(tmp_path):
+    results_path = tmp_path / 'results.jsonl'
+    complete = run(tmp_path)
+    lines = results_path.read_text().splitlines(keepends=True)
+    results_path.write_text(''.join(lines[:5]) + lines[5][:10])
+
+    resumed = run(tmp_path)
+
+    assert result_keys(resumed) == result_keys(complete)
+    assert result_keys(read_results(str(results_path))) == result_keys(complete)
+    assert len(run(tmp_path)) == len(complete)
+
+
+def test_resampled_folds_are_cached(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    first = run(tmp_path, cache_dir=cache_dir)
+    second = run(tmp_path, cache_dir=cache_dir, classifiers={'stump': DecisionTreeClassifier(max_depth=1)})
+
+    assert not any(r['resample_cached'] for r in first)
+    resampled = [r for r in second if r['classifier'] == 'stump' and r['sampler'] == 'globalCS']
+    assert len(resampled) == 6 and all(r['resample_cached'] for r in resampled)
+    assert len(os.listdir(cache_dir)) == 6
+
+
+def test_duplicated_estimator_names():
+    with pytest.raises(ValueError):
+        run_experiment(make_datasets(), [GlobalCS(), GlobalCS()], [DecisionTreeClassifier()], 'results.jsonl')
+
+
+def test_cached_folds_of_changed_dataset_are_not_reused(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    datasets = make_datasets()
+    run(tmp_path, datasets=datasets, cache_dir=cache_dir)
+    datasets['first'].data = datasets['first'].data * 2
+    second = run(tmp_path, datasets=datasets, cache_dir=cache_dir,
+                 classifiers={'stump': DecisionTreeClassifier(max_depth=1)})
+
+    resampled = [r for r in second if r['sampler'] == 'globalCS']
+    assert {r['dataset'] for r in resampled if r['resample_cached']} == {'second'}
+    assert not any(r['resample_cached'] for r in resampled if r['dataset'] == 'first')
+
+
+def test_memory_mapped_dataset_digest(tmp_path):
+    path = str(tmp_path / 'X.npy')
+    np.save(path, np.arange(12.).reshape(4, 3))
+    digest = _data_digest(np.load(path, mmap_mode='r'))
+    assert _data_digest(np.load(path, mmap_mode='r')) == digest
+
+    np.save(path, np.arange(12.).reshape(4, 3) * 2)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert _data_digest(np.load(path, mmap_mode='r')) != digest
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors, KNeighborsTransformer
+
+from multi_imbalance.utils.neighbors import make_neighbors, kneighbors_chunked, kneighbors_per_group, \
+    RPForestNeighbors
+
+
+def test_make_neighbors_exact():
+    nn = make_neighbors(None, 3)
+    assert isinstance(nn, NearestNeighbors)
+    assert nn.n_neighbors == 3
+    assert isinstance(make_neighbors('exact', 4), NearestNeighbors)
+
+
+def test_make_neighbors_rp_forest():
+    nn = make_neighbors('rp_forest', 6)
+    assert isinstance(nn, RPForestNeighbors)
+    assert nn.n_neighbors == 6
+
+
+def test_make_neighbors_clones_instance():
+    prototype = RPForestNeighbors(n_trees=3)
+    nn = make_neighbors(prototype, 2)
+    assert nn is not prototype
+    assert nn.n_trees == 3
+    assert nn.n_neighbors == 2
+    assert prototype.n_neighbors == 5
+
+    assert isinstance(make_neighbors(KNeighborsTransformer(), 2), KNeighborsTransformer)
+
+
+def test_make_neighbors_unknown():
+    with pytest.raises(ValueError):
+        make_neighbors('hnsw', 3)
+    with pytest.raises(ValueError):
+        make_neighbors(object(), 3)
+
+
+def test_rp_forest_recall():
+    X = np.random.RandomState(0).normal(size=(500, 8))
+    exact = NearestNeighbors(n_neighbors=5).fit(X).kneighbors(X[:100], return_distance=False)
+    approx = RPForestNeighbors(n_neighbors=5, n_trees=10, leaf_size=30).fit(X)
+    distances, indices = approx.kneighbors(X[:100])
+
+    recall = np.mean([len(set(e) & set(a)) / 5 for e, a in zip(exact, indices)])
+    assert recall > 0.8
+    assert (indices[:, 0] == np.arange(100)).all()
+    assert (np.diff(distances, axis=1) >= 0).all()
+
+
+def test_rp_forest_small_dataset_is_exact():
+    X = np.random.RandomState(1).normal(size=(20, 3))
+    exact = NearestNeighbors(n_neighbors=4).fit(X).kneighbors(X)
+    approx = RPForestNeighbors(n_neighbors=4).fit(X).kneighbors(X)
+    np.testing.assert_array_almost_equal(exact[0], approx[0])
+    assert approx[1].shape == (20, 4)
+
+
+def test_rp_forest_searches_union_of_leaves():
+    X = np.random.RandomState(2).normal(size=(300, 4))
+    queries = np.random.RandomState(3).normal(size=(50, 4))
+    nn = RPForestNeighbors(n_neighbors=3, n_trees=4, leaf_size=10).fit(X)
+    distances, indices = nn.kneighbors(queries)
+
+    leaves = [nn._route(tree, queries) for tree in nn._trees]
+    for i, query in enumerate(queries):
+        candidates = np.unique(np.concatenate([tree[4][leaf[i]] for tree, leaf in zip(nn._trees, leaves)]))
+        candidate_dist = np.linalg.norm(X[candidates] - query, axis=1)
+        nearest = np.argsort(candidate_dist)[:3]
+        assert (indices[i] == candidates[nearest]).all()
+        assert np.allclose(distances[i], candidate_dist[nearest])
+
+
+def test_rp_forest_too_many_neighbors():
+    nn = RPForestNeighbors(n_neighbors=5).fit(np.zeros((3, 2)))
+    with pytest.raises(ValueError):
+        nn.kneighbors(np.zeros((1, 2)))
+
+
+@pytest.mark.parametrize("n_jobs", [None, 2])
+@pytest.mark.parametrize("working_memory", [None, 0.001])
+def test_kneighbors_chunked(n_jobs, working_memory):
+    X = np.random.RandomState(2).normal(size=(300, 4))
+    nn = NearestNeighbors(n_neighbors=3).fit(X)
+    expected_dist, expected_ind = nn.kneighbors(X)
+
+    indices = kneighbors_chunked(nn, X, working_memory=working_memory, n_jobs=n_jobs)
+    np.testing.assert_array_equal(indices, expected_ind)
+
+    distances, indices = kneighbors_chunked(nn, X, n_neighbors=3, return_distance=True,
+                                            working_memory=working_memory, n_jobs=n_jobs)
+    np.testing.assert_array_almost_equal(distances, expected_dist)
+    np.testing.assert_array_equal(indices, expected_ind)
+
+
+def test_kneighbors_per_group():
+    random_state = np.random.RandomState(3)
+    X = random_state.normal(size=(200, 3))
+    y = np.repeat([0, 1, 2, 3], [150, 40, 8, 2])
+    groups = np.array([[True, True, False, False], [False, False, True, True], [False, False, False, True]])
+    queries = random_state.normal(size=(20, 3))
+
+    result = kneighbors_per_group(NearestNeighbors().fit(X), queries, y, groups, n_neighbors=3)
+    assert result.shape == (3, 20, 3)
+    for group_idx, group in enumerate(groups):
+        members = np.flatnonzero(group[y])
+        n_neighbors = min(3, members.shape[0])
+        expected = NearestNeighbors(n_neighbors=n_neighbors).fit(X[members]).kneighbors(queries)[1]
+        np.testing.assert_array_equal(result[group_idx, :, :n_neighbors], y[members][expected])
+    assert (result[2, :, 2] == -1).all()
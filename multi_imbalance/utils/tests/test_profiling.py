@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+
+from multi_imbalance.ensemble.ovo import OVO
+from multi_imbalance.resampling.soup import SOUP
+from multi_imbalance.resampling.spider import SPIDER3
+from multi_imbalance.utils.profiling import ENV_VARIABLE, instrument, enabled, phase, count
+
+np.random.seed(0)
+X = np.vstack([np.random.normal(0, 1, (40, 2)), np.random.normal(2, 1, (20, 2)), np.random.normal(-2, 1, (10, 2))])
+y = np.array([0] * 40 + [1] * 20 + [2] * 10)
+
+
+def test_disabled_by_default():
+    assert not enabled()
+    soup = SOUP()
+    soup.fit_resample(X, y)
+    assert not hasattr(soup, 'profile_report_')
+
+
+def test_report_on_fitted_object():
+    with instrument():
+        ovo = OVO(preprocessing='SOUP').fit(X, y)
+
+    report = ovo.profile_report_
+    assert report.name == 'OVO.fit'
+    assert 'OVO.fit' in report.phases
+    assert report.phases['fit_binary']['calls'] == 3
+    assert report.counters['classifiers_fitted'] == 3
+    assert report.counters['knn_index_builds'] > 0
+    assert report.counters['knn_queries'] > 0
+
+
+def test_session_collects_nested_calls():
+    with instrument() as profiler:
+        SOUP().fit_resample(X, y)
+        SPIDER3(k=5).fit_resample(X, y)
+
+    phases = profiler.report().phases
+    assert phases['SOUP.fit_resample']['calls'] == 1
+    assert phases['SPIDER3.fit_resample']['calls'] == 1
+    assert {'relabel', 'clean', 'amplify', 'knn_fit', 'knn_query'} <= set(phases)
+
+
+def test_phase_and_count_without_profiler():
+    with phase('ignored'):
+        count('ignored')
+
+
+def test_env_variable(monkeypatch):
+    monkeypatch.setenv(ENV_VARIABLE, '1')
+    soup = SOUP()
+    soup.fit_resample(X, y)
+    assert soup.profile_report_.counters['rows_copied'] > 0
+
+
+def test_exports(tmp_path):
+    with instrument() as profiler:
+        with phase('outer'):
+            with phase('inner'):
+                count('items', 2)
+
+    report = profiler.report()
+    assert json.loads(report.to_json()) == {
+        'name': 'session',
+        'phases': {'inner': {'calls': 1, 'total_time': report.phases['inner']['total_time']},
+                   'outer': {'calls': 1, 'total_time': report.phases['outer']['total_time']}},
+        'counters': {'items': 2},
+    }
+
+    path = tmp_path / 'trace.json'
+    report.to_chrome_trace(str(path))
+    with open(str(path)) as f:
+        trace = json.load(f)
+    events = {event['name']: event for event in trace['traceEvents']}
+    assert events['outer']['ph'] == 'X'
+    assert events['outer']['ts'] <= events['inner']['ts']
+    assert events['inner']['ts'] + events['inner']['dur'] <= events['outer']['ts'] + events['outer']['dur']